@@ -4,4 +4,41 @@ __author__ = """Lukman Fashina"""
 __email__ = 'lukmanfashina@yahoo.com'
 __version__ = '0.0.1'
 
-from .rastvectpy import *
\ No newline at end of file
+import importlib
+
+# Public names and the submodule that defines them. Submodules are imported
+# the first time one of their names is accessed, so a bare `import rastvectpy`
+# does not pay for ipyleaflet, matplotlib, pandas or geopandas up front.
+_lazy_attrs = {
+    "Map": "rastvectpy",
+    "LRUCache": "common",
+    "check_package": "common",
+    "clear_vector_cache": "common",
+    "cog_tile_info": "common",
+    "csv_batch_convert": "common",
+    "csv_to_parquet": "common",
+    "csv_to_shp": "common",
+    "csv_to_geojson": "common",
+    "download_file": "common",
+    "points_to_geojson": "common",
+    "read_geojson_from_url": "common",
+    "read_vector": "common",
+    "read_vector_geojson": "common",
+    "set_vector_cache_size": "common",
+    "vector_cache_info": "common",
+}
+
+__all__ = list(_lazy_attrs)
+
+
+def __getattr__(name):
+    if name in _lazy_attrs:
+        module = importlib.import_module(f".{_lazy_attrs[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
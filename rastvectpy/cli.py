@@ -0,0 +1,66 @@
+"""Console scripts for rastvectpy."""
+
+import argparse
+import sys
+
+
+def csv_convert(argv=None):
+    """Convert CSV files to vector files in parallel.
+
+    Args:
+        argv (list, optional): The command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit code, 1 if any file failed to convert.
+    """
+    from .common import csv_batch_convert
+
+    parser = argparse.ArgumentParser(
+        prog="rastvectpy-csv-convert",
+        description="Convert CSV files with x/y columns to vector files in parallel.",
+    )
+    parser.add_argument("inputs", nargs="+", help="CSV files or glob patterns.")
+    parser.add_argument("-o", "--out-dir", help="Output directory (default: next to each input).")
+    parser.add_argument("-f", "--format", default="geojson", choices=["shp", "geojson", "parquet"])
+    parser.add_argument("-x", default="longitude", help="Longitude column (default: longitude).")
+    parser.add_argument("-y", default="latitude", help="Latitude column (default: latitude).")
+    parser.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument("--chunksize", type=int, help="Rows per chunk (default: whole file).")
+    parser.add_argument("--overwrite", action="store_true", help="Convert up-to-date outputs too.")
+    args = parser.parse_args(argv)
+
+    import glob
+
+    inputs = []
+    for item in args.inputs:
+        inputs.extend(sorted(glob.glob(item, recursive=True)) if glob.has_magic(item) else [item])
+
+    results = csv_batch_convert(
+        inputs,
+        out_dir=args.out_dir,
+        output_format=args.format,
+        x=args.x,
+        y=args.y,
+        workers=args.workers,
+        overwrite=args.overwrite,
+        chunksize=args.chunksize,
+    )
+
+    failed = 0
+    for r in results:
+        if r["error"]:
+            failed += 1
+            status = f"error: {r['error']}"
+        elif r["skipped"]:
+            status = "skipped (up to date)"
+        else:
+            status = f"{r['rows']:,} rows in {r['seconds']:.2f}s"
+        print(f"{r['input']} -> {r['output']}: {status}")
+
+    rows = sum(r["rows"] for r in results)
+    print(f"{len(results)} files, {rows:,} rows, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(csv_convert())
@@ -0,0 +1,147 @@
+"""Server-side hierarchical clustering of large point datasets.
+
+The index is built once with NumPy and holds the clusters of every zoom level,
+so the map only has to send the clusters that fall inside the current view.
+"""
+
+import math
+
+import numpy as np
+
+
+def _lng_to_x(lng):
+    return np.asarray(lng, dtype="float64") / 360.0 + 0.5
+
+
+def _lat_to_y(lat):
+    sin = np.sin(np.asarray(lat, dtype="float64") * math.pi / 180.0)
+    with np.errstate(divide="ignore"):
+        y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / math.pi
+    return np.clip(y, 0.0, 1.0)
+
+
+def _x_to_lng(x):
+    return (np.asarray(x, dtype="float64") - 0.5) * 360.0
+
+
+def _y_to_lat(y):
+    y2 = (180.0 - np.asarray(y, dtype="float64") * 360.0) * math.pi / 180.0
+    return 360.0 * np.arctan(np.exp(y2)) / math.pi - 90.0
+
+
+class ClusterIndex:
+    """A zoom-aware cluster index over point coordinates.
+
+    Points are projected to Web Mercator and merged on a grid whose cell size
+    is `radius` pixels at each zoom level. Each level is built from the level
+    above it, so the clusters nest like those of supercluster.
+
+    Args:
+        x (array-like): The longitude coordinates.
+        y (array-like): The latitude coordinates.
+        radius (int, optional): The cluster radius in pixels. Defaults to 60.
+        extent (int, optional): The tile size in pixels. Defaults to 256.
+        min_zoom (int, optional): The lowest zoom level to build clusters for. Defaults to 0.
+        max_zoom (int, optional): The highest zoom level to build clusters for. Above it
+            every point is returned on its own. Defaults to 16.
+    """
+
+    def __init__(self, x, y, radius=60, extent=256, min_zoom=0, max_zoom=16):
+        x = np.asarray(x, dtype="float64")
+        y = np.asarray(y, dtype="float64")
+        if x.shape != y.shape:
+            raise ValueError("x and y must have the same length.")
+
+        self.radius = radius
+        self.extent = extent
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+
+        ids = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        px = _lng_to_x(x[ids])
+        py = _lat_to_y(y[ids])
+        count = np.ones(len(ids), dtype="int64")
+
+        self._levels = {}
+        self._levels[max_zoom + 1] = self._sorted_level(px, py, count, ids)
+
+        for z in range(max_zoom, min_zoom - 1, -1):
+            px, py, count, ids = self._cluster(px, py, count, ids, z)
+            self._levels[z] = self._sorted_level(px, py, count, ids)
+
+    def __len__(self):
+        return int(self._levels[self.max_zoom + 1][2].sum())
+
+    def _cluster(self, px, py, count, ids, zoom):
+        """Merge the clusters of the level above into grid cells at `zoom`."""
+        cell = self.radius / (self.extent * 2.0**zoom)
+        ncols = int(math.ceil(1.0 / cell)) + 1
+        key = np.floor(py / cell).astype("int64") * ncols + np.floor(
+            px / cell
+        ).astype("int64")
+        _, first, inverse, members = np.unique(
+            key, return_index=True, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.ravel()
+
+        total = np.bincount(inverse, weights=count)
+        cx = np.bincount(inverse, weights=px * count) / total
+        cy = np.bincount(inverse, weights=py * count) / total
+        # Cells holding a single point keep its id; merged cells get -1.
+        cids = np.where(members == 1, ids[first], -1)
+        return cx, cy, total.astype("int64"), cids
+
+    @staticmethod
+    def _sorted_level(px, py, count, ids):
+        order = np.argsort(py, kind="stable")
+        return px[order], py[order], count[order], ids[order]
+
+    def get_clusters(self, bbox, zoom):
+        """Get the clusters and points inside a bounding box at a zoom level.
+
+        Args:
+            bbox (list): The bounding box as [west, south, east, north] in degrees.
+            zoom (float): The map zoom level.
+
+        Returns:
+            dict: A GeoJSON FeatureCollection. Clusters have the properties
+                `cluster` and `point_count`; single points use their row index as id.
+        """
+        z = int(min(max(math.floor(zoom), self.min_zoom), self.max_zoom + 1))
+        px, py, count, ids = self._levels[z]
+
+        west, south, east, north = bbox
+        if east - west >= 360:
+            ranges = [(-180.0, 180.0)]
+        else:
+            west = (west + 180.0) % 360.0 - 180.0
+            east = (east + 180.0) % 360.0 - 180.0
+            if west <= east:
+                ranges = [(west, east)]
+            else:
+                ranges = [(west, 180.0), (-180.0, east)]
+
+        lo = int(np.searchsorted(py, float(_lat_to_y(north)), side="left"))
+        hi = int(np.searchsorted(py, float(_lat_to_y(south)), side="right"))
+        sx = px[lo:hi]
+        mask = np.zeros(len(sx), dtype=bool)
+        for w, e in ranges:
+            mask |= (sx >= _lng_to_x(w)) & (sx <= _lng_to_x(e))
+        index = np.flatnonzero(mask) + lo
+
+        lngs = _x_to_lng(px[index]).tolist()
+        lats = _y_to_lat(py[index]).tolist()
+        features = []
+        for lng, lat, n, i in zip(lngs, lats, count[index].tolist(), ids[index].tolist()):
+            feature = {
+                "type": "Feature",
+                "properties": {},
+                "geometry": {"type": "Point", "coordinates": [lng, lat]},
+            }
+            if i < 0:
+                feature["properties"] = {"cluster": True, "point_count": n}
+            else:
+                feature["id"] = i
+            features.append(feature)
+
+        return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,1185 @@
+"""Common functions that do not depend on the interactive mapping stack.
+
+Heavy dependencies (pandas, geopandas) are imported inside the functions that
+need them, so batch jobs can use this module without loading ipyleaflet or
+matplotlib.
+"""
+
+import collections
+import importlib
+import os
+import sys
+import threading
+import time
+
+TITILER_ENDPOINT = os.environ.get("TITILER_ENDPOINT", "https://titiler.xyz")
+
+_missing = object()
+
+
+def check_package(name, URL=""):
+    """Import a package, raising a helpful error if it is not installed.
+
+    Args:
+        name (str): The name of the package to import.
+        URL (str, optional): The URL with installation instructions. Defaults to "".
+
+    Raises:
+        ImportError: If the package is not installed.
+
+    Returns:
+        module: The imported package.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ImportError(
+            f"{name} is not installed. Please install it before proceeding. {URL}".strip()
+        )
+
+
+class LRUCache:
+    """A thread-safe least-recently-used cache with an optional time-to-live.
+
+    Args:
+        maxsize (int, optional): The maximum number of entries. Defaults to 128.
+        ttl (float, optional): The number of seconds an entry stays valid. Defaults to None (no expiry).
+        maxbytes (int, optional): The total size of the entries to keep, as measured by
+            `sizeof`. Defaults to None (no limit).
+        sizeof (callable, optional): A function returning the size of a value in bytes.
+            Defaults to None (sys.getsizeof).
+    """
+
+    def __init__(self, maxsize=128, ttl=None, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or sys.getsizeof
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing, count=False) is not _missing
+
+    def get(self, key, default=None, count=True):
+        """Get a cached value and mark it as recently used.
+
+        Args:
+            key (hashable): The cache key.
+            default (object, optional): The value to return on a miss. Defaults to None.
+            count (bool, optional): Whether to update the hit/miss counters. Defaults to True.
+
+        Returns:
+            object: The cached value or `default`.
+        """
+        with self._lock:
+            item = self._data.get(key, _missing)
+            if item is not _missing and self.ttl is not None:
+                if time.monotonic() - item[1] > self.ttl:
+                    self._remove(key)
+                    item = _missing
+            if item is _missing:
+                if count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return item[0]
+
+    def set(self, key, value, nbytes=None):
+        """Add a value to the cache, evicting the least recently used entries if full.
+
+        Args:
+            key (hashable): The cache key.
+            value (object): The value to cache.
+            nbytes (int, optional): The size of the value, when the caller knows it more
+                cheaply than `sizeof`. Defaults to None.
+        """
+        if self.maxbytes is None:
+            size = 0
+        else:
+            size = nbytes if nbytes is not None else self.sizeof(value)
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, time.monotonic(), size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (
+                self.maxbytes is not None and self.nbytes > self.maxbytes
+            ):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        item = self._data.pop(key, _missing)
+        if item is not _missing:
+            self.nbytes -= item[2]
+        return item
+
+    def keys(self):
+        """Get a snapshot of the cached keys, least recently used first.
+
+        Returns:
+            list: The cache keys.
+        """
+        with self._lock:
+            return list(self._data)
+
+    def pop(self, key, default=None):
+        """Remove an entry from the cache.
+
+        Args:
+            key (hashable): The cache key.
+            default (object, optional): The value to return if the key is missing. Defaults to None.
+
+        Returns:
+            object: The removed value or `default`.
+        """
+        with self._lock:
+            item = self._remove(key)
+        return default if item is _missing else item[0]
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_titiler_cache = LRUCache(maxsize=256, ttl=3600)
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Get the shared httpx.Client used for TiTiler requests and downloads.
+
+    The client keeps connections alive, so repeated requests to the same host
+    skip the TCP and TLS handshakes.
+
+    Returns:
+        httpx.Client: The shared client.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            import httpx
+
+            _http_client = httpx.Client(
+                timeout=30,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            )
+        return _http_client
+
+
+def _titiler_get(url, path, titiler_endpoint):
+    """Get a TiTiler JSON response, using the cache keyed on endpoint, path and COG URL."""
+    key = (titiler_endpoint, path, url)
+    result = _titiler_cache.get(key)
+    if result is None:
+        r = get_http_client().get(f"{titiler_endpoint}{path}", params={"url": url})
+        r.raise_for_status()
+        result = r.json()
+        _titiler_cache.set(key, result)
+    return result
+
+
+def cog_tile_info(url, titiler_endpoint=None):
+    """Get the bounds and tile URL template of a Cloud Optimized GeoTIFF from TiTiler.
+
+    The `/cog/info` and `/cog/tilejson.json` requests are issued concurrently
+    over a shared keep-alive client, and both responses are cached for an hour.
+
+    Args:
+        url (str): The URL of the COG.
+        titiler_endpoint (str, optional): The TiTiler endpoint. Defaults to the
+            TITILER_ENDPOINT environment variable or "https://titiler.xyz".
+
+    Returns:
+        tuple: The bounds as [west, south, east, north] and the tile URL template.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if titiler_endpoint is None:
+        titiler_endpoint = TITILER_ENDPOINT
+    titiler_endpoint = titiler_endpoint.rstrip("/")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        info = executor.submit(_titiler_get, url, "/cog/info", titiler_endpoint)
+        tilejson = executor.submit(
+            _titiler_get, url, "/cog/tilejson.json", titiler_endpoint
+        )
+        bounds = info.result()["bounds"]
+        tile = tilejson.result()["tiles"][0]
+
+    return bounds, tile
+
+
+_download_locks = collections.defaultdict(threading.Lock)
+
+
+def _cache_dir(name):
+    """Get a folder of the on-disk cache, under RASTVECTPY_CACHE_DIR or ~/.cache/rastvectpy."""
+    root = os.environ.get(
+        "RASTVECTPY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rastvectpy")
+    )
+    return os.path.join(root, name)
+
+
+def _http_cache_dir():
+    """Get the directory of the on-disk HTTP cache."""
+    return _cache_dir("http")
+
+
+def download_file(url, cache_dir=None, retries=3, backoff=0.5, chunk_size=1024**2):
+    """Download a file into the on-disk cache, revalidating earlier downloads.
+
+    All remote loaders go through this function. Requests share the pooled
+    client from get_http_client, and the body is streamed to disk so large
+    files are never held in memory. A cached copy is revalidated with its
+    ETag and Last-Modified headers, so an unchanged source costs a single
+    304 response. Connection errors and 429/5xx responses are retried with
+    exponential backoff; if they persist, the cached copy is used if there
+    is one. Other error responses, e.g. 404 for a deleted source, raise.
+
+    Args:
+        url (str): The URL of the file.
+        cache_dir (str, optional): The cache directory. Defaults to the "http" folder in the
+            RASTVECTPY_CACHE_DIR environment variable or ~/.cache/rastvectpy.
+        retries (int, optional): The number of retries after a failed request. Defaults to 3.
+        backoff (float, optional): The delay before the first retry in seconds, doubled
+            after each retry. Defaults to 0.5.
+        chunk_size (int, optional): The number of bytes written at a time. Defaults to 1 MiB.
+
+    Raises:
+        httpx.HTTPError: If the server refuses the request, or the file could not be
+            downloaded and is not cached.
+
+    Returns:
+        str: The path of the local copy.
+    """
+    import hashlib
+    import json
+    import tempfile
+
+    import httpx
+
+    if cache_dir is None:
+        cache_dir = _http_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.basename(url.split("?")[0].split("#")[0])
+    ext = os.path.splitext(name)[1][:16]
+    path = os.path.join(cache_dir, hashlib.sha256(url.encode()).hexdigest()[:32] + ext)
+    meta_path = path + ".json"
+
+    with _download_locks[path]:
+        meta = {}
+        if os.path.exists(path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        client = get_http_client()
+        for attempt in range(retries + 1):
+            try:
+                with client.stream("GET", url, headers=headers, follow_redirects=True) as r:
+                    if r.status_code == 304 and meta:
+                        return path
+                    r.raise_for_status()
+                    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".part")
+                    try:
+                        with os.fdopen(fd, "wb") as f:
+                            for chunk in r.iter_bytes(chunk_size):
+                                f.write(chunk)
+                        os.replace(tmp, path)
+                    except BaseException:
+                        os.remove(tmp)
+                        raise
+                    meta = {
+                        "url": url,
+                        "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified"),
+                    }
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f)
+                return path
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable:
+                    raise
+                if attempt == retries:
+                    if meta:
+                        return path
+                    raise
+                time.sleep(backoff * 2**attempt)
+
+
+_image_cache = LRUCache(maxsize=64, maxbytes=64 * 1024**2, sizeof=lambda value: len(value[0]))
+
+
+def resize_image(source, width=None, height=None, quality=85, cache_dir=None):
+    """Downscale an image file to a display size and re-encode it, with caching.
+
+    JPEG files are decoded at a reduced scale when possible, so large photos
+    are never fully decoded. The result is cached in memory and on disk, keyed
+    on the file path, modification time and size and the requested size, so
+    repeat calls and later sessions skip the decoding and encoding. Images that
+    are already small enough are returned unchanged.
+
+    Args:
+        source (str): The file path of the image. Use download_file for URLs.
+        width (int, optional): The largest width in pixels. Defaults to None.
+        height (int, optional): The largest height in pixels. Defaults to None.
+        quality (int, optional): The JPEG quality of the re-encoded image. Defaults to 85.
+        cache_dir (str, optional): The on-disk cache directory. Defaults to the "images"
+            folder in the RASTVECTPY_CACHE_DIR environment variable or ~/.cache/rastvectpy.
+
+    Returns:
+        tuple: The encoded image bytes and their format, "jpeg" or "png" for a resized
+            image, or the lowercase format of the original file.
+    """
+    import hashlib
+
+    stat = os.stat(source)
+    key = (os.path.abspath(source), stat.st_mtime_ns, stat.st_size, width, height, quality)
+    value = _image_cache.get(key)
+    if value is not None:
+        return value
+
+    if cache_dir is None:
+        cache_dir = _cache_dir("images")
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+    for ext in ["jpeg", "png"]:
+        path = os.path.join(cache_dir, f"{digest}.{ext}")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                value = (f.read(), ext)
+            _image_cache.set(key, value)
+            return value
+
+    check_package("PIL", URL="https://pillow.readthedocs.io")
+    import io
+
+    from PIL import Image
+
+    with Image.open(source) as img:
+        original = (img.format or "png").lower()
+        scale = min(
+            width / img.width if width else 1.0,
+            height / img.height if height else 1.0,
+        )
+        if scale >= 1:
+            with open(source, "rb") as f:
+                value = (f.read(), original)
+            _image_cache.set(key, value)
+            return value
+
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        if original == "jpeg":
+            img.draft("RGB", size)
+        img = img.resize(size, Image.LANCZOS)
+        fmt = "jpeg" if original == "jpeg" and img.mode in ("RGB", "L") else "png"
+        buffer = io.BytesIO()
+        if fmt == "jpeg":
+            img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        else:
+            img.save(buffer, format="PNG", optimize=True)
+
+    value = (buffer.getvalue(), fmt)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, f"{digest}.{fmt}.{os.getpid()}.part")
+    with open(tmp, "wb") as f:
+        f.write(value[0])
+    os.replace(tmp, os.path.join(cache_dir, f"{digest}.{fmt}"))
+    _image_cache.set(key, value)
+    return value
+
+
+def points_to_geojson(x, y):
+    """Build a GeoJSON FeatureCollection of points from coordinate arrays.
+
+    Each feature id is the positional index of the point in the input arrays,
+    so attributes can be looked up later without copying them into the
+    GeoJSON. Points with missing or non-finite coordinates are skipped.
+
+    Args:
+        x (array-like): The x (longitude) coordinates.
+        y (array-like): The y (latitude) coordinates.
+
+    Returns:
+        dict: A GeoJSON FeatureCollection.
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    if x.shape != y.shape:
+        raise ValueError("x and y must have the same length.")
+
+    index = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    coords = np.column_stack((x[index], y[index])).tolist()
+
+    features = [
+        {
+            "type": "Feature",
+            "id": i,
+            "properties": {},
+            "geometry": {"type": "Point", "coordinates": c},
+        }
+        for i, c in zip(index.tolist(), coords)
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _csv_chunk_dtypes(in_csv, x, y, chunksize):
+    """Choose the column dtypes of a chunked CSV read from its first chunk.
+
+    Letting pandas infer the dtypes of every chunk separately lets a column
+    change type between chunks, e.g. a column empty in the first chunk is
+    read as float and its later strings are lost when appended. Integers and
+    booleans use the nullable pandas dtypes so missing values later on fit,
+    and columns that are empty in the first chunk are read as strings.
+
+    Args:
+        in_csv (str): The file path to the input CSV file.
+        x (str): The name of the column containing longitude coordinates.
+        y (str): The name of the column containing latitude coordinates.
+        chunksize (int): The number of rows per chunk.
+
+    Returns:
+        dict: The dtype of each column, to pass to pandas.read_csv.
+    """
+    import pandas as pd
+    from pandas.api import types
+
+    first = pd.read_csv(in_csv, nrows=chunksize)
+    dtypes = {}
+    for name in first.columns:
+        column = first[name]
+        if column.isna().all():
+            dtypes[name] = str
+        elif types.is_bool_dtype(column):
+            dtypes[name] = "boolean"
+        elif types.is_integer_dtype(column):
+            dtypes[name] = "Int64"
+        elif types.is_float_dtype(column):
+            dtypes[name] = "float64"
+        else:
+            dtypes[name] = str
+    for name in (x, y):
+        if name in dtypes:
+            dtypes[name] = "float64"
+    return dtypes
+
+
+def _iter_csv_points(in_csv, x, y, chunksize, verbose=True):
+    """Read a CSV file in chunks and yield one point GeoDataFrame per chunk.
+
+    Every chunk is read with the dtypes chosen from the first one (see
+    _csv_chunk_dtypes), so all chunks can be appended to the same output.
+
+    Args:
+        in_csv (str): The file path to the input CSV file.
+        x (str): The name of the column containing longitude coordinates.
+        y (str): The name of the column containing latitude coordinates.
+        chunksize (int): The number of rows per chunk.
+        verbose (bool, optional): Whether to print progress after each chunk. Defaults to True.
+
+    Yields:
+        geopandas.GeoDataFrame: The points of one chunk.
+
+    Raises:
+        ValueError: If a later chunk holds values that do not fit the dtypes of the first one.
+    """
+    import pandas as pd
+    import geopandas as gpd
+
+    start = time.perf_counter()
+    rows = 0
+    dtypes = _csv_chunk_dtypes(in_csv, x, y, chunksize)
+    chunks = iter(pd.read_csv(in_csv, chunksize=chunksize, dtype=dtypes))
+    while True:
+        try:
+            df = next(chunks)
+        except StopIteration:
+            return
+        except (TypeError, ValueError) as e:
+            raise ValueError(
+                f"{in_csv}: a column changed type after row {rows:,}; the column types are "
+                f"taken from the first {chunksize:,} rows, so use a larger chunksize. ({e})"
+            ) from e
+
+        geometry = gpd.points_from_xy(df[x], df[y])
+        yield gpd.GeoDataFrame(df, geometry=geometry)
+
+        rows += len(df)
+        if verbose:
+            elapsed = time.perf_counter() - start
+            rate = rows / elapsed if elapsed > 0 else 0
+            print(f"{rows:,} rows written ({rate:,.0f} rows/s)")
+
+
+def csv_to_shp(in_csv, out_shp, x="longitude", y="latitude", chunksize=None, verbose=True):
+    """Convert a CSV file to a shapefile.
+
+    Args:
+        in_csv (str): The file path to the input CSV file.
+        out_shp (str): The file path to the output shapefile.
+        x (str, optional): The name of the column containing longitude coordinates. Defaults to "longitude".
+        y (str, optional): The name of the column containing latitude coordinates. Defaults to "latitude".
+        chunksize (int, optional): If set, read and write the CSV this many rows at a time,
+            so peak memory depends on the chunk size rather than the file size. Defaults to None.
+        verbose (bool, optional): Whether to print progress after each chunk. Defaults to True.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import pandas as pd
+    import geopandas as gpd
+
+    if chunksize is not None:
+        rows = 0
+        for gdf in _iter_csv_points(in_csv, x, y, chunksize, verbose=verbose):
+            # Append each chunk to the shapefile written by the first one
+            gdf.to_file(out_shp, driver='ESRI Shapefile', mode="a" if rows else "w")
+            rows += len(gdf)
+        return rows
+
+    # Read the CSV file using pandas
+    df = pd.read_csv(in_csv)
+
+    # Create a GeoDataFrame from the DataFrame
+    geometry = gpd.points_from_xy(df[x], df[y])
+    gdf = gpd.GeoDataFrame(df, geometry=geometry)
+
+    # Save the GeoDataFrame as a Shapefile
+    gdf.to_file(out_shp, driver='ESRI Shapefile')
+    return len(gdf)
+
+
+def csv_to_geojson(in_csv, out_geojson, x="longitude", y="latitude", chunksize=None, verbose=True):
+    """Convert a CSV file to a GeoJSON file.
+
+    Args:
+        in_csv (str): The file path to the input CSV file.
+        out_geojson (str): The file path to the output GeoJSON file.
+        x (str, optional): The name of the column containing longitude coordinates. Defaults to "longitude".
+        y (str, optional): The name of the column containing latitude coordinates. Defaults to "latitude".
+        chunksize (int, optional): If set, read the CSV this many rows at a time and stream the
+            features to the output, so peak memory depends on the chunk size rather than the
+            file size. Defaults to None.
+        verbose (bool, optional): Whether to print progress after each chunk. Defaults to True.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import json
+    import pandas as pd
+    import geopandas as gpd
+
+    if chunksize is not None:
+        # GDAL rewrites the whole file when appending to GeoJSON, so the
+        # FeatureCollection is written directly instead.
+        rows = 0
+        with open(out_geojson, "w") as f:
+            f.write('{"type": "FeatureCollection", "features": [\n')
+            for gdf in _iter_csv_points(in_csv, x, y, chunksize, verbose=verbose):
+                features = gdf.iterfeatures(na="null", drop_id=True)
+                text = ",\n".join(json.dumps(feature) for feature in features)
+                if text:
+                    f.write((",\n" if rows else "") + text)
+                rows += len(gdf)
+            f.write("\n]}\n")
+        return rows
+
+    # Read the CSV file using pandas
+    df = pd.read_csv(in_csv)
+
+    # Create a GeoDataFrame from the DataFrame
+    geometry = gpd.points_from_xy(df[x], df[y])
+    gdf = gpd.GeoDataFrame(df, geometry=geometry)
+
+    # Save the GeoDataFrame as a GeoJSON file
+    gdf.to_file(out_geojson, driver='GeoJSON')
+    return len(gdf)
+
+
+def csv_to_parquet(
+    in_csv,
+    out_parquet,
+    x="longitude",
+    y="latitude",
+    crs=None,
+    chunksize=None,
+    row_group_size=100000,
+    compression="snappy",
+    verbose=True,
+):
+    """Convert a CSV file to a GeoParquet file with WKB point geometries.
+
+    GeoParquet keeps full column names and can be read back with memory-mapped
+    columnar reads (see read_vector), which is much faster than parsing
+    shapefiles or GeoJSON. Requires pyarrow.
+
+    Args:
+        in_csv (str): The file path to the input CSV file.
+        out_parquet (str): The file path to the output GeoParquet file.
+        x (str, optional): The name of the column containing longitude coordinates. Defaults to "longitude".
+        y (str, optional): The name of the column containing latitude coordinates. Defaults to "latitude".
+        crs (str, optional): The CRS of the coordinates, e.g. "EPSG:4326". Defaults to None (unknown).
+        chunksize (int, optional): If set, read the CSV this many rows at a time and write each
+            chunk as it is read, so peak memory depends on the chunk size. Defaults to None.
+        row_group_size (int, optional): The maximum number of rows per Parquet row group. Defaults to 100000.
+        compression (str, optional): The Parquet compression codec. Defaults to "snappy".
+        verbose (bool, optional): Whether to print progress after each chunk. Defaults to True.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import json
+    import pandas as pd
+    import geopandas as gpd
+
+    check_package("pyarrow", URL="https://arrow.apache.org/docs/python/install.html")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if chunksize is None:
+        df = pd.read_csv(in_csv)
+        gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df[x], df[y]), crs=crs)
+        gdf.to_parquet(
+            out_parquet, index=False, compression=compression, row_group_size=row_group_size
+        )
+        return len(gdf)
+
+    # Write the chunks through one ParquetWriter, with the GeoParquet
+    # metadata that geopandas would write for a single GeoDataFrame.
+    column = {"encoding": "WKB", "geometry_types": ["Point"]}
+    if crs is not None:
+        from pyproj import CRS
+
+        column["crs"] = CRS.from_user_input(crs).to_json_dict()
+    else:
+        column["crs"] = None
+    geo = {"version": "1.0.0", "primary_column": "geometry", "columns": {"geometry": column}}
+
+    rows = 0
+    writer = None
+    try:
+        for gdf in _iter_csv_points(in_csv, x, y, chunksize, verbose=verbose):
+            df = pd.DataFrame(gdf.drop(columns="geometry"))
+            if writer is None:
+                # Build the Arrow types from the pandas dtypes, which are the same for
+                # every chunk, rather than inferring them from the values of the first
+                # one, where an empty column would become the null type.
+                fields = [pa.field(name, _arrow_type(dtype)) for name, dtype in df.dtypes.items()]
+                columns = pa.schema(fields)
+            table = pa.Table.from_pandas(df, schema=columns, preserve_index=False)
+            table = table.append_column(
+                "geometry", pa.array(gdf.geometry.to_wkb().to_numpy(), type=pa.binary())
+            )
+            if writer is None:
+                metadata = dict(table.schema.metadata or {})
+                metadata[b"geo"] = json.dumps(geo).encode()
+                schema = table.schema.with_metadata(metadata)
+                writer = pq.ParquetWriter(out_parquet, schema, compression=compression)
+            writer.write_table(table.cast(schema), row_group_size=row_group_size)
+            rows += len(gdf)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _arrow_type(dtype):
+    """Map a pandas dtype chosen by _csv_chunk_dtypes to an Arrow type."""
+    import pyarrow as pa
+    from pandas.api import types
+
+    if types.is_bool_dtype(dtype):
+        return pa.bool_()
+    if types.is_integer_dtype(dtype):
+        return pa.int64()
+    if types.is_float_dtype(dtype):
+        return pa.float64()
+    return pa.string()
+
+
+def _gdf_nbytes(gdf):
+    """Estimate the memory used by a GeoDataFrame, counting 16 bytes per coordinate."""
+    import shapely
+
+    attributes = gdf.drop(columns=gdf.geometry.name).memory_usage(deep=True).sum()
+    coordinates = shapely.get_num_coordinates(gdf.geometry.values).sum()
+    return int(attributes + 16 * coordinates + 100 * len(gdf))
+
+
+def _geojson_nbytes(gdf):
+    """Estimate the serialized GeoJSON size of a GeoDataFrame, counting 40 bytes per coordinate."""
+    import shapely
+
+    attributes = gdf.drop(columns=gdf.geometry.name).memory_usage(deep=True).sum()
+    coordinates = shapely.get_num_coordinates(gdf.geometry.values).sum()
+    return int(attributes + 40 * coordinates + 100 * len(gdf))
+
+
+def _payload_nbytes(value):
+    """Get the size of a cached (payload, report) pair, serializing it only without a report."""
+    payload, report = value
+    if report is not None and "bytes_after" in report:
+        return report["bytes_after"]
+    from .vector import payload_size
+
+    return payload_size(payload)
+
+
+def _cache_sizeof(value):
+    return _payload_nbytes(value) if isinstance(value, tuple) else _gdf_nbytes(value)
+
+
+_vector_cache = LRUCache(
+    maxsize=256,
+    maxbytes=int(os.environ.get("RASTVECTPY_VECTOR_CACHE_BYTES", 512 * 1024**2)),
+    sizeof=_cache_sizeof,
+)
+
+
+def _vector_cache_key(filename, kind, **options):
+    """Build the cache key of a local vector file, or None if it cannot be cached.
+
+    The key includes the modification time and size of the file (and of the
+    .dbf of a shapefile), so edits on disk invalidate the cached entries.
+    """
+    if not isinstance(filename, str) or filename.startswith("http"):
+        return None
+    path = os.path.abspath(filename)
+    stamps = []
+    for sidecar in [path, os.path.splitext(path)[0] + ".dbf"]:
+        if sidecar == path or path.lower().endswith(".shp"):
+            try:
+                stat = os.stat(sidecar)
+            except OSError:
+                if sidecar == path:
+                    return None
+                continue
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+    frozen = tuple(sorted((k, repr(v)) for k, v in options.items()))
+    return (kind, path, tuple(stamps), frozen)
+
+
+def vector_cache_info():
+    """Get the statistics of the process-wide cache of parsed vector files.
+
+    Returns:
+        dict: The hits, misses, number of entries, bytes used and byte budget.
+    """
+    return {
+        "hits": _vector_cache.hits,
+        "misses": _vector_cache.misses,
+        "entries": len(_vector_cache),
+        "nbytes": _vector_cache.nbytes,
+        "maxbytes": _vector_cache.maxbytes,
+    }
+
+
+def set_vector_cache_size(maxbytes):
+    """Set the byte budget of the vector cache, evicting entries if needed.
+
+    Args:
+        maxbytes (int): The memory budget in bytes. Use 0 to disable the cache.
+    """
+    _vector_cache.maxbytes = int(maxbytes)
+    for key in _vector_cache.keys():
+        if _vector_cache.nbytes <= _vector_cache.maxbytes:
+            break
+        _vector_cache.pop(key)
+
+
+def clear_vector_cache():
+    """Remove all entries from the vector cache and reset its counters."""
+    _vector_cache.clear()
+
+
+def read_vector(filename, columns=None, where=None, bbox=None, cache=False, **kwargs):
+    """Read a vector file into a GeoDataFrame, choosing the fastest reader.
+
+    The column, attribute and bounding box filters are pushed down to the
+    reader, so unused attributes and rows are never loaded into Python.
+    GeoParquet files (.parquet, .geoparquet) are read with memory-mapped
+    columnar reads. Everything else goes through geopandas.read_file with
+    pyogrio, using Arrow when pyarrow is installed.
+
+    Args:
+        filename (str | bytes): The file path, URL or content of the vector data.
+        columns (list, optional): The attribute columns to read. Defaults to None (all).
+        where (str | list, optional): An SQL WHERE clause such as "pop > 1000". For GeoParquet,
+            pyarrow filters such as [("pop", ">", 1000)]. Defaults to None.
+        bbox (tuple, optional): Only read features intersecting (minx, miny, maxx, maxy),
+            given in the coordinate system of the data. Defaults to None.
+        cache (bool, optional): Whether to reuse the GeoDataFrame parsed by an earlier call
+            with the same options, as long as the file is unchanged on disk. The cached
+            GeoDataFrame is shared, so it must not be modified in place. Defaults to False.
+        kwargs: Keyword arguments to pass to geopandas.read_parquet or geopandas.read_file.
+
+    Returns:
+        geopandas.GeoDataFrame: The vector data.
+    """
+    if cache:
+        key = _vector_cache_key(
+            filename, "gdf", columns=columns, where=where, bbox=bbox, **kwargs
+        )
+        if key is not None:
+            gdf = _vector_cache.get(key)
+            if gdf is None:
+                gdf = read_vector(filename, columns=columns, where=where, bbox=bbox, **kwargs)
+                _vector_cache.set(key, gdf)
+            return gdf
+
+    import geopandas as gpd
+
+    ext = os.path.splitext(str(filename))[1].lower() if isinstance(filename, str) else ""
+    if ext in [".parquet", ".geoparquet"]:
+        return _read_geoparquet(filename, columns=columns, where=where, bbox=bbox, **kwargs)
+
+    extra = []
+    if columns is not None:
+        columns = list(columns)
+        if where is not None and isinstance(filename, str):
+            # GDAL evaluates the where clause on the read fields only, so the
+            # fields it mentions are read too and dropped afterwards.
+            import re
+            import pyogrio
+
+            fields = pyogrio.read_info(filename, layer=kwargs.get("layer"))["fields"]
+            words = set(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", where))
+            extra = [f for f in fields if f in words and f not in columns]
+        kwargs["columns"] = columns + extra
+    if where is not None:
+        kwargs["where"] = where
+    if bbox is not None:
+        kwargs["bbox"] = tuple(bbox)
+    if kwargs.get("engine", "pyogrio") == "pyogrio" and "use_arrow" not in kwargs:
+        try:
+            import pyarrow  # noqa: F401
+            import pyogrio  # noqa: F401
+
+            kwargs["use_arrow"] = True
+        except ImportError:
+            pass
+    gdf = gpd.read_file(filename, **kwargs)
+    return gdf.drop(columns=extra) if extra else gdf
+
+
+def _read_geoparquet(filename, columns=None, where=None, bbox=None, **kwargs):
+    """Read a GeoParquet file for read_vector."""
+    import json
+    import geopandas as gpd
+
+    check_package("pyarrow", URL="https://arrow.apache.org/docs/python/install.html")
+    import pyarrow.parquet as pq
+
+    if not str(filename).startswith("http"):
+        kwargs.setdefault("memory_map", True)
+    if where is not None:
+        if isinstance(where, str):
+            raise ValueError("where must be given as pyarrow filters for GeoParquet files.")
+        kwargs["filters"] = where
+    if columns is not None:
+        geo = json.loads(pq.read_schema(filename).metadata[b"geo"])
+        primary = geo["primary_column"]
+        kwargs["columns"] = list(columns) + ([primary] if primary not in columns else [])
+
+    if bbox is None:
+        return gpd.read_parquet(filename, **kwargs)
+    try:
+        return gpd.read_parquet(filename, bbox=tuple(bbox), **kwargs)
+    except ValueError:
+        # Without a bbox covering column the rows are filtered after reading.
+        from shapely.geometry import box
+
+        gdf = gpd.read_parquet(filename, **kwargs)
+        index = gdf.sindex.query(box(*bbox), predicate="intersects")
+        return gdf.iloc[sorted(index)]
+
+
+def read_vector_geojson(
+    filename,
+    columns=None,
+    where=None,
+    bbox=None,
+    precision=None,
+    report=False,
+    cache=True,
+    **kwargs,
+):
+    """Read a vector file into the GeoJSON payload sent to the map.
+
+    With `cache`, both the parsed GeoDataFrame and the payload are kept in the
+    process-wide vector cache, so loading an unchanged file again skips the
+    parsing and the serialization.
+
+    Args:
+        filename (str): The file path or URL of the vector data.
+        columns (list, optional): The attribute columns to read. Defaults to None (all).
+        where (str | list, optional): The attribute filter, see read_vector. Defaults to None.
+        bbox (tuple, optional): Only read features intersecting (minx, miny, maxx, maxy). Defaults to None.
+        precision (int, optional): If set, snap coordinates to this many decimals, see
+            rastvectpy.vector.encode_geojson. Defaults to None.
+        report (bool, optional): Whether to measure the bytes saved by `precision`, see
+            rastvectpy.vector.encode_geojson. Defaults to False.
+        cache (bool, optional): Whether to use the vector cache. Defaults to True.
+        kwargs: Keyword arguments to pass to read_vector.
+
+    Returns:
+        tuple: The GeoJSON dict, shared with the cache so it must not be modified in place,
+            and the encoding report, or None without `precision` and `report`.
+    """
+    options = dict(columns=columns, where=where, bbox=bbox, **kwargs)
+    key = None
+    if cache:
+        key = _vector_cache_key(filename, "geojson", precision=precision, report=report, **options)
+    if key is not None:
+        value = _vector_cache.get(key)
+        if value is not None:
+            return value
+
+    gdf = read_vector(filename, cache=cache, **options)
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+    if precision is not None:
+        from .vector import encode_geojson
+
+        value = encode_geojson(gdf, precision=precision, report=report)
+    else:
+        value = (gdf.__geo_interface__, None)
+    nbytes = value[1]["bytes_after"] if value[1] is not None else _geojson_nbytes(gdf)
+    if key is not None:
+        _vector_cache.set(key, value, nbytes=nbytes)
+    return value
+
+
+def read_geojson_from_url(url, columns=None, where=None, bbox=None):
+    """Read a remote GeoJSON file into a GeoDataFrame.
+
+    Args:
+        url (str): The URL of the GeoJSON file.
+        columns (list, optional): The attribute columns to read. Defaults to None (all).
+        where (str, optional): An SQL WHERE clause to filter the features. Defaults to None.
+        bbox (tuple, optional): Only read features intersecting (minx, miny, maxx, maxy). Defaults to None.
+
+    Returns:
+        geopandas.GeoDataFrame: The vector data, or None if it could not be read.
+    """
+    import httpx
+
+    try:
+        filename = download_file(url)
+        return read_vector(filename, columns=columns, where=where, bbox=bbox)
+    except (ValueError, httpx.HTTPError) as e:
+        print("Error:", e)
+    return None
+
+
+_csv_converters = {
+    "shp": (csv_to_shp, ".shp"),
+    "geojson": (csv_to_geojson, ".geojson"),
+    "parquet": (csv_to_parquet, ".parquet"),
+}
+
+
+def _convert_csv_file(task):
+    """Convert one CSV file for csv_batch_convert. Runs in a worker process.
+
+    The output is written under a temporary name and moved into place only
+    once the conversion succeeds, so a failed or interrupted run never
+    leaves a partial file that a later run would take as up to date.
+    """
+    in_csv, out_file, output_format, kwargs = task
+    convert = _csv_converters[output_format][0]
+    result = {"input": in_csv, "output": out_file, "rows": 0, "seconds": 0.0, "error": None}
+
+    base, ext = os.path.splitext(out_file)
+    part = os.path.join(
+        os.path.dirname(base), f".{os.path.basename(base)}.{os.getpid()}.part"
+    )
+    # The main file goes last, as its mtime marks the output as up to date.
+    exts = [".dbf", ".shx", ".prj", ".cpg", ext] if ext == ".shp" else [ext]
+
+    start = time.perf_counter()
+    try:
+        result["rows"] = convert(in_csv, part + ext, verbose=False, **kwargs)
+        for suffix in exts:
+            if os.path.exists(part + suffix):
+                os.replace(part + suffix, base + suffix)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        for suffix in exts:
+            if os.path.exists(part + suffix):
+                os.remove(part + suffix)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def csv_batch_convert(
+    inputs,
+    out_dir=None,
+    output_format="geojson",
+    x="longitude",
+    y="latitude",
+    workers=None,
+    overwrite=False,
+    chunksize=None,
+):
+    """Convert many CSV files to vector files in parallel across processes.
+
+    Args:
+        inputs (str | list): A glob pattern, or a list of CSV file paths.
+        out_dir (str, optional): The output directory. Defaults to None (next to each input).
+        output_format (str, optional): The output format, one of "shp", "geojson" or "parquet".
+            Defaults to "geojson".
+        x (str, optional): The name of the column containing longitude coordinates. Defaults to "longitude".
+        y (str, optional): The name of the column containing latitude coordinates. Defaults to "latitude".
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        overwrite (bool, optional): Whether to convert files whose output is already newer
+            than the input. Defaults to False.
+        chunksize (int, optional): The number of rows per chunk, see csv_to_shp. Defaults to None.
+
+    Returns:
+        list: One dict per input, in input order, with the keys input, output, rows,
+            seconds, error and skipped. Inputs that would be written to the same output
+            file, e.g. files of the same name from a recursive glob, are reported as errors.
+    """
+    import glob
+    from concurrent.futures import ProcessPoolExecutor
+
+    if output_format not in _csv_converters:
+        raise ValueError(
+            f"output_format must be one of the following: {', '.join(_csv_converters)}"
+        )
+
+    if isinstance(inputs, str):
+        inputs = sorted(glob.glob(inputs, recursive=True))
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    ext = _csv_converters[output_format][1]
+    kwargs = {"x": x, "y": y, "chunksize": chunksize}
+    out_files = []
+    for in_csv in inputs:
+        stem = os.path.splitext(os.path.basename(in_csv))[0]
+        out_files.append(os.path.join(out_dir or os.path.dirname(in_csv), stem + ext))
+    # Inputs with the same name in different folders map to the same output
+    # in out_dir; converting them would race or wrongly skip all but one.
+    counts = collections.Counter(os.path.normcase(os.path.abspath(f)) for f in out_files)
+
+    results = []
+    tasks = []
+    for in_csv, out_file in zip(inputs, out_files):
+        result = {
+            "input": in_csv,
+            "output": out_file,
+            "rows": 0,
+            "seconds": 0.0,
+            "error": None,
+            "skipped": False,
+        }
+        if not os.path.exists(in_csv):
+            result["error"] = "FileNotFoundError: The specified input csv does not exist."
+        elif counts[os.path.normcase(os.path.abspath(out_file))] > 1:
+            result["error"] = (
+                f"ValueError: Several inputs would be written to {out_file}; "
+                "rename them or convert them without out_dir."
+            )
+        elif (
+            not overwrite
+            and os.path.exists(out_file)
+            and os.path.getmtime(out_file) >= os.path.getmtime(in_csv)
+        ):
+            result["skipped"] = True
+        else:
+            tasks.append((len(results), (in_csv, out_file, output_format, kwargs)))
+        results.append(result)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks) or 1))
+
+    pending = [task for _, task in tasks]
+    if workers == 1:
+        done = list(map(_convert_csv_file, pending))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            done = list(executor.map(_convert_csv_file, pending))
+    for (i, _), result in zip(tasks, done):
+        results[i].update(result)
+
+    return results
+
+
+def _load_layer_data(task):
+    """Fetch and parse the data of one layer for Map.add_layers.
+
+    Runs in a worker thread or process, so it only returns picklable data.
+    A data of None in the result means the layer method reads the source
+    itself when it is attached.
+    """
+    kind, data, options = task
+    result = {"data": None, "report": None, "error": None, "seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        if kind == "raster":
+            if not os.path.exists(data):
+                # Warms the TiTiler cache that add_raster reads from.
+                cog_tile_info(data, titiler_endpoint=options.get("titiler_endpoint"))
+        elif kind == "xy":
+            if isinstance(data, str):
+                import pandas as pd
+
+                if data.startswith("http"):
+                    data = download_file(data)
+                elif not os.path.exists(data):
+                    raise FileNotFoundError("The specified input csv does not exist.")
+                result["data"] = pd.read_csv(data)
+        elif isinstance(data, str) and not options.get("dynamic"):
+            if kind == "geojson":
+                import json
+
+                path = download_file(data) if data.startswith("http") else data
+                with open(path) as f:
+                    result["data"] = json.load(f)
+                whole = not (options.get("lod") or options.get("vector_tiles"))
+                if options.get("precision") is not None and whole:
+                    from .vector import encode_geojson
+
+                    result["data"], result["report"] = encode_geojson(
+                        result["data"],
+                        precision=options["precision"],
+                        report=options.get("report", False),
+                    )
+            else:
+                filters = {k: options.get(k) for k in ["columns", "where", "bbox"]}
+                if options.get("lod") or options.get("vector_tiles"):
+                    result["data"] = read_vector(data, cache=True, **filters)
+                else:
+                    result["data"], result["report"] = read_vector_geojson(
+                        data,
+                        precision=options.get("precision"),
+                        report=options.get("report", False),
+                        **filters,
+                    )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
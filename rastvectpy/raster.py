@@ -0,0 +1,473 @@
+"""Array helpers for rendering raster data.
+
+These functions work on whole NumPy arrays at once, or on bounded chunks of
+arrays too large for memory, so they stay fast on large rasters and do not
+need matplotlib except to look up a colormap.
+"""
+
+import math
+import os
+
+import numpy as np
+
+
+def block_reduce(array, factor, func="mean", nodata=None):
+    """Downsample a 2D array by reducing non-overlapping blocks.
+
+    Edges that do not fill a whole block are reduced over the pixels they
+    have. NaN and nodata values are ignored; a block with no valid pixels
+    becomes NaN.
+
+    Args:
+        array (numpy.ndarray): The 2D array to downsample.
+        factor (int): The block size in pixels along each axis.
+        func (str, optional): The reduction, either "mean" or "nearest". Defaults to "mean".
+        nodata (float, optional): A value to ignore for "mean", in addition to NaN. Defaults to None.
+
+    Returns:
+        numpy.ndarray: The downsampled array, float for "mean" and the input dtype for "nearest".
+    """
+    if factor <= 1:
+        return np.asarray(array)
+    if func == "nearest":
+        return np.asarray(array)[factor // 2 :: factor, factor // 2 :: factor]
+    if func != "mean":
+        raise ValueError("func must be one of the following: mean, nearest")
+
+    # Accumulate one strided slice per offset in the block, which is much
+    # faster than reducing over small axes of a reshaped array.
+    array = np.asanyarray(array)
+    height, width = array.shape
+    out_h, out_w = -(-height // factor), -(-width // factor)
+    total = np.zeros((out_h, out_w), dtype="float32")
+    count = np.zeros((out_h, out_w), dtype="int32")
+    for i in range(factor):
+        for j in range(factor):
+            block = np.asarray(array[i::factor, j::factor], dtype="float32")
+            valid = np.isfinite(block)
+            if nodata is not None:
+                valid &= block != np.float32(nodata)
+            h, w = block.shape
+            np.add(total[:h, :w], block, out=total[:h, :w], where=valid)
+            count[:h, :w] += valid
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan).astype("float32")
+
+
+def open_array(source):
+    """Open raster data as an array without reading it into memory.
+
+    Args:
+        source (str | numpy.ndarray): A .npy file path, opened as a read-only
+            memory map, or an array such as numpy.memmap, returned as is.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file is not a .npy file.
+
+    Returns:
+        numpy.ndarray: The array.
+    """
+    if not isinstance(source, str):
+        return source
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"{source} does not exist.")
+    if os.path.splitext(source)[1].lower() != ".npy":
+        raise ValueError("Only .npy files can be opened as arrays.")
+    return np.load(source, mmap_mode="r")
+
+
+def decimate(array, max_shape, window=None, func="mean", chunk_bytes=64 * 1024**2):
+    """Compute a display-resolution overview of a 2D array or a window of it.
+
+    The array is reduced in bands of rows, so a memory-mapped array is read
+    a chunk at a time and memory use stays bounded by `chunk_bytes` plus the
+    size of the overview. A window small enough to fit `max_shape` is read at
+    full resolution.
+
+    Args:
+        array (numpy.ndarray): The 2D array, or 3D with bands last.
+        max_shape (tuple): The largest overview as (rows, columns).
+        window (tuple, optional): The part to read as (row_start, row_stop, col_start,
+            col_stop) in full-resolution pixels. Defaults to None (the whole array).
+        func (str, optional): The reduction, either "mean" or "nearest". Defaults to "mean".
+        chunk_bytes (int, optional): The approximate size of one band of rows. Defaults to 64 MiB.
+
+    Returns:
+        tuple: The overview and the window it covers as (row_start, row_stop, col_start, col_stop).
+    """
+    height, width = array.shape[:2]
+    if window is None:
+        window = (0, height, 0, width)
+    row_start, row_stop, col_start, col_stop = window
+    row_start, row_stop = max(0, int(row_start)), min(height, int(math.ceil(row_stop)))
+    col_start, col_stop = max(0, int(col_start)), min(width, int(math.ceil(col_stop)))
+    window = (row_start, row_stop, col_start, col_stop)
+    region = array[row_start:row_stop, col_start:col_stop]
+    rows, cols = region.shape[:2]
+
+    factor = max(1, math.ceil(max(rows / max_shape[0], cols / max_shape[1])))
+    if factor == 1:
+        return np.array(region), window
+    if func == "nearest":
+        return np.array(region[factor // 2 :: factor, factor // 2 :: factor]), window
+
+    itemsize = max(4, region.dtype.itemsize) * (region.shape[2] if region.ndim == 3 else 1)
+    step = max(1, chunk_bytes // max(1, cols * itemsize * factor)) * factor
+    parts = []
+    for i in range(0, rows, step):
+        chunk = region[i : i + step]
+        if chunk.ndim == 3:
+            bands = [block_reduce(chunk[..., b], factor, func) for b in range(chunk.shape[2])]
+            bands = np.stack(bands, axis=-1)
+            if np.issubdtype(region.dtype, np.integer):
+                bands = np.round(bands).astype(region.dtype)
+            parts.append(bands)
+        else:
+            parts.append(block_reduce(chunk, factor, func))
+    return np.concatenate(parts), window
+
+
+class RasterStats:
+    """Summary statistics of a raster, computed in one streaming pass by raster_stats.
+
+    Args:
+        total (int): The number of values read, including nodata.
+        count (int): The number of valid values.
+        minimum (float): The smallest valid value.
+        maximum (float): The largest valid value.
+        mean (float): The mean of the valid values.
+        std (float): The standard deviation of the valid values.
+        histogram (numpy.ndarray): The counts of the valid values in equal-width bins.
+        bin_edges (numpy.ndarray): The bin edges, one more than the counts.
+        sketch (tuple, optional): The sorted quantile sketch values and their cumulative
+            weights, used to estimate percentiles. Defaults to None.
+    """
+
+    def __init__(
+        self, total, count, minimum, maximum, mean, std, histogram, bin_edges, sketch=None
+    ):
+        self.total = total
+        self.count = count
+        self.nodata_count = total - count
+        self.min = minimum
+        self.max = maximum
+        self.mean = mean
+        self.std = std
+        self.histogram = histogram
+        self.bin_edges = bin_edges
+        self._sketch = sketch
+
+    def __repr__(self):
+        return (
+            f"RasterStats(count={self.count}, nodata_count={self.nodata_count}, "
+            f"min={self.min}, max={self.max}, mean={self.mean}, std={self.std})"
+        )
+
+    def percentile(self, q):
+        """Estimate percentiles from the merged quantile sketches of the chunks.
+
+        Unlike histogram bins, the sketches keep their resolution when a few
+        extreme outliers stretch the value range.
+
+        Args:
+            q (float | list): The percentile(s), between 0 and 100.
+
+        Returns:
+            float | numpy.ndarray: The estimated value(s), NaN if there are no valid values.
+        """
+        q = np.asarray(q, dtype="float64")
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()] if q.ndim else float("nan")
+        points, weights = self._sketch
+        values = np.interp(np.clip(q, 0, 100) / 100 * self.count, weights, points)
+        values = np.clip(values, self.min, self.max)
+        return float(values) if values.ndim == 0 else values
+
+    def stretch(self, low=2, high=98):
+        """Get the value range of a percentile contrast stretch.
+
+        Args:
+            low (float, optional): The percentile mapped to the first color. Defaults to 2.
+            high (float, optional): The percentile mapped to the last color. Defaults to 98.
+
+        Returns:
+            tuple: The vmin and vmax, (0.0, 1.0) if there are no valid values.
+        """
+        if self.count == 0:
+            return 0.0, 1.0
+        vmin, vmax = self.percentile([low, high]).tolist()
+        return vmin, vmax
+
+
+_SKETCH_SAMPLE = 1 << 20
+_SKETCH_SIZE = 4097
+
+
+def _chunk_stats(values, nodata, bins):
+    """Compute the partial statistics of one chunk for raster_stats."""
+    values = np.asarray(values).ravel()
+    total = values.size
+    valid = np.isfinite(values) if values.dtype.kind == "f" else None
+    if nodata is not None:
+        valid = values != nodata if valid is None else valid & (values != nodata)
+    if valid is not None and not valid.all():
+        values = values[valid]
+    if values.size == 0:
+        return total, 0, None
+    if values.dtype.kind != "f":
+        values = values.astype("float32" if values.dtype.itemsize <= 2 else "float64")
+    low, high = values.min().item(), values.max().item()
+    mean = values.mean(dtype="float64")
+    deviations = values - values.dtype.type(mean)
+    m2 = float(np.dot(deviations, deviations))
+
+    # A uniform-bin histogram by index arithmetic, much faster than np.histogram.
+    scale = bins / (high - low) if high > low else 0.0
+    np.multiply(np.subtract(values, low, out=deviations), scale, out=deviations)
+    index = deviations.astype("intp")
+    np.minimum(index, bins - 1, out=index)
+    hist = np.bincount(index, minlength=bins)
+
+    # A quantile sketch of a strided sample of at most _SKETCH_SAMPLE values.
+    sample = np.sort(values[:: max(1, values.size // _SKETCH_SAMPLE)])
+    positions = np.linspace(0, sample.size - 1, min(sample.size, _SKETCH_SIZE))
+    sketch = sample[np.round(positions).astype("intp")]
+    return total, values.size, (low, high, float(mean), m2, hist, sketch)
+
+
+def _merge_stats(parts, bins):
+    """Combine the partial statistics of all chunks into a RasterStats."""
+    total = sum(part[0] for part in parts)
+    parts = [part for part in parts if part[1]]
+    count = sum(part[1] for part in parts)
+    if count == 0:
+        return RasterStats(total, 0, None, None, None, None, np.zeros(bins, "int64"), None)
+
+    low = min(part[2][0] for part in parts)
+    high = max(part[2][1] for part in parts)
+    n, mean, m2 = 0, 0.0, 0.0
+    for _, n_part, (_, _, mean_part, m2_part, _, _) in parts:
+        # Chan et al. pairwise update of the mean and sum of squared deviations.
+        delta = mean_part - mean
+        mean += delta * n_part / (n + n_part)
+        m2 += m2_part + delta**2 * n * n_part / (n + n_part)
+        n += n_part
+
+    # Re-bin each chunk histogram onto the global range by its bin centers.
+    edges = np.linspace(low, high if high > low else low + 1, bins + 1)
+    histogram = np.zeros(bins, dtype="int64")
+    for _, _, (part_low, part_high, _, _, hist, _) in parts:
+        step = ((part_high if part_high > part_low else part_low + 1) - part_low) / bins
+        centers = np.clip(part_low + (np.arange(bins) + 0.5) * step, part_low, part_high)
+        index = np.clip(np.searchsorted(edges, centers, side="right") - 1, 0, bins - 1)
+        np.add.at(histogram, index, hist)
+
+    # Each sketch value stands for an equal share of its chunk's values.
+    points = np.concatenate([part[2][5] for part in parts])
+    weights = np.concatenate(
+        [np.full(len(part[2][5]), part[1] / len(part[2][5])) for part in parts]
+    )
+    order = np.argsort(points, kind="stable")
+    points, weights = points[order], weights[order]
+    sketch = (points.astype("float64"), np.cumsum(weights) - weights / 2)
+    std = math.sqrt(m2 / count)
+    return RasterStats(total, count, low, high, mean, std, histogram, edges, sketch)
+
+
+def _stats_cache_key(source, nodata, bins, bands, max_pixels):
+    """Build the cache key of a file-backed raster, or None for in-memory arrays."""
+    if isinstance(source, np.memmap):
+        path, extra = source.filename, (source.offset, source.shape, source.dtype.str)
+    elif isinstance(source, str):
+        path, extra = source, None
+    else:
+        return None
+    if path is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    return (path, stat.st_mtime_ns, stat.st_size, extra, nodata, bins, repr(bands), max_pixels)
+
+
+_stats_cache = None
+
+
+def raster_stats(
+    source,
+    nodata=None,
+    bins=1024,
+    bands=None,
+    max_pixels=None,
+    chunk_bytes=64 * 1024**2,
+    workers=None,
+    cache=True,
+):
+    """Compute histogram, percentile, mean/std and nodata statistics in one streaming pass.
+
+    The raster is read in bands of rows that are processed on a thread pool,
+    so memory use stays bounded by the chunk size even for memory-mapped or
+    on-disk rasters larger than RAM. Each chunk keeps its own histogram and a
+    quantile sketch of a sample of its values; these are merged at the end, so
+    percentiles are estimated without a full copy or sort of the data.
+
+    Args:
+        source (numpy.ndarray | str): An array or numpy.memmap, a .npy file path, or a
+            raster file path readable by rasterio.
+        nodata (float, optional): A value to ignore, in addition to NaN. Defaults to the
+            nodata value of a raster file.
+        bins (int, optional): The number of histogram bins. Defaults to 1024.
+        bands (list, optional): The 1-based bands of a raster file to include. Defaults to all.
+        max_pixels (int, optional): Read the raster decimated to about this many pixels
+            per band, trading accuracy for speed. Defaults to None (full resolution).
+        chunk_bytes (int, optional): The approximate size of one chunk. Defaults to 64 MiB.
+        workers (int, optional): The number of threads. Defaults to the number of CPUs.
+        cache (bool, optional): Whether to reuse the statistics of an unchanged file or
+            memory map. In-memory arrays are never cached. Defaults to True.
+
+    Returns:
+        RasterStats: The statistics.
+    """
+    global _stats_cache
+    from concurrent.futures import ThreadPoolExecutor
+
+    key = _stats_cache_key(source, nodata, bins, bands, max_pixels) if cache else None
+    if key is not None:
+        if _stats_cache is None:
+            from .common import LRUCache
+
+            _stats_cache = LRUCache(maxsize=64)
+        stats = _stats_cache.get(key)
+        if stats is not None:
+            return stats
+
+    if isinstance(source, str) and os.path.splitext(source)[1].lower() != ".npy":
+        tasks, read, close, nodata = _raster_file_chunks(
+            source, nodata, bands, max_pixels, chunk_bytes
+        )
+    else:
+        array = open_array(source)
+        step = 1
+        pixels = array.shape[0] * (array.shape[1] if array.ndim > 1 else 1)
+        if max_pixels is not None and pixels > max_pixels:
+            step = max(1, int(math.ceil(math.sqrt(pixels / max_pixels))))
+        rows_per_chunk = max(1, chunk_bytes // max(1, array[:1].nbytes // step)) * step
+        tasks = [
+            slice(i, i + rows_per_chunk, step) for i in range(0, array.shape[0], rows_per_chunk)
+        ]
+
+        def read(rows):
+            return array[rows, ::step] if array.ndim > 1 else array[rows]
+
+        def close():
+            pass
+
+    def process(task):
+        return _chunk_stats(read(task), nodata, bins)
+
+    workers = workers or os.cpu_count() or 1
+    try:
+        if workers == 1 or len(tasks) <= 1:
+            parts = list(map(process, tasks))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(process, tasks))
+    finally:
+        close()
+    stats = _merge_stats(parts, bins)
+    if key is not None:
+        _stats_cache.set(key, stats)
+    return stats
+
+
+def _raster_file_chunks(path, nodata, bands, max_pixels, chunk_bytes):
+    """Split a raster file into row windows, with a thread-safe reader and its cleanup."""
+    import threading
+
+    from .common import check_package
+
+    rasterio = check_package("rasterio", URL="https://rasterio.readthedocs.io")
+    from rasterio.windows import Window
+
+    with rasterio.open(path) as src:
+        width, height = src.width, src.height
+        bands = list(bands) if bands is not None else list(range(1, src.count + 1))
+        itemsize = np.dtype(src.dtypes[0]).itemsize
+        if nodata is None:
+            nodata = src.nodata
+
+    factor = 1
+    if max_pixels is not None and width * height > max_pixels:
+        factor = max(1, int(math.ceil(math.sqrt(width * height / max_pixels))))
+    rows = max(1, chunk_bytes // max(1, width * itemsize * len(bands) // factor)) * factor
+    windows = [Window(0, row, width, min(rows, height - row)) for row in range(0, height, rows)]
+    local = threading.local()
+    opened = []
+
+    def read(window):
+        if not hasattr(local, "src"):
+            # rasterio datasets are not thread-safe, so each thread opens its own.
+            local.src = rasterio.open(path)
+            opened.append(local.src)
+        shape = (
+            len(bands),
+            max(1, int(window.height) // factor),
+            max(1, width // factor),
+        )
+        return local.src.read(bands, window=window, out_shape=shape)
+
+    def close():
+        for src in opened:
+            src.close()
+
+    return windows, read, close, nodata
+
+
+def colormap_lut(cmap="viridis", n=256):
+    """Sample a colormap once into an RGBA lookup table.
+
+    Args:
+        cmap (str | matplotlib.colors.Colormap | numpy.ndarray, optional): A matplotlib
+            colormap or its name, or an existing (n, 3|4) lookup table. Defaults to "viridis".
+        n (int, optional): The number of entries. Defaults to 256.
+
+    Returns:
+        numpy.ndarray: A uint8 array of shape (n, 4).
+    """
+    if isinstance(cmap, np.ndarray):
+        lut = np.asarray(cmap)
+        if lut.dtype != np.uint8:
+            lut = np.round(np.clip(lut, 0, 1) * 255).astype("uint8")
+        if lut.shape[1] == 3:
+            lut = np.column_stack([lut, np.full(len(lut), 255, dtype="uint8")])
+        return lut
+
+    import matplotlib
+
+    if isinstance(cmap, str):
+        cmap = matplotlib.colormaps[cmap]
+    return np.round(cmap(np.linspace(0, 1, n)) * 255).astype("uint8")
+
+
+def apply_colormap(values, lut, vmin, vmax):
+    """Color an array through a lookup table.
+
+    Args:
+        values (numpy.ndarray): The values to color.
+        lut (numpy.ndarray): An (n, 4) uint8 lookup table from colormap_lut.
+        vmin (float): The value mapped to the first color.
+        vmax (float): The value mapped to the last color.
+
+    Returns:
+        numpy.ndarray: A uint8 RGBA array with shape values.shape + (4,). Non-finite
+            values are transparent.
+    """
+    values = np.asarray(values, dtype="float32")
+    n = len(lut)
+    scale = (n - 1) / max(vmax - vmin, 1e-12)
+    finite = np.isfinite(values)
+    index = np.clip((np.where(finite, values, vmin) - vmin) * scale, 0, n - 1)
+    rgba = lut[index.astype("intp")]
+    rgba[..., 3] = np.where(finite, rgba[..., 3], 0)
+    return rgba
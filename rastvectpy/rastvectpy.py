@@ -1,17 +1,33 @@
 """Main module."""
 
-import numpy as np
-import matplotlib.pyplot as plt
+import collections
+import contextlib
 import ipyleaflet
+import math
 import os
 import ipywidgets as widgets
-import requests
-import pandas as pd
-import geopandas as gpd
 from IPython.display import display
-import collections
-import os
-import xyzservices.providers as xyz
+from .common import check_package
+
+
+def _format_popup(df, popup):
+    """Build popup labels with column-wise string operations.
+
+    Args:
+        df (pandas.DataFrame): The data to label.
+        popup (str | list): Column name(s) to be used for popup.
+
+    Returns:
+        pandas.Series: One HTML label per row.
+    """
+    if isinstance(popup, str):
+        return df[popup].astype(str)
+
+    labels = None
+    for item in popup:
+        part = f"{item}: " + df[item].astype(str) + "<br>"
+        labels = part if labels is None else labels + part
+    return labels
 
 
 class Map(ipyleaflet.Map):
@@ -21,6 +37,10 @@ class Map(ipyleaflet.Map):
         ipyleaflet (_type_): ipyleaflet module for visualizing vector data
     """    
 
+    # The number of widget state messages coalesced away by Map.batch.
+    sync_messages_saved = 0
+    _batch_depth = 0
+
     def __init__(self, **kwargs)-> None:
         """ Initialize an ipyleaflet map object.
 
@@ -35,24 +55,65 @@ class Map(ipyleaflet.Map):
         if "scroll_wheel_zoom" not in kwargs:
             kwargs["scroll_wheel_zoom"] = True
 
-        if "layer_control" not in kwargs:
-            kwargs["layer_control"] = True
+        layer_control = kwargs.pop("layer_control", True)
+        fullscreen_control = kwargs.pop("fullscreen_control", True)
+        height = kwargs.pop("height", "500px")
 
-        if kwargs["layer_control"]:
-            self.add_layer_control()
-
-        if "fullscreen_control" not in kwargs:
-            kwargs["fullscreen_control"] = True
-                
         super().__init__(**kwargs)
 
-        if kwargs["fullscreen_control"]:
-            self.add_fullscreen_control()
+        with self.batch():
+            if layer_control:
+                self.add_layer_control()
 
-        if "height" in kwargs:
-            self.layout.height = kwargs["height"]
-        else:
-            self.layout.height = "500px"
+            if fullscreen_control:
+                self.add_fullscreen_control()
+
+            self.layout.height = height
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Coalesce layer, control and style changes into one update per widget.
+
+        Inside the block, state changes of the map, its layout and the layers and
+        controls it held on entry are queued instead of being synced to the
+        browser one by one. On exit each changed widget sends a single update.
+        The number of messages avoided is added to `sync_messages_saved`.
+        Nested blocks join the outermost one.
+
+        Example:
+            with m.batch():
+                for filename in filenames:
+                    m.add_shp(filename)
+
+        Yields:
+            Map: The map.
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+
+        changes = collections.Counter()
+
+        def count(change):
+            if change["name"] in change["owner"].keys:
+                changes[change["owner"].model_id] += 1
+
+        held = [self, self.layout, *self.layers, *self.controls]
+        self._batch_depth = 1
+        try:
+            with contextlib.ExitStack() as stack:
+                for widget in held:
+                    widget.observe(count)
+                    stack.callback(widget.unobserve, count)
+                    stack.enter_context(widget.hold_sync())
+                yield self
+        finally:
+            self._batch_depth = 0
+            self.sync_messages_saved += sum(n - 1 for n in changes.values())
      
     def add_search_control(self, position="topleft", **kwargs):
         """Add a search control to the map.
@@ -127,15 +188,36 @@ class Map(ipyleaflet.Map):
         fullscreen_control = ipyleaflet.FullScreenControl(position=position, **kwargs)
         self.add_control(fullscreen_control)
 
-    def add_tile_layer(self, url, name, attribution="", **kwargs):
+    def add_tile_layer(self, url, name, attribution="", offline=None, **kwargs):
         """Add a tile layer to the map.
 
         Args:
             url (str): The url of the tile layer.
             name (str): The name of the tile layer.
             attribution (str): The attribution of the tile layer.
+            offline (bool | str, optional): Whether to serve the tiles through a local caching
+                proxy that keeps every tile in an MBTiles file, see
+                rastvectpy.tileserver.CachingTileSource. A string is the MBTiles file path; True
+                uses a file per url in the "tiles" folder of RASTVECTPY_CACHE_DIR or
+                ~/.cache/rastvectpy. Use CachingTileSource.prefetch to download an area ahead of
+                time. Defaults to None.
             kwargs: Keyword arguments to pass to the ipyleaflet.TileLayer constructor.
         """  
+        if offline:
+            from .tileserver import CachingTileSource, get_tile_server
+
+            path = offline
+            if path is True:
+                import hashlib
+
+                from .common import _cache_dir
+
+                folder = _cache_dir("tiles")
+                os.makedirs(folder, exist_ok=True)
+                digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+                path = os.path.join(folder, f"{digest}.mbtiles")
+            url = get_tile_server().add_source(CachingTileSource(url, path))
+
         tile_layer = ipyleaflet.TileLayer(url=url, name=name, attribution=attribution, **kwargs)
         self.add_layer(tile_layer)
 
@@ -146,7 +228,7 @@ class Map(ipyleaflet.Map):
 
         Args:
             basemap (str): The name of the basemap.
-            kwargs: Keyword arguments to pass to the ipyleaflet.basemap constructor.
+            kwargs: Keyword arguments to pass to add_tile_layer, e.g. offline=True.
         """  
 
         if basemap.lower() == "roadmap":
@@ -166,109 +248,510 @@ class Map(ipyleaflet.Map):
                 basemap = eval(f"xyz.{basemap}")
                 url = basemap.build_url()
                 attribution = basemap.attribution
-                self.add_tile_layer(url, name=basemap.name, attriution = attribution)
+                self.add_tile_layer(url, name=basemap.name, attribution=attribution, **kwargs)
             except:
                 raise ValueError(f"Basemap '{basemap}' is not supported. Please choose one of the following: roadmap, satellite, terrain, hybrid or provide a valid url.")
     
 
-    def add_geojson(self, data, name='GeoJSON', **kwargs):
+    def add_geojson(
+        self,
+        data,
+        name='GeoJSON',
+        lod=False,
+        precision=None,
+        vector_tiles=False,
+        report=False,
+        **kwargs,
+    ):
         """Add a geojson to the map.
 
         Args:
-            data (dict): The geojson data.
-            kwargs: Keyword arguments to pass to the ipyleaflet.GeoJSON constructor.
+            data (dict | geopandas.GeoDataFrame): The geojson data.
+            lod (bool | dict, optional): Whether to send geometries simplified for the current
+                zoom, swapping levels as the map zooms. A dict is passed as keyword arguments
+                to rastvectpy.vector.LevelOfDetail. Defaults to False.
+            precision (int, optional): If set, snap coordinates to this many decimals before
+                sending them to the map. This is the only encoding the map applies, as
+                ipyleaflet needs plain GeoJSON; see rastvectpy.vector.to_topojson to export
+                shared arcs and delta-encoded coordinates. Defaults to None.
+            vector_tiles (bool | dict, optional): Whether to serve the data as vector tiles from
+                the in-process tile server instead of sending it whole, which suits very large
+                layers. A dict is passed as keyword arguments to
+                rastvectpy.tileserver.VectorTileSource. Defaults to False.
+            report (bool, optional): With `precision`, whether to measure the bytes saved and
+                store them in the layer's `encoding_report` attribute. Defaults to False.
+            kwargs: Keyword arguments to pass to the ipyleaflet.GeoJSON constructor, or the
+                `style` of the vector tile layer.
         """  
         if isinstance(data, str):
             import json
             with open(data, "r") as f:
                 data = json.load(f)
 
-        geojson = ipyleaflet.GeoJSON(data=data, name=name, **kwargs)
-        self.add_layer(geojson)
+        if lod or vector_tiles:
+            import geopandas as gpd
 
-    def add_shp(self, data, name='Shapefile', **kwargs):
-        """Add a shapefile to the map.
+            if isinstance(data, gpd.GeoDataFrame):
+                gdf = data
+            else:
+                gdf = gpd.GeoDataFrame.from_features(data, crs="EPSG:4326")
+            if vector_tiles:
+                self._add_vector_tile_layer(gdf, name=name, vector_tiles=vector_tiles, **kwargs)
+                return
+            self._add_lod_layer(gdf, name=name, lod=lod, precision=precision, **kwargs)
+            return
+
+        if precision is not None:
+            from .vector import encode_geojson
+
+            data, encoding_report = encode_geojson(data, precision=precision, report=report)
+        else:
+            encoding_report = None
+            if not isinstance(data, dict):
+                data = data.__geo_interface__
+
+        self._add_geojson_payload(data, encoding_report, name=name, **kwargs)
+
+    def _add_geojson_payload(self, data, report, name, **kwargs):
+        """Add a prepared GeoJSON dict as a layer, keeping its encoding report.
 
         Args:
-            data (str): The url of the shapefile.
-            kwargs: Keyword arguments to pass to the ipyleaflet.GeoData constructor.
-        """  
-        import geopandas as gpd
-        gdf = gpd.read_file(data)
-        # geojson = gdf.to_json() : this convert to a string but needs to be converted to a dictionary
-        geojson = gdf.__geo_interface__
-        self.add_geojson(geojson, name=name, **kwargs)
+            data (dict): The GeoJSON FeatureCollection.
+            report (dict): The report from rastvectpy.vector.encode_geojson, or None.
+            name (str): The layer name.
+            kwargs: Keyword arguments to pass to the ipyleaflet.GeoJSON constructor.
+
+        Returns:
+            ipyleaflet.GeoJSON: The layer added to the map.
+        """
+        layer = ipyleaflet.GeoJSON(data=data, name=name, **kwargs)
+        if report is not None:
+            layer.encoding_report = report
+        self.add_layer(layer)
+        return layer
+
+    def _add_vector_tile_layer(self, gdf, name, vector_tiles=True, style=None, **kwargs):
+        """Serve a GeoDataFrame as vector tiles and add them as a layer.
+
+        Args:
+            gdf (geopandas.GeoDataFrame): The vector data.
+            name (str): The layer name.
+            vector_tiles (bool | dict, optional): A dict is passed as keyword arguments to
+                rastvectpy.tileserver.VectorTileSource. Defaults to True.
+            style (dict, optional): The Leaflet path style of the features. Defaults to None.
+            kwargs: Keyword arguments to pass to the ipyleaflet.VectorTileLayer constructor.
+
+        Returns:
+            ipyleaflet.VectorTileLayer: The layer added to the map.
+        """
+        from .tileserver import VectorTileSource, get_tile_server
+
+        options = dict(vector_tiles) if isinstance(vector_tiles, dict) else {}
+        options.setdefault("layer_name", "layer")
+        source = VectorTileSource(gdf, **options)
+        url = get_tile_server().add_source(source)
+
+        layer_style = {"weight": 1, "color": "#3388ff", "fill": True, "fillOpacity": 0.2}
+        layer_style.update(style or {})
+        for key in ["point_style", "hover_style", "style_callback"]:
+            kwargs.pop(key, None)
+        layer = ipyleaflet.VectorTileLayer(
+            url=url, name=name, layer_styles={source.layer_name: layer_style}, **kwargs
+        )
+        self.add_layer(layer)
+        return layer
+
+    def _add_lod_layer(self, gdf, name, lod=True, precision=None, **kwargs):
+        """Add a GeoDataFrame as a GeoJSON layer whose detail follows the map zoom.
 
+        Args:
+            gdf (geopandas.GeoDataFrame): The vector data.
+            name (str): The layer name.
+            lod (bool | dict, optional): A dict is passed as keyword arguments to
+                rastvectpy.vector.LevelOfDetail. Defaults to True.
+            precision (int, optional): The number of decimals to keep. Defaults to None.
+            kwargs: Keyword arguments to pass to the ipyleaflet.GeoJSON constructor.
 
-    def add_shp(self, url, name='Shapefile', **kwargs):
+        Returns:
+            ipyleaflet.GeoJSON: The layer added to the map.
+        """
+        from .vector import LevelOfDetail
+
+        options = dict(lod) if isinstance(lod, dict) else {}
+        if precision is not None:
+            options.setdefault("precision", precision)
+        levels = LevelOfDetail(gdf, **options)
+        layer = ipyleaflet.GeoJSON(data=levels.get_geojson(self.zoom), name=name, **kwargs)
+        current = {"level": levels.level(self.zoom)}
+
+        def update(change):
+            level = levels.level(change["new"])
+            if level != current["level"]:
+                current["level"] = level
+                layer.data = levels.get_geojson(change["new"])
+
+        self.observe(update, names="zoom")
+        self.add_layer(layer)
+        return layer
+
+    def add_shp(
+        self,
+        url,
+        name='Shapefile',
+        lod=False,
+        dynamic=False,
+        columns=None,
+        where=None,
+        bbox=None,
+        **kwargs,
+    ):
         """Add a shapefile to the map.
 
+        Any format supported by rastvectpy.common.read_vector can be added,
+        including GeoParquet files written by csv_to_parquet. Parsed files and
+        their GeoJSON payloads are kept in a process-wide cache (see
+        rastvectpy.common.vector_cache_info), so adding an unchanged file again
+        is nearly free.
+
         Args:
             data (str): The url of the shapefile.
-            kwargs: Keyword arguments to pass to the ipyleaflet.GeoData constructor.
+            lod (bool | dict, optional): Whether to send geometries simplified for the current
+                zoom, see add_geojson. Defaults to False.
+            dynamic (bool | dict, optional): Whether to load only the features inside the
+                current view, refreshing as the map pans and zooms. A dict is passed as keyword
+                arguments to add_dynamic_layer. The filters, precision and style are applied
+                to the dynamic layer too; it cannot be combined with lod, vector_tiles or report.
+                Defaults to False.
+            columns (list, optional): The attribute columns to read. Defaults to None (all).
+            where (str, optional): An SQL WHERE clause to filter the features, see
+                rastvectpy.common.read_vector. Defaults to None.
+            bbox (tuple, optional): Only read features intersecting (minx, miny, maxx, maxy),
+                in the coordinate system of the data. Defaults to None.
+            kwargs: Keyword arguments to pass to add_geojson, e.g. precision, report or
+                vector_tiles, and the ipyleaflet.GeoJSON constructor.
         """  
-        import geopandas as gpd
-        gdf = gpd.read_file(url)
-        geojson = gdf.__geo_interface__
-        self.add_geojson(geojson, name=name, **kwargs)
+        if dynamic:
+            if lod or kwargs.pop("vector_tiles", False) or kwargs.pop("report", False):
+                raise ValueError("dynamic cannot be combined with lod, vector_tiles or report.")
+            options = dict(dynamic) if isinstance(dynamic, dict) else {}
+            filters = [("columns", columns), ("where", where), ("bbox", bbox)]
+            filters += [(key, kwargs.pop(key, None)) for key in ["precision", "style"]]
+            for key, value in filters:
+                if value is not None:
+                    options.setdefault(key, value)
+            if kwargs:
+                options["layer_kwargs"] = {**kwargs, **options.get("layer_kwargs", {})}
+            self.add_dynamic_layer(url, name=name, **options)
+            return
+
+        vector_tiles = kwargs.pop("vector_tiles", False)
+        if lod or vector_tiles:
+            from .common import read_vector
+
+            gdf = read_vector(url, columns=columns, where=where, bbox=bbox, cache=True)
+            self.add_geojson(gdf, name=name, lod=lod, vector_tiles=vector_tiles, **kwargs)
+            return
+
+        from .common import read_vector_geojson
+
+        data, report = read_vector_geojson(
+            url,
+            columns=columns,
+            where=where,
+            bbox=bbox,
+            precision=kwargs.pop("precision", None),
+            report=kwargs.pop("report", False),
+        )
+        self._add_geojson_payload(data, report, name=name, **kwargs)
+
+
+    def add_dynamic_layer(
+        self,
+        filename,
+        name="Dynamic layer",
+        margin=0.25,
+        debounce=0.3,
+        min_zoom=None,
+        style=None,
+        precision=None,
+        layer_kwargs=None,
+        **kwargs,
+    ):
+        """Add a vector file that only loads the features inside the current view.
+
+        A spatial index over the file is built once (see rastvectpy.vector.ViewportSource).
+        When the map pans or zooms, the layer is refreshed after `debounce` seconds
+        without further changes, reading only the features that are new to the view.
+
+        Args:
+            filename (str): The file path of the vector data.
+            name (str, optional): The layer name. Defaults to "Dynamic layer".
+            margin (float, optional): The fraction of the view size to load around it. Defaults to 0.25.
+            debounce (float, optional): The seconds to wait for the view to settle. Defaults to 0.3.
+            min_zoom (int, optional): Below this zoom the layer is left empty. Defaults to None.
+            style (dict, optional): The style of the features. Defaults to None.
+            precision (int, optional): If set, snap coordinates to this many decimals before
+                they are sent, see rastvectpy.vector.quantize_geometries. Defaults to None.
+            layer_kwargs (dict, optional): Keyword arguments to pass to the ipyleaflet.GeoJSON
+                constructor, e.g. hover_style. Defaults to None.
+            kwargs: Keyword arguments to pass to rastvectpy.vector.ViewportSource, e.g. columns,
+                where or bbox.
+
+        Returns:
+            ipyleaflet.GeoJSON: The layer added to the map.
+        """
+        import threading
+        from .vector import ViewportSource, quantize_geometries
+
+        source = ViewportSource(filename, margin=margin, **kwargs)
+        layer = ipyleaflet.GeoJSON(
+            data={"type": "FeatureCollection", "features": []},
+            name=name,
+            style=style or {},
+            **(layer_kwargs or {}),
+        )
+
+        def read(bbox):
+            gdf = source.read(bbox)
+            if precision is not None:
+                gdf = gdf.copy(deep=False)
+                gdf[gdf.geometry.name] = quantize_geometries(gdf.geometry.values, precision)
+            return gdf.__geo_interface__
+
+        state = {"pending": None, "generation": 0}
+        # Timer.cancel does not stop a refresh that already started, so refreshes
+        # run one at a time and a refresh superseded by a newer view is dropped.
+        lock = threading.Lock()
+
+        def refresh(generation):
+            with lock:
+                if generation != state["generation"]:
+                    return
+                if min_zoom is not None and self.zoom < min_zoom:
+                    data = {"type": "FeatureCollection", "features": []}
+                elif len(self.bounds) == 2:
+                    (south, west), (north, east) = self.bounds
+                    data = read([west, south, east, north])
+                else:
+                    return
+                if generation == state["generation"]:
+                    layer.data = data
+
+        def schedule(change=None):
+            state["generation"] += 1
+            if not debounce:
+                refresh(state["generation"])
+                return
+            if state["pending"] is not None:
+                state["pending"].cancel()
+            state["pending"] = threading.Timer(debounce, refresh, args=(state["generation"],))
+            state["pending"].daemon = True
+            state["pending"].start()
+
+        self.observe(schedule, names=["bounds", "zoom"])
+        refresh(state["generation"])
+        self.add_layer(layer)
+        return layer
+
+    def add_layers(self, specs, workers=None, executor="thread"):
+        """Load several layers in parallel and add them to the map in order.
+
+        The sources are fetched and parsed concurrently, then the layers are
+        attached in the order of `specs` inside Map.batch, so the layer stack does
+        not depend on which source finished first. A failing layer does not stop
+        the others.
+
+        Args:
+            specs (list): One dict per layer with a "type" key, one of "geojson", "shp",
+                "raster" or "xy", and a "data" key with the file path, URL or object passed
+                to add_geojson, add_shp, add_raster or add_xy_data. The other keys are passed
+                as keyword arguments to that method; "name" is also accepted for "xy" layers.
+            workers (int, optional): The number of workers. Defaults to one per layer, at most 32.
+            executor (str, optional): "thread" to load on a thread pool, best for remote data, or
+                "process" to parse local files on a process pool. Raster layers are always loaded
+                on threads. Defaults to "thread".
+
+        Raises:
+            ValueError: If a layer type or the executor is not supported.
+
+        Returns:
+            list: One dict per spec with the keys name, type, layer (None on failure),
+                error (None on success) and seconds spent loading.
+        """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+        from .common import _load_layer_data
+
+        methods = {
+            "geojson": self.add_geojson,
+            "shp": self.add_shp,
+            "raster": self.add_raster,
+            "xy": self.add_xy_data,
+        }
+        default_names = {
+            "geojson": "GeoJSON",
+            "shp": "Shapefile",
+            "raster": "Raster",
+            "xy": "Marker cluster",
+        }
+        if executor not in ["thread", "process"]:
+            raise ValueError("executor must be one of the following: thread, process")
+        for spec in specs:
+            if spec.get("type") not in methods:
+                raise ValueError(
+                    f"type must be one of the following: {', '.join(methods)}"
+                )
 
-    def read_geojson_from_url(url):
+        load_keys = [
+            "columns",
+            "where",
+            "bbox",
+            "precision",
+            "report",
+            "lod",
+            "vector_tiles",
+            "dynamic",
+            "titiler_endpoint",
+        ]
+        tasks = [
+            (spec["type"], spec.get("data"), {k: spec[k] for k in load_keys if k in spec})
+            for spec in specs
+        ]
+        if workers is None:
+            workers = min(32, len(specs))
+        workers = max(1, workers)
+
+        threads = ThreadPoolExecutor(max_workers=workers)
+        processes = ProcessPoolExecutor(max_workers=workers) if executor == "process" else None
+        futures = []
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            gdf = gpd.read_file(response.content)
-            return gdf
-        except (ValueError, requests.exceptions.RequestException) as e:
-            print("Error:", e)
-        return None
+            futures = [
+                (processes if processes and task[0] != "raster" else threads).submit(
+                    _load_layer_data, task
+                )
+                for task in tasks
+            ]
+            results = []
+            with self.batch():
+                for spec, future in zip(specs, futures):
+                    loaded = future.result()
+                    kwargs = {k: v for k, v in spec.items() if k not in ["type", "data"]}
+                    name_key = "layer_name" if spec["type"] == "xy" else "name"
+                    if "name" in kwargs:
+                        kwargs[name_key] = kwargs.pop("name")
+                    kwargs.setdefault(name_key, default_names[spec["type"]])
+                    result = {
+                        "name": kwargs[name_key],
+                        "type": spec["type"],
+                        "layer": None,
+                        "error": loaded["error"],
+                        "seconds": loaded["seconds"],
+                    }
+                    if result["error"] is None:
+                        n_layers = len(self.layers)
+                        try:
+                            self._attach_loaded_layer(spec, loaded, methods, kwargs)
+                            if len(self.layers) > n_layers:
+                                result["layer"] = self.layers[-1]
+                        except Exception as e:
+                            result["error"] = f"{type(e).__name__}: {e}"
+                    results.append(result)
+        finally:
+            # shutdown(cancel_futures=True) needs Python 3.9
+            for future in futures:
+                future.cancel()
+            threads.shutdown(wait=False)
+            if processes is not None:
+                processes.shutdown(wait=False)
+        return results
+
+    def _attach_loaded_layer(self, spec, loaded, methods, kwargs):
+        """Add a layer whose data was loaded by add_layers."""
+        data = loaded["data"]
+        if data is None:
+            methods[spec["type"]](spec.get("data"), **kwargs)
+            return
+        if spec["type"] == "xy":
+            self.add_xy_data(data, **kwargs)
+            return
+
+        for key in ["columns", "where", "bbox", "dynamic"]:
+            kwargs.pop(key, None)
+        lod = kwargs.pop("lod", False)
+        vector_tiles = kwargs.pop("vector_tiles", False)
+        if lod or vector_tiles:
+            self.add_geojson(data, lod=lod, vector_tiles=vector_tiles, **kwargs)
+        else:
+            kwargs.pop("precision", None)
+            kwargs.pop("report", None)
+            self._add_geojson_payload(data, loaded["report"], **kwargs)
+
+    @staticmethod
+    def read_geojson_from_url(url, columns=None, where=None, bbox=None):
+        """Read a remote GeoJSON file into a GeoDataFrame.
+
+        Args:
+            url (str): The URL of the GeoJSON file.
+            columns (list, optional): The attribute columns to read. Defaults to None (all).
+            where (str, optional): An SQL WHERE clause to filter the features. Defaults to None.
+            bbox (tuple, optional): Only read features intersecting (minx, miny, maxx, maxy). Defaults to None.
+
+        Returns:
+            geopandas.GeoDataFrame: The vector data, or None if it could not be read.
+        """
+        from .common import read_geojson_from_url
+
+        return read_geojson_from_url(url, columns=columns, where=where, bbox=bbox)
     
 
-    def add_vector(self, vector_data, name='Vector', **kwargs):
+    def add_vector(self, vector_data, name='Vector', precision=None, **kwargs):
         """Add a vector data to the map.
 
+        The points are sent as one MultiPoint feature built directly from the
+        coordinate buffers by rastvectpy.vector.points_to_multipoint, without a
+        GeoDataFrame or per-point features in between.
+
         Args:
-            vector_data (tuple): A tuple of two 1D arrays representing the x and y coordinates of the vector data.
-            kwargs: Keyword arguments to pass to the ipyleaflet.GeoData constructor.
+            vector_data (tuple | numpy.ndarray): A tuple of two 1D arrays representing the x and y
+                coordinates of the vector data, as NumPy arrays, memoryviews or Arrow arrays, or an
+                array of shape (n, 2).
+            precision (int, optional): The number of decimals to keep. Defaults to None (all).
+            kwargs: Keyword arguments to pass to the ipyleaflet.GeoJSON constructor.
         """  
-        import geopandas as gpd
-        gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(vector_data[0], vector_data[1]))
-        geojson = gdf.__geo_interface__
+        from .vector import points_to_multipoint
+
+        if not isinstance(vector_data, (tuple, list)):
+            vector_data = vector_data[:, 0], vector_data[:, 1]
+        geojson = points_to_multipoint(vector_data[0], vector_data[1], precision=precision)
         self.add_geojson(geojson, name=name, **kwargs)
 
 
-    def add_raster(self, url, name ='Raster', fit_bounds = True, **kwargs):
+    def add_raster(self, url, name ='Raster', fit_bounds = True, titiler_endpoint=None, **kwargs):
         """Add a raster data to the map.
 
+        Remote rasters are tiled by TiTiler. Local files are served from the
+        in-process tile server in rastvectpy.tileserver, which needs rasterio.
+
         Args:
-            url (str): The url of the raster data.
+            url (str): The url or file path of the raster data.
             name (str): The name of the raster data.
             fit_bounds (bool, optional): Whether to fit the map to the extent of the raster data.
-            kwargs: Keyword arguments to pass to the ipyleaflet.ImageOverlay constructor.
+            titiler_endpoint (str, optional): The TiTiler endpoint. Defaults to the TITILER_ENDPOINT
+                environment variable or "https://titiler.xyz".
+            kwargs: Keyword arguments to pass to the ipyleaflet.TileLayer constructor.
         """  
-        import httpx
-        titiler_endpoint = "https://titiler.xyz"
-
-            # Get bounds(bounding box)
-        r = httpx.get(
-            f"{titiler_endpoint}/cog/info",
-            params = {
-                "url": url,
-            }
-        ).json()
-
-        bounds = r["bounds"]
+        if os.path.exists(url):
+            from .tileserver import RasterTileSource, get_tile_server
 
-            # Get th tile url
-        r = httpx.get(
-            f"{titiler_endpoint}/cog/tilejson.json",
-            params = {
-                "url": url,
-            }
-        ).json()
+            # Serve the local file from the in-process tile server
+            source = RasterTileSource(url)
+            bounds = source.bounds
+            tile = get_tile_server().add_source(source)
+        else:
+            from .common import cog_tile_info
 
-            # Get the tile = the url of the raster data
-        tile = r['tiles'][0]
+            # Get the bounds (bounding box) and the tile url, cached per COG
+            bounds, tile = cog_tile_info(url, titiler_endpoint=titiler_endpoint)
 
             # Add the tile to the map
         self.add_tile_layer(url=tile, name=name, **kwargs)
@@ -279,6 +762,175 @@ class Map(ipyleaflet.Map):
             self.fit_bounds(bbx)
 
 
+    def add_array(
+        self,
+        array,
+        bounds,
+        cmap="viridis",
+        name="Array",
+        vmin=None,
+        vmax=None,
+        nodata=None,
+        fit_bounds=True,
+        **kwargs,
+    ):
+        """Add an in-memory NumPy array to the map as a tile layer.
+
+        Tiles are cut from the array on demand by the in-process tile server, so
+        large arrays are never encoded as one image.
+
+        Args:
+            array (numpy.ndarray): The 2D array, with row 0 at the north edge.
+            bounds (list): The array extent as [[south, west], [north, east]] in degrees.
+            cmap (str, optional): The matplotlib colormap name. Defaults to "viridis".
+            name (str, optional): The layer name. Defaults to "Array".
+            vmin (float, optional): The value mapped to the first color. Defaults to the 2nd percentile.
+            vmax (float, optional): The value mapped to the last color. Defaults to the 98th percentile.
+            nodata (float, optional): A value to render transparent. Defaults to None.
+            fit_bounds (bool, optional): Whether to fit the map to the array extent. Defaults to True.
+            kwargs: Keyword arguments to pass to the ipyleaflet.TileLayer constructor.
+        """
+        from .tileserver import ArrayTileSource, get_tile_server
+
+        (south, west), (north, east) = bounds
+        source = ArrayTileSource(
+            array, [west, south, east, north], cmap=cmap, vmin=vmin, vmax=vmax, nodata=nodata
+        )
+        tile = get_tile_server().add_source(source)
+        self.add_tile_layer(url=tile, name=name, **kwargs)
+
+        if fit_bounds:
+            self.fit_bounds([[south, west], [north, east]])
+
+    def _add_point_geojson(
+        self, x, y, popup=None, layer_name="Points", point_style=None
+    ):
+        """Add points as a single GeoJSON layer of circle markers.
+
+        Only one GeoJSON layer and one shared popup are created, however many
+        points there are. The popup content is produced on click.
+
+        Args:
+            x (array-like): The longitude coordinates.
+            y (array-like): The latitude coordinates.
+            popup (callable, optional): A function that takes the positional index of
+                the clicked point and returns the popup HTML. Defaults to None.
+            layer_name (str, optional): The layer name to use. Defaults to "Points".
+            point_style (dict, optional): The circle marker style. Defaults to None.
+
+        Returns:
+            ipyleaflet.GeoJSON: The layer added to the map.
+        """
+        from .common import points_to_geojson
+
+        if point_style is None:
+            point_style = {
+                "radius": 4,
+                "color": "#3388ff",
+                "weight": 1,
+                "fillOpacity": 0.7,
+            }
+
+        layer = ipyleaflet.GeoJSON(
+            data=points_to_geojson(x, y), point_style=point_style, name=layer_name
+        )
+
+        if popup is not None:
+            self._attach_popup(layer, popup)
+
+        self.add(layer)
+        return layer
+
+    def _attach_popup(self, layer, popup):
+        """Show one shared popup when a point feature of a GeoJSON layer is clicked.
+
+        Args:
+            layer (ipyleaflet.GeoJSON): The layer to listen to.
+            popup (callable): A function that takes the feature id and returns the popup HTML.
+        """
+        html = widgets.HTML()
+        marker_popup = ipyleaflet.Popup(child=html, close_button=True, auto_close=False)
+
+        def handle_click(feature=None, **kwargs):
+            if feature is None or feature.get("id") is None:
+                return
+            lon, lat = feature["geometry"]["coordinates"][:2]
+            html.value = popup(int(feature["id"]))
+            marker_popup.location = [lat, lon]
+            if marker_popup not in self.layers:
+                self.add(marker_popup)
+
+        layer.on_click(handle_click)
+
+    def _add_point_clusters(
+        self, x, y, popup=None, layer_name="Clusters", point_style=None, **kwargs
+    ):
+        """Add points through a server-side cluster index.
+
+        Clusters for every zoom level are computed once. Whenever the map bounds
+        change, only the clusters inside the current view are sent to the layer.
+        The bounds change with every zoom too, so zoom is not observed separately,
+        which would send the clusters twice per zoom.
+
+        Args:
+            x (array-like): The longitude coordinates.
+            y (array-like): The latitude coordinates.
+            popup (callable, optional): A function that takes the positional index of
+                the clicked point and returns the popup HTML. Defaults to None.
+            layer_name (str, optional): The layer name to use. Defaults to "Clusters".
+            point_style (dict, optional): The circle marker style. Defaults to None.
+            kwargs: Keyword arguments to pass to rastvectpy.cluster.ClusterIndex.
+
+        Returns:
+            ipyleaflet.GeoJSON: The layer added to the map.
+        """
+        from .cluster import ClusterIndex
+
+        index = ClusterIndex(x, y, **kwargs)
+
+        if point_style is None:
+            point_style = {
+                "radius": 4,
+                "color": "#3388ff",
+                "weight": 1,
+                "fillOpacity": 0.7,
+            }
+
+        def style_callback(feature):
+            count = feature["properties"].get("point_count", 1)
+            return {"radius": point_style.get("radius", 4) + 3 * math.log2(count)}
+
+        layer = ipyleaflet.GeoJSON(
+            data={"type": "FeatureCollection", "features": []},
+            point_style=point_style,
+            style_callback=style_callback,
+            name=layer_name,
+        )
+
+        def update(change=None):
+            if len(self.bounds) == 2:
+                (south, west), (north, east) = self.bounds
+                bbox = [west, south, east, north]
+            else:
+                bbox = [-180, -90, 180, 90]
+            layer.data = index.get_clusters(bbox, self.zoom)
+
+        def zoom_to_cluster(feature=None, **kwargs):
+            if feature is None or not feature["properties"].get("cluster"):
+                return
+            lon, lat = feature["geometry"]["coordinates"][:2]
+            self.center = [lat, lon]
+            self.zoom = min(self.zoom + 2, index.max_zoom + 1)
+
+        layer.on_click(zoom_to_cluster)
+        if popup is not None:
+            self._attach_popup(layer, popup)
+
+        update()
+        self.observe(update, names=["bounds"])
+        self.add(layer)
+        return layer
+
     def add_widget(self, content, position="bottomright", **kwargs):
         """Add a widget (e.g., text, HTML, figure) to the map.
 
@@ -313,19 +965,39 @@ class Map(ipyleaflet.Map):
     def add_image(self, image, position="bottomright", **kwargs):
         """Add an image to the map.
 
+        When a pixel width or height is given, the image is downscaled to that
+        display size and re-encoded before it is sent to the browser, see
+        rastvectpy.common.resize_image. Remote images are downloaded through the
+        shared cache in rastvectpy.common.download_file.
+
         Args:
             image (str | ipywidgets.Image): The image to add.
             position (str, optional): The position of the image, can be one of "topleft",
                 "topright", "bottomleft", "bottomright". Defaults to "bottomright".
-
+            kwargs: Keyword arguments to pass to the ipywidgets.Image constructor, e.g.
+                width=200 or height="150px".
         """
 
         if isinstance(image, str):
             if image.startswith("http"):
-                image = widgets.Image(value=requests.get(image).content, **kwargs)
-            elif os.path.exists(image):
-                with open(image, "rb") as f:
-                    image = widgets.Image(value=f.read(), **kwargs)
+                from .common import download_file
+
+                image = download_file(image)
+            if os.path.exists(image):
+                from .common import resize_image
+
+                def pixels(value):
+                    value = str(value).strip()
+                    value = value[:-2] if value.endswith("px") else value
+                    return int(value) if value.isdigit() else None
+
+                value, fmt = resize_image(
+                    image,
+                    width=pixels(kwargs.get("width", "")),
+                    height=pixels(kwargs.get("height", "")),
+                )
+                kwargs.setdefault("format", fmt)
+                image = widgets.Image(value=value, **kwargs)
         elif isinstance(image, widgets.Image):
             pass
         else:
@@ -349,7 +1021,7 @@ class Map(ipyleaflet.Map):
             self.add(basemap.value)
 
 
-    def csv_to_shp(self, in_csv, out_shp, x="longitude", y="latitude"):
+    def csv_to_shp(self, in_csv, out_shp, x="longitude", y="latitude", **kwargs):
         """_Convert a CSV file to a shapefile
 
         Args:
@@ -357,19 +1029,13 @@ class Map(ipyleaflet.Map):
             out_shp (_shp_): _vector data_
             x (str, optional): _str_. Defaults to "longitude".
             y (str, optional): _str_. Defaults to "latitude".
+            kwargs: Keyword arguments to pass to rastvectpy.common.csv_to_shp, e.g. chunksize.
         """        
+        from .common import csv_to_shp
 
-        # Read the CSV file using pandas
-        df = pd.read_csv(in_csv)
-        
-        # Create a GeoDataFrame from the DataFrame
-        geometry = gpd.points_from_xy(df[x], df[y])
-        gdf = gpd.GeoDataFrame(df, geometry=geometry)
-        
-        # Save the GeoDataFrame as a Shapefile
-        gdf.to_file(out_shp, driver='ESRI Shapefile')
+        return csv_to_shp(in_csv, out_shp, x=x, y=y, **kwargs)
 
-    def csv_to_geojson(in_csv, out_geojson, x="longitude", y="latitude"):
+    def csv_to_geojson(self, in_csv, out_geojson, x="longitude", y="latitude", **kwargs):
         """_Convert a CSV file to a GeoJSON file_
 
         Args:
@@ -377,17 +1043,11 @@ class Map(ipyleaflet.Map):
             out_geojson (_GeoJSON_): _vector data_
             x (str, optional): _str_. Defaults to "longitude".
             y (str, optional): _str_. Defaults to "latitude".
+            kwargs: Keyword arguments to pass to rastvectpy.common.csv_to_geojson, e.g. chunksize.
         """        
+        from .common import csv_to_geojson
 
-        # Read the CSV file using pandas
-        df = pd.read_csv(in_csv)
-        
-        # Create a GeoDataFrame from the DataFrame
-        geometry = gpd.points_from_xy(df[x], df[y])
-        gdf = gpd.GeoDataFrame(df, geometry=geometry)
-        
-        # Save the GeoDataFrame as a GeoJSON file
-        gdf.to_file(out_geojson, driver='GeoJSON')
+        return csv_to_geojson(in_csv, out_geojson, x=x, y=y, **kwargs)
 
 
     def add_xy_data(
@@ -397,6 +1057,8 @@ class Map(ipyleaflet.Map):
             y="latitude",
             label=None,
             layer_name="Marker cluster",
+            mode="cluster",
+            point_style=None,
         ):
             """Adds points from a CSV file containing lat/lon information and display data on the map.
 
@@ -406,12 +1068,19 @@ class Map(ipyleaflet.Map):
                 y (str, optional): The name of the column containing latitude coordinates. Defaults to "latitude".
                 label (str, optional): The name of the column containing label information to used for marker popup. Defaults to None.
                 layer_name (str, optional): The layer name to use. Defaults to "Marker cluster".
+                mode (str, optional): How to render the points. "cluster" adds one ipyleaflet.Marker per row
+                    inside a MarkerCluster. "circle" adds all rows as a single GeoJSON layer of circle markers
+                    whose popups are looked up from the DataFrame on click. "server_cluster" clusters the
+                    points once with rastvectpy.cluster.ClusterIndex and only sends the clusters inside the
+                    current view. Defaults to "cluster".
+                point_style (dict, optional): The circle marker style used when mode is "circle" or "server_cluster". Defaults to None.
 
             Raises:
                 FileNotFoundError: The specified input csv does not exist.
                 ValueError: The specified x column does not exist.
                 ValueError: The specified y column does not exist.
                 ValueError: The specified label column does not exist.
+                ValueError: The specified mode is not supported.
             """
             import pandas as pd
 
@@ -420,6 +1089,10 @@ class Map(ipyleaflet.Map):
             elif not in_csv.startswith("http") and (not os.path.exists(in_csv)):
                 raise FileNotFoundError("The specified input csv does not exist.")
             else:
+                if in_csv.startswith("http"):
+                    from .common import download_file
+
+                    in_csv = download_file(in_csv)
                 df = pd.read_csv(in_csv)
 
             col_names = df.columns.values.tolist()
@@ -435,8 +1108,28 @@ class Map(ipyleaflet.Map):
                     f"label must be one of the following: {', '.join(col_names)}"
                 )
 
+            if mode not in ["cluster", "circle", "server_cluster"]:
+                raise ValueError(
+                    "mode must be one of the following: cluster, circle, server_cluster"
+                )
+
             self.default_style = {"cursor": "wait"}
 
+            if mode in ["circle", "server_cluster"]:
+                popup = None
+                if label is not None:
+                    labels = df[label]
+                    popup = lambda index: str(labels.iloc[index])
+                if mode == "circle":
+                    add_points = self._add_point_geojson
+                else:
+                    add_points = self._add_point_clusters
+                add_points(
+                    df[x], df[y], popup=popup, layer_name=layer_name, point_style=point_style
+                )
+                self.default_style = {"cursor": "default"}
+                return
+
             points = list(zip(df[y], df[x]))
 
             if label is not None:
@@ -459,97 +1152,120 @@ class Map(ipyleaflet.Map):
 
             self.default_style = {"cursor": "default"}
 
-            def add_point_layer(
-                self, filename, popup=None, layer_name="Marker Cluster", **kwargs
-            ):
-                """Adds a point layer to the map with a popup attribute.
+    def add_point_layer(
+        self,
+        filename,
+        popup=None,
+        layer_name="Marker Cluster",
+        mode="cluster",
+        columns=None,
+        where=None,
+        bbox=None,
+        **kwargs,
+    ):
+        """Adds a point layer to the map with a popup attribute.
 
-                Args:
-                    filename (str): str, http url, path object or file-like object. Either the absolute or relative path to the file or URL to be opened, or any object with a read() method (such as an open file or StringIO)
-                    popup (str | list, optional): Column name(s) to be used for popup. Defaults to None.
-                    layer_name (str, optional): A layer name to use. Defaults to "Marker Cluster".
+        Args:
+            filename (str): str, http url, path object or file-like object. Either the absolute or relative path to the file or URL to be opened, or any object with a read() method (such as an open file or StringIO). GeoParquet files are read with rastvectpy.common.read_vector.
+            popup (str | list, optional): Column name(s) to be used for popup. Defaults to None.
+            layer_name (str, optional): A layer name to use. Defaults to "Marker Cluster".
+            mode (str, optional): How to render the points, one of "cluster", "circle" or
+                "server_cluster" (see add_xy_data). In the "circle" and "server_cluster" modes the
+                popup is rendered only for the clicked point. Defaults to "cluster".
+            columns (list, optional): The attribute columns to read. The popup columns are
+                always read. Defaults to None (all).
+            where (str, optional): An SQL WHERE clause to filter the features, see
+                rastvectpy.common.read_vector. Defaults to None.
+            bbox (tuple, optional): Only read features intersecting (minx, miny, maxx, maxy),
+                in the coordinate system of the data. Defaults to None.
+            kwargs: Keyword arguments to pass to rastvectpy.common.read_vector.
+
+        Raises:
+            ValueError: If the specified column name does not exist.
+            ValueError: If the specified column names do not exist.
+            ValueError: If the specified mode is not supported.
+        """
+        import warnings
 
-                Raises:
-                    ValueError: If the specified column name does not exist.
-                    ValueError: If the specified column names do not exist.
-                """
-                import warnings
+        warnings.filterwarnings("ignore")
+        check_package(name="geopandas", URL="https://geopandas.org")
+        import geopandas as gpd
 
-                warnings.filterwarnings("ignore")
-                check_package(name="geopandas", URL="https://geopandas.org")
-                import geopandas as gpd
-                import fiona
+        if mode not in ["cluster", "circle", "server_cluster"]:
+            raise ValueError(
+                "mode must be one of the following: cluster, circle, server_cluster"
+            )
 
-                self.default_style = {"cursor": "wait"}
+        self.default_style = {"cursor": "wait"}
 
-                if isinstance(filename, gpd.GeoDataFrame):
-                    gdf = filename
-                else:
-                    if not filename.startswith("http"):
-                        filename = os.path.abspath(filename)
-                    ext = os.path.splitext(filename)[1].lower()
-                    if ext == ".kml":
-                        fiona.drvsupport.supported_drivers["KML"] = "rw"
-                        gdf = gpd.read_file(filename, driver="KML", **kwargs)
-                    else:
-                        gdf = gpd.read_file(filename, **kwargs)
-                df = gdf.to_crs(epsg="4326")
-                col_names = df.columns.values.tolist()
-                if popup is not None:
-                    if isinstance(popup, str) and (popup not in col_names):
-                        raise ValueError(
-                            f"popup must be one of the following: {', '.join(col_names)}"
-                        )
-                    elif isinstance(popup, list) and (
-                        not all(item in col_names for item in popup)
-                    ):
-                        raise ValueError(
-                            f"All popup items must be select from: {', '.join(col_names)}"
-                        )
-
-                df["x"] = df.geometry.x
-                df["y"] = df.geometry.y
-
-                points = list(zip(df["y"], df["x"]))
-
-                if popup is not None:
-                    if isinstance(popup, str):
-                        labels = df[popup]
-                        markers = [
-                            ipyleaflet.Marker(
-                                location=point,
-                                draggable=False,
-                                popup=widgets.HTML(str(labels[index])),
-                            )
-                            for index, point in enumerate(points)
-                        ]
-                    elif isinstance(popup, list):
-                        labels = []
-                        for i in range(len(points)):
-                            label = ""
-                            for item in popup:
-                                label = label + str(item) + ": " + str(df[item][i]) + "<br>"
-                            labels.append(label)
-                        df["popup"] = labels
-
-                        markers = [
-                            ipyleaflet.Marker(
-                                location=point,
-                                draggable=False,
-                                popup=widgets.HTML(labels[index]),
-                            )
-                            for index, point in enumerate(points)
-                        ]
+        if isinstance(filename, gpd.GeoDataFrame):
+            gdf = filename
+        else:
+            if not filename.startswith("http"):
+                filename = os.path.abspath(filename)
+            ext = os.path.splitext(filename)[1].lower()
+            if ext == ".kml":
+                kwargs["driver"] = "KML"
+            if columns is not None and popup is not None:
+                extra = [popup] if isinstance(popup, str) else popup
+                columns = list(columns) + [c for c in extra if c not in columns]
+
+            from .common import read_vector
+
+            gdf = read_vector(filename, columns=columns, where=where, bbox=bbox, **kwargs)
+        if gdf.crs is not None:
+            df = gdf.to_crs(epsg="4326")
+        else:
+            df = gdf
+        col_names = df.columns.values.tolist()
+        if popup is not None:
+            if isinstance(popup, str) and (popup not in col_names):
+                raise ValueError(
+                    f"popup must be one of the following: {', '.join(col_names)}"
+                )
+            elif isinstance(popup, list) and (
+                not all(item in col_names for item in popup)
+            ):
+                raise ValueError(
+                    f"All popup items must be select from: {', '.join(col_names)}"
+                )
 
-                else:
-                    markers = [
-                        ipyleaflet.Marker(location=point, draggable=False) for point in points
-                    ]
+        x = df.geometry.x
+        y = df.geometry.y
+
+        if mode in ["circle", "server_cluster"]:
+            render = None
+            if popup is not None:
+                render = lambda index: _format_popup(df.iloc[[index]], popup).iloc[0]
+            if mode == "circle":
+                add_points = self._add_point_geojson
+            else:
+                add_points = self._add_point_clusters
+            add_points(x, y, popup=render, layer_name=layer_name)
+            self.default_style = {"cursor": "default"}
+            return
 
-                marker_cluster = ipyleaflet.MarkerCluster(markers=markers, name=layer_name)
-                self.add(marker_cluster)
+        points = list(zip(y, x))
 
-                self.default_style = {"cursor": "default"}
+        if popup is not None:
+            labels = _format_popup(df, popup).tolist()
+            markers = [
+                ipyleaflet.Marker(
+                    location=point,
+                    draggable=False,
+                    popup=widgets.HTML(labels[index]),
+                )
+                for index, point in enumerate(points)
+            ]
+        else:
+            markers = [
+                ipyleaflet.Marker(location=point, draggable=False) for point in points
+            ]
+
+        marker_cluster = ipyleaflet.MarkerCluster(markers=markers, name=layer_name)
+        self.add(marker_cluster)
+
+        self.default_style = {"cursor": "default"}
 
 
 
@@ -727,48 +1443,169 @@ class Map(ipyleaflet.Map):
 #         raise Exception(e)
     
     
-    def visualize_raster(raster_data):    
+    @staticmethod
+    def visualize_raster(
+        raster_data, cmap="gray", func="mean", max_size=None, ax=None, stretch=(2, 98)
+    ):
         """
         Visualize a raster data using matplotlib.
 
+        Large and memory-mapped arrays are never plotted at full size. The image
+        shows an overview decimated to the size of the axes in screen pixels,
+        read in chunks, and zooming or panning the axes re-reads only the visible
+        window, at full resolution once it fits on screen. Plotting time and
+        memory depend on the figure size, not on the raster size.
+
         Parameters:
-        raster_data (numpy.ndarray): A 2D array of raster data.
+        raster_data (numpy.ndarray | str): A 2D array (or 3D with bands last), a numpy.memmap
+            or the path of a .npy file, which is memory-mapped.
+        cmap (str, optional): The matplotlib colormap of 2D data. Defaults to "gray".
+        func (str, optional): The decimation, either "mean" or "nearest". Defaults to "mean".
+        max_size (tuple, optional): The largest image to draw as (rows, columns). Defaults
+            to the size of the axes in pixels.
+        ax (matplotlib.axes.Axes, optional): The axes to draw on. Defaults to a new figure.
+        stretch (tuple, optional): The low and high percentiles of the contrast stretch of 2D
+            data, estimated by rastvectpy.raster.raster_stats and cached per file. Use None for
+            a min/max stretch. Defaults to (2, 98).
 
         Returns:
-        None
+        matplotlib.image.AxesImage: The image, updated as the view changes.
         """
+        import matplotlib.pyplot as plt
+
+        from .raster import decimate, open_array, raster_stats
+
+        array = open_array(raster_data)
+        height, width = array.shape[:2]
+        vmin = vmax = None
+        if stretch is not None and array.ndim == 2:
+            # A single outlier does not wash out the image.
+            source = raster_data if isinstance(raster_data, str) else array
+            stats = raster_stats(source, max_pixels=4096 * 4096)
+            vmin, vmax = stats.stretch(*stretch)
+
         # Create a figure and axis object
-        fig, ax = plt.subplots()
+        if ax is None:
+            fig, ax = plt.subplots()
         # Set the aspect ratio
         ax.set_aspect('equal')
-        # Show the raster data as an image
-        ax.imshow(raster_data, cmap='gray')
+
+        def display_shape():
+            if max_size is not None:
+                return max_size
+            bbox = ax.get_window_extent()
+            return max(1, int(bbox.height)), max(1, int(bbox.width))
+
+        def render(window):
+            overview, (r0, r1, c0, c1) = decimate(array, display_shape(), window, func=func)
+            return overview, (c0 - 0.5, c1 - 0.5, r1 - 0.5, r0 - 0.5)
+
+        # Show a display-resolution overview of the raster data as an image
+        overview, extent = render(None)
+        image = ax.imshow(
+            overview, cmap=cmap, vmin=vmin, vmax=vmax, extent=extent, interpolation="nearest"
+        )
+        ax.set_xlim(-0.5, width - 0.5)
+        ax.set_ylim(height - 0.5, -0.5)
+        ax.set_autoscale_on(False)
+        current = {"window": (0, height, 0, width)}
+
+        def update(axes):
+            (x0, x1), (y0, y1) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+            window = (
+                max(0, math.floor(y0 + 0.5)),
+                min(height, math.ceil(y1 + 0.5)),
+                max(0, math.floor(x0 + 0.5)),
+                min(width, math.ceil(x1 + 0.5)),
+            )
+            if window == current["window"] or window[0] >= window[1] or window[2] >= window[3]:
+                return
+            current["window"] = window
+            data, extent = render(window)
+            image.set_data(data)
+            image.set_extent(extent)
+
+        ax.callbacks.connect("xlim_changed", update)
+        ax.callbacks.connect("ylim_changed", update)
+
         # Set the x and y axis labels
         ax.set_xlabel('X')
         ax.set_ylabel('Y')
         # Show the plot
         plt.show()
+        return image
 
 
-    def visualize_vector(vector_data):
+    @staticmethod
+    def visualize_vector(vector_data, grid="auto", ax=None, **kwargs):
         """
         Visualize a vector data using matplotlib.
 
+        Large vector fields are averaged into a display-resolution grid before
+        they are drawn, with rastvectpy.vector.grid_vectors for scattered vectors
+        and rastvectpy.vector.block_vectors for gridded components, so plotting
+        time depends on the figure size rather than the number of vectors.
+        Extents are computed with NumPy reductions, and numpy.memmap inputs are
+        streamed in chunks.
+
         Parameters:
-        vector_data (tuple): A tuple of two 1D arrays representing the x and y coordinates of the vector data.
+        vector_data (tuple): A tuple of two 1D or 2D arrays representing the x and y components
+            of the vector data, drawn at their array indices, or of four 1D arrays x, y, u and v
+            with the positions and components.
+        grid (str | tuple, optional): The largest (rows, columns) of the averaging grid,
+            "auto" for about one arrow per 24 screen pixels when there are more vectors than that,
+            or None to draw every vector. Defaults to "auto".
+        ax (matplotlib.axes.Axes, optional): The axes to draw on. Defaults to a new figure.
+        kwargs: Keyword arguments to pass to matplotlib.axes.Axes.quiver.
 
         Returns:
-        None
+        matplotlib.quiver.Quiver: The arrows.
         """
+        import matplotlib.pyplot as plt
+        import numpy as np
+
+        from .vector import _chunked_extent, block_vectors, grid_vectors
+
         # Create a figure and axis object
-        fig, ax = plt.subplots()
-        # Plot the vector data
-        ax.quiver(vector_data[0], vector_data[1], color='blue', scale=1, units='xy', width=0.005, headwidth=5, headlength=7)
-        # Set the x and y axis limits
-        ax.set_xlim([min(vector_data[0])-1, max(vector_data[0])+1])
-        ax.set_ylim([min(vector_data[1])-1, max(vector_data[1])+1])
+        if ax is None:
+            fig, ax = plt.subplots()
+
+        chunk_size = 1 << 22
+        if grid == "auto":
+            bbox = ax.get_window_extent()
+            shape = (max(1, int(bbox.height // 24)), max(1, int(bbox.width // 24)))
+        if len(vector_data) == 2:
+            u, v = (np.asarray(a) for a in vector_data)
+            # Set the x and y axis limits from the components, before any averaging
+            umin, umax = _chunked_extent(u.ravel(), chunk_size)
+            vmin, vmax = _chunked_extent(v.ravel(), chunk_size)
+            if grid == "auto":
+                rows, cols = u.shape if u.ndim == 2 else (1, u.size)
+                grid = shape if rows > shape[0] or cols > shape[1] else None
+            # Plot the vector data
+            style = dict(color='blue', scale=1, units='xy', width=0.005, headwidth=5, headlength=7)
+            style.update(kwargs)
+            if grid is not None:
+                arrows = ax.quiver(*block_vectors(u, v, grid), **style)
+            else:
+                arrows = ax.quiver(u, v, **style)
+            ax.set_xlim([umin - 1, umax + 1])
+            ax.set_ylim([vmin - 1, vmax + 1])
+        else:
+            x, y, u, v = vector_data
+            extent = _chunked_extent(x, chunk_size) + _chunked_extent(y, chunk_size)
+            if grid == "auto":
+                grid = shape if len(x) > shape[0] * shape[1] else None
+            if grid is not None:
+                x, y, u, v, _ = grid_vectors(x, y, u, v, grid, extent=extent, chunk_size=chunk_size)
+            kwargs.setdefault("color", "blue")
+            kwargs.setdefault("angles", "xy")
+            arrows = ax.quiver(x, y, u, v, **kwargs)
+            ax.set_xlim(extent[0], extent[1])
+            ax.set_ylim(extent[2], extent[3])
         # Set the x and y axis labels
         ax.set_xlabel('X')
         ax.set_ylabel('Y')
         # Show plot
         plt.show()
+        return arrows
@@ -0,0 +1,814 @@
+"""A local tile server running in a background thread.
+
+Tile sources registered with the server are available to the map at
+`http://127.0.0.1:<port>/<name>/{z}/{x}/{y}.<ext>`. Rendered tiles are kept
+in an LRU cache, so panning back over an area does not render it again.
+Online tile layers can be proxied through an MBTiles file with
+CachingTileSource to work offline.
+"""
+
+import contextlib
+import math
+import re
+import struct
+import threading
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .common import LRUCache, check_package
+
+EARTH_CIRCUMFERENCE = 2 * math.pi * 6378137.0
+MAX_LATITUDE = 85.0511287798066
+
+_tile_path = re.compile(r"^/([\w.-]+)/(\d+)/(\d+)/(\d+)\.(\w+)$")
+
+
+def tile_bounds(z, x, y):
+    """Get the bounds of an XYZ tile in Web Mercator (EPSG:3857) meters.
+
+    Args:
+        z (int): The zoom level.
+        x (int): The tile column.
+        y (int): The tile row.
+
+    Returns:
+        tuple: The bounds as (xmin, ymin, xmax, ymax).
+    """
+    size = EARTH_CIRCUMFERENCE / 2**z
+    xmin = -EARTH_CIRCUMFERENCE / 2 + x * size
+    ymax = EARTH_CIRCUMFERENCE / 2 - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def lnglat_to_mercator(lng, lat):
+    """Project longitude/latitude degrees to Web Mercator meters.
+
+    Args:
+        lng (float | numpy.ndarray): The longitude.
+        lat (float | numpy.ndarray): The latitude, clipped to the Web Mercator range.
+
+    Returns:
+        tuple: The x and y coordinates in meters.
+    """
+    lat = np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)
+    x = np.radians(lng) * 6378137.0
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * 6378137.0
+    return x, y
+
+
+def encode_png(image, compress_level=6):
+    """Encode an image array as PNG without any imaging library.
+
+    Args:
+        image (numpy.ndarray): A uint8 array of shape (height, width) for grayscale,
+            or (height, width, 3|4) for RGB/RGBA.
+        compress_level (int, optional): The zlib compression level. Defaults to 6.
+
+    Returns:
+        bytes: The PNG file content.
+    """
+    image = np.asarray(image, dtype="uint8")
+    if image.ndim == 2:
+        image = image[:, :, np.newaxis]
+    height, width, channels = image.shape
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+
+    # Prefix every scanline with filter type 0 (None).
+    raw = np.zeros((height, width * channels + 1), dtype="uint8")
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(tag, data):
+        crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level))
+        + chunk(b"IEND", b"")
+    )
+
+
+class RasterTileSource:
+    """Render PNG tiles from a local GeoTIFF/COG with windowed reads.
+
+    Each tile is read from the overview level whose resolution best matches
+    the zoom level, and only the window covering the tile is warped.
+
+    Args:
+        path (str): The file path to the raster.
+        bands (list, optional): The 1-based band indexes to render, one for grayscale or
+            three for RGB. Defaults to the first three bands, or the first band.
+        vmin (float, optional): The value mapped to black. Defaults to the 2nd percentile,
+            see rastvectpy.raster.raster_stats.
+        vmax (float, optional): The value mapped to white. Defaults to the 98th percentile.
+        nodata (float, optional): The nodata value. Defaults to the raster nodata value.
+        resampling (str, optional): The rasterio resampling method. Defaults to "bilinear".
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+    """
+
+    extension = "png"
+    media_type = "image/png"
+
+    def __init__(
+        self,
+        path,
+        bands=None,
+        vmin=None,
+        vmax=None,
+        nodata=None,
+        resampling="bilinear",
+        tile_size=256,
+    ):
+        rasterio = check_package("rasterio", URL="https://rasterio.readthedocs.io")
+        from rasterio.warp import calculate_default_transform, transform_bounds
+
+        self.path = path
+        self.resampling = resampling
+        self.tile_size = tile_size
+        self._pool = {}
+        self._lock = threading.Lock()
+
+        with rasterio.open(path) as src:
+            if src.crs is None:
+                raise ValueError("The raster has no coordinate reference system.")
+            west, south, east, north = transform_bounds(
+                src.crs, "EPSG:4326", *src.bounds, densify_pts=21
+            )
+            self.bounds = [west, max(south, -MAX_LATITUDE), east, min(north, MAX_LATITUDE)]
+            xmin, ymin = lnglat_to_mercator(self.bounds[0], self.bounds[1])
+            xmax, ymax = lnglat_to_mercator(self.bounds[2], self.bounds[3])
+            self._mercator_bounds = (float(xmin), float(ymin), float(xmax), float(ymax))
+
+            transform, _, _ = calculate_default_transform(
+                src.crs, "EPSG:3857", src.width, src.height, *src.bounds
+            )
+            self.resolution = abs(transform.a)
+            self.overviews = src.overviews(1)
+            self.nodata = src.nodata if nodata is None else nodata
+
+            if bands is None:
+                bands = [1, 2, 3] if src.count >= 3 else [1]
+            self.bands = list(bands)
+
+            if src.dtypes[0] == "uint8" and vmin is None and vmax is None:
+                self.vmin, self.vmax = None, None
+            else:
+                if vmin is None or vmax is None:
+                    from .raster import raster_stats
+
+                    stats = raster_stats(
+                        path, nodata=self.nodata, bands=self.bands, max_pixels=2048 * 2048
+                    )
+                    low, high = stats.stretch(2, 98)
+                    vmin = low if vmin is None else vmin
+                    vmax = high if vmax is None else vmax
+                self.vmin, self.vmax = float(vmin), float(vmax)
+
+    def overview_level(self, z):
+        """Get the coarsest overview level that still resolves a tile at zoom `z`.
+
+        Args:
+            z (int): The zoom level.
+
+        Returns:
+            int: The overview level, or -1 for full resolution.
+        """
+        tile_resolution = EARTH_CIRCUMFERENCE / (self.tile_size * 2**z)
+        level = -1
+        for i, factor in enumerate(self.overviews):
+            if self.resolution * factor <= tile_resolution:
+                level = i
+        return level
+
+    @contextlib.contextmanager
+    def _dataset(self, level):
+        """Borrow an open dataset for an overview level from the pool."""
+        import rasterio
+
+        with self._lock:
+            free = self._pool.setdefault(level, [])
+            src = free.pop() if free else None
+        if src is None:
+            kwargs = {} if level < 0 else {"overview_level": level}
+            src = rasterio.open(self.path, **kwargs)
+        try:
+            yield src
+        finally:
+            with self._lock:
+                self._pool[level].append(src)
+
+    def close(self):
+        """Close the pooled datasets."""
+        with self._lock:
+            for free in self._pool.values():
+                for src in free:
+                    src.close()
+            self._pool.clear()
+
+    def get_tile(self, z, x, y):
+        """Render a tile.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The PNG tile, or None if the tile does not overlap the raster.
+        """
+        from rasterio.enums import Resampling
+        from rasterio.transform import from_bounds
+        from rasterio.vrt import WarpedVRT
+
+        bounds = tile_bounds(z, x, y)
+        xmin, ymin, xmax, ymax = self._mercator_bounds
+        if bounds[0] >= xmax or bounds[2] <= xmin or bounds[1] >= ymax or bounds[3] <= ymin:
+            return None
+
+        size = self.tile_size
+        options = {
+            "crs": "EPSG:3857",
+            "transform": from_bounds(*bounds, size, size),
+            "width": size,
+            "height": size,
+            "resampling": Resampling[self.resampling],
+        }
+        if self.nodata is None:
+            options["add_alpha"] = True
+        else:
+            options["src_nodata"] = self.nodata
+            options["nodata"] = self.nodata
+
+        with self._dataset(self.overview_level(z)) as src:
+            with WarpedVRT(src, **options) as vrt:
+                data = vrt.read(self.bands)
+                mask = vrt.dataset_mask()
+
+        if not mask.any():
+            return None
+
+        if self.vmin is not None:
+            scale = 255.0 / max(self.vmax - self.vmin, 1e-12)
+            data = np.clip((data.astype("float32") - self.vmin) * scale, 0, 255)
+        data = data.astype("uint8")
+        if len(self.bands) == 1:
+            data = np.repeat(data, 3, axis=0)
+        rgba = np.concatenate([data[:3], mask[np.newaxis]]).transpose(1, 2, 0)
+        return encode_png(rgba)
+
+
+class ArrayTileSource:
+    """Render PNG tiles on demand from an in-memory 2D NumPy array.
+
+    Low zoom levels read from a pyramid of block-mean overviews, each built
+    from the previous one the first time it is needed. Values are colored
+    through a lookup table sampled once from the colormap.
+
+    Args:
+        array (numpy.ndarray): The 2D array, with row 0 at the north edge.
+        bounds (list): The array extent in degrees as [west, south, east, north].
+        cmap (str | numpy.ndarray, optional): A matplotlib colormap name or lookup
+            table. Defaults to "viridis".
+        vmin (float, optional): The value mapped to the first color. Defaults to the 2nd percentile.
+        vmax (float, optional): The value mapped to the last color. Defaults to the 98th percentile.
+        nodata (float, optional): A value to render transparent. Defaults to None.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+    """
+
+    extension = "png"
+    media_type = "image/png"
+
+    def __init__(
+        self, array, bounds, cmap="viridis", vmin=None, vmax=None, nodata=None, tile_size=256
+    ):
+        from .raster import colormap_lut, raster_stats
+
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError("array must be a 2D array.")
+        # nodata is masked per tile and per overview, so a memory-mapped array
+        # is never copied as a whole.
+        self.nodata = nodata
+
+        west, south, east, north = bounds
+        self.bounds = [west, max(south, -MAX_LATITUDE), east, min(north, MAX_LATITUDE)]
+        self.tile_size = tile_size
+        self.lut = colormap_lut(cmap)
+        self._levels = [array]
+        self._lock = threading.Lock()
+
+        xmin, _ = lnglat_to_mercator(west, 0)
+        xmax, _ = lnglat_to_mercator(east, 0)
+        self.resolution = float(xmax - xmin) / array.shape[1]
+
+        if vmin is None or vmax is None:
+            stats = raster_stats(array, nodata=nodata, max_pixels=2048 * 2048, cache=False)
+            low, high = stats.stretch(2, 98)
+            vmin = low if vmin is None else vmin
+            vmax = high if vmax is None else vmax
+        self.vmin, self.vmax = float(vmin), float(vmax)
+
+    def level(self, i):
+        """Get pyramid level `i`, downsampled by 2**i, building it if needed.
+
+        Args:
+            i (int): The pyramid level.
+
+        Returns:
+            numpy.ndarray: The downsampled array.
+        """
+        from .raster import block_reduce
+
+        with self._lock:
+            while len(self._levels) <= i:
+                # Only the source array holds nodata; the overviews use NaN.
+                nodata = self.nodata if len(self._levels) == 1 else None
+                self._levels.append(block_reduce(self._levels[-1], 2, nodata=nodata))
+            return self._levels[i]
+
+    def get_tile(self, z, x, y):
+        """Render a tile.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The PNG tile, or None if the tile does not overlap the array.
+        """
+        from .raster import apply_colormap
+
+        size = self.tile_size
+        txmin, tymin, txmax, tymax = tile_bounds(z, x, y)
+        pixel = (txmax - txmin) / size
+
+        # Use the coarsest level that is still at least as fine as the tile pixels.
+        i = int(max(0, math.floor(math.log2(max(pixel / self.resolution, 1)))))
+        i = min(i, int(math.log2(max(self._levels[0].shape))))
+        data = self.level(i)
+        height, width = data.shape
+
+        # Map the tile pixel centers to longitude/latitude, then to array indices.
+        centers = (np.arange(size) + 0.5) * pixel
+        lng = np.degrees((txmin + centers) / 6378137.0)
+        lat = np.degrees(2 * np.arctan(np.exp((tymax - centers) / 6378137.0)) - np.pi / 2)
+        west, south, east, north = self.bounds
+        col = np.floor((lng - west) / (east - west) * width).astype("int64")
+        row = np.floor((north - lat) / (north - south) * height).astype("int64")
+        col_ok = (col >= 0) & (col < width)
+        row_ok = (row >= 0) & (row < height)
+        if not col_ok.any() or not row_ok.any():
+            return None
+
+        values = data[np.clip(row, 0, height - 1)[:, None], np.clip(col, 0, width - 1)[None, :]]
+        if i == 0 and self.nodata is not None:
+            values = np.where(values == self.nodata, np.nan, values)
+        rgba = apply_colormap(values, self.lut, self.vmin, self.vmax)
+        rgba[~(row_ok[:, None] & col_ok[None, :])] = 0
+        if not rgba[..., 3].any():
+            return None
+        return encode_png(rgba)
+
+
+class VectorTileSource:
+    """Serve a GeoDataFrame as Mapbox Vector Tiles, cut on demand.
+
+    For each tile, the features are looked up in the spatial index, clipped
+    to the tile plus a small buffer, simplified to the tile resolution and
+    encoded, so the cost of a tile does not grow with the size of the layer.
+
+    Args:
+        gdf (geopandas.GeoDataFrame): The vector data. It is reprojected to EPSG:3857 once.
+        layer_name (str, optional): The layer name inside the tiles. Defaults to "layer".
+        columns (list, optional): The attributes to include. Defaults to all.
+        extent (int, optional): The tile extent in tile units. Defaults to 4096.
+        buffer (int, optional): The clipping buffer around each tile in tile units. Defaults to 64.
+        pixel_tolerance (float, optional): The simplification tolerance in 256-pixel tile
+            pixels. Defaults to 0.5.
+    """
+
+    extension = "pbf"
+    media_type = "application/x-protobuf"
+
+    def __init__(
+        self, gdf, layer_name="layer", columns=None, extent=4096, buffer=64, pixel_tolerance=0.5
+    ):
+        if gdf.crs is None:
+            gdf = gdf.set_crs(epsg=4326)
+        gdf = gdf.to_crs(epsg=3857)
+        gdf = gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)]
+        if columns is None:
+            columns = [c for c in gdf.columns if c != gdf.geometry.name]
+        self.layer_name = layer_name
+        self.extent = extent
+        self.buffer = buffer
+        self.pixel_tolerance = pixel_tolerance
+        self.geometries = np.asarray(gdf.geometry.values)
+        self.sindex = gdf.sindex
+        self.ids = np.arange(len(gdf))
+        self.attributes = gdf[list(columns)].reset_index(drop=True)
+
+    def get_tile(self, z, x, y):
+        """Clip, simplify and encode the features of a tile.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The vector tile, or None if no feature intersects it.
+        """
+        import shapely
+
+        from .vector import encode_mvt
+
+        xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+        unit = (xmax - xmin) / self.extent
+        pad = self.buffer * unit
+        clip = (xmin - pad, ymin - pad, xmax + pad, ymax + pad)
+        index = np.sort(self.sindex.query(shapely.box(*clip), predicate="intersects"))
+        if len(index) == 0:
+            return None
+
+        geometries = shapely.clip_by_rect(self.geometries[index], *clip)
+        tolerance = self.pixel_tolerance * (xmax - xmin) / 256
+        geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        geometries = shapely.transform(
+            geometries,
+            lambda c: np.column_stack([(c[:, 0] - xmin) / unit, (ymax - c[:, 1]) / unit]),
+        )
+        keep = ~shapely.is_empty(geometries)
+        records = self.attributes.iloc[index[keep]].to_dict("records")
+        tile = encode_mvt(
+            geometries[keep],
+            properties=records,
+            ids=self.ids[index[keep]],
+            layer_name=self.layer_name,
+            extent=self.extent,
+        )
+        return tile or None
+
+
+def tile_range(bbox, z):
+    """Get the tiles covering a bounding box at a zoom level.
+
+    Args:
+        bbox (list): The bounding box as [west, south, east, north] in degrees.
+        z (int): The zoom level.
+
+    Returns:
+        tuple: The tile columns and rows as two ranges.
+    """
+    west, south, east, north = bbox
+    n = 2**z
+
+    def column(lng):
+        return min(n - 1, max(0, int((lng + 180.0) / 360.0 * n)))
+
+    def row(lat):
+        lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+        y = (1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0
+        return min(n - 1, max(0, int(y * n)))
+
+    return range(column(west), column(east) + 1), range(row(north), row(south) + 1)
+
+
+class CachingTileSource:
+    """Proxy an online tile layer through an MBTiles file for offline use.
+
+    Tiles are looked up in the MBTiles (SQLite) file first and fetched from the
+    upstream URL only when missing, then stored. Once an area has been viewed
+    or prefetched with `prefetch`, it is served without network access.
+
+    Args:
+        url (str): The upstream URL template with {z}, {x} and {y}, and optionally {s}
+            for subdomains and {r} for the retina suffix.
+        path (str): The MBTiles file, created if it does not exist.
+        subdomains (str, optional): The subdomains substituted for {s}. Defaults to "abc".
+        extension (str, optional): The tile format, e.g. "png", "jpg" or "webp". Defaults to the
+            extension in the URL, or "png".
+        timeout (float, optional): The upstream request timeout in seconds. Defaults to 10.
+    """
+
+    # Missing tiles may be fetched later, so the tile server does not cache them.
+    cache_empty = False
+
+    def __init__(self, url, path, subdomains="abc", extension=None, timeout=10):
+        import sqlite3
+
+        self.url = url
+        self.path = path
+        self.subdomains = subdomains
+        self.timeout = timeout
+        if extension is None:
+            match = re.search(r"\.(png|jpe?g|webp)\b", url.split("?")[0])
+            extension = match.group(1) if match else "png"
+        self.extension = extension
+        self.media_type = {"jpg": "image/jpeg", "jpeg": "image/jpeg"}.get(
+            extension, f"image/{extension}"
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, "
+                "tile_row INTEGER, tile_data BLOB)"
+            )
+            self._db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles "
+                "(zoom_level, tile_column, tile_row)"
+            )
+            if not self._db.execute("SELECT 1 FROM metadata").fetchone():
+                self._db.executemany(
+                    "INSERT INTO metadata VALUES (?, ?)",
+                    [("name", url), ("format", extension), ("type", "baselayer")],
+                )
+
+    def tile_url(self, z, x, y):
+        """Get the upstream URL of a tile.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            str: The URL.
+        """
+        subdomain = self.subdomains[(x + y) % len(self.subdomains)] if self.subdomains else ""
+        return (
+            self.url.replace("{z}", str(z))
+            .replace("{x}", str(x))
+            .replace("{y}", str(y))
+            .replace("{s}", subdomain)
+            .replace("{r}", "")
+        )
+
+    def _read(self, z, x, y):
+        # MBTiles stores rows in the TMS scheme, counted from the south.
+        with self._lock:
+            row = self._db.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                (z, x, 2**z - 1 - y),
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def _write(self, z, x, y, tile):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, 2**z - 1 - y, tile)
+            )
+
+    def fetch(self, z, x, y):
+        """Download a tile from upstream and store it.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The tile, or None if upstream has no tile there or cannot be reached.
+        """
+        import httpx
+
+        from .common import get_http_client
+
+        try:
+            r = get_http_client().get(
+                self.tile_url(z, x, y),
+                timeout=self.timeout,
+                headers={"User-Agent": "rastvectpy"},
+                follow_redirects=True,
+            )
+        except httpx.HTTPError:
+            return None
+        if r.status_code != 200 or not r.content:
+            return None
+        self._write(z, x, y, r.content)
+        return r.content
+
+    def get_tile(self, z, x, y):
+        """Get a tile from the MBTiles file, fetching it from upstream if missing.
+
+        Args:
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The tile, or None if it is not cached and cannot be fetched.
+        """
+        tile = self._read(z, x, y)
+        if tile is not None:
+            self.hits += 1
+            return tile
+        self.misses += 1
+        return self.fetch(z, x, y)
+
+    def prefetch(self, bbox, min_zoom, max_zoom, workers=8, max_tiles=100000):
+        """Download all missing tiles of an area for offline use.
+
+        Args:
+            bbox (list): The area as [west, south, east, north] in degrees.
+            min_zoom (int): The lowest zoom level.
+            max_zoom (int): The highest zoom level.
+            workers (int, optional): The number of concurrent downloads. Defaults to 8.
+            max_tiles (int, optional): The largest number of tiles to request, to guard
+                against downloading a whole tile set by mistake. Defaults to 100000.
+
+        Raises:
+            ValueError: If the area covers more than `max_tiles` tiles.
+
+        Returns:
+            dict: The number of tiles in the area ("tiles"), already stored ("cached"),
+                downloaded ("downloaded") and not available ("failed").
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        ranges = [(z,) + tile_range(bbox, z) for z in range(min_zoom, max_zoom + 1)]
+        total = sum(len(cols) * len(rows) for _, cols, rows in ranges)
+        if total > max_tiles:
+            raise ValueError(
+                f"The area covers {total} tiles, more than max_tiles={max_tiles}."
+            )
+
+        missing = []
+        for z, cols, rows in ranges:
+            with self._lock:
+                stored = set(
+                    self._db.execute(
+                        "SELECT tile_column, tile_row FROM tiles WHERE zoom_level=? AND "
+                        "tile_column BETWEEN ? AND ?",
+                        (z, cols.start, cols.stop - 1),
+                    ).fetchall()
+                )
+            missing += [
+                (z, x, y) for x in cols for y in rows if (x, 2**z - 1 - y) not in stored
+            ]
+
+        # Keep only whether each download succeeded, not the tile bytes.
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            downloaded = sum(
+                executor.map(lambda tile: self.fetch(*tile) is not None, missing)
+            )
+        return {
+            "tiles": total,
+            "cached": total - len(missing),
+            "downloaded": downloaded,
+            "failed": len(missing) - downloaded,
+        }
+
+    def close(self):
+        """Close the MBTiles file."""
+        with self._lock:
+            self._db.close()
+
+
+class _TileRequestHandler(BaseHTTPRequestHandler):
+    """Serve `/<name>/<z>/<x>/<y>.<ext>` from the tile server sources."""
+
+    def do_GET(self):
+        match = _tile_path.match(self.path.split("?", 1)[0])
+        if match is None:
+            self.send_error(404)
+            return
+        name, z, x, y, _ = match.groups()
+        tile_server = self.server.tile_server
+        if name not in tile_server.sources:
+            self.send_error(404)
+            return
+        try:
+            tile = tile_server.get_tile(name, int(z), int(x), int(y))
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        if not tile:
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tile_server.sources[name].media_type)
+        self.send_header("Content-Length", str(len(tile)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(tile)
+
+    def log_message(self, *args):
+        pass
+
+
+class TileServer:
+    """An HTTP tile server running on a background thread.
+
+    Note that the browser must be able to reach the server, which is the case
+    when the notebook kernel runs on the same machine.
+
+    Args:
+        host (str, optional): The host to bind to. Defaults to "127.0.0.1".
+        port (int, optional): The port to bind to. Defaults to 0 (any free port).
+        cache_size (int, optional): The number of rendered tiles to keep. Defaults to 1024.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, cache_size=1024):
+        self.sources = {}
+        self.cache = LRUCache(maxsize=cache_size)
+        self._httpd = ThreadingHTTPServer((host, port), _TileRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.tile_server = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        """The base URL of the server."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_source(self, source, name=None):
+        """Register a tile source.
+
+        Args:
+            source (object): An object with a `get_tile(z, x, y)` method and
+                `extension` and `media_type` attributes.
+            name (str, optional): The name used in the tile URL. Defaults to a random id.
+
+        Returns:
+            str: The tile URL template.
+        """
+        if name is None:
+            name = uuid.uuid4().hex
+        self.remove_source(name)
+        self.sources[name] = source
+        return f"{self.url}/{name}/{{z}}/{{x}}/{{y}}.{source.extension}"
+
+    def remove_source(self, name):
+        """Unregister a tile source and drop its cached tiles.
+
+        Args:
+            name (str): The name of the source.
+        """
+        source = self.sources.pop(name, None)
+        if source is not None and hasattr(source, "close"):
+            source.close()
+        for key in self.cache.keys():
+            if key[0] == name:
+                self.cache.pop(key)
+
+    def get_tile(self, name, z, x, y):
+        """Get a tile from a source, using the tile cache.
+
+        Args:
+            name (str): The name of the source.
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            bytes: The tile, or None if the source has no data there.
+        """
+        key = (name, z, x, y)
+        tile = self.cache.get(key)
+        if tile is None:
+            source = self.sources[name]
+            tile = source.get_tile(z, x, y) or b""
+            if tile or getattr(source, "cache_empty", True):
+                self.cache.set(key, tile)
+        return tile or None
+
+    def shutdown(self):
+        """Stop the server and close all sources."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for name in list(self.sources):
+            self.remove_source(name)
+
+
+_tile_server = None
+_tile_server_lock = threading.Lock()
+
+
+def get_tile_server():
+    """Get the shared tile server, starting it on first use.
+
+    Returns:
+        TileServer: The shared tile server.
+    """
+    global _tile_server
+    with _tile_server_lock:
+        if _tile_server is None:
+            _tile_server = TileServer()
+        return _tile_server
@@ -0,0 +1,778 @@
+"""Helpers for preparing vector data before it is sent to the map."""
+
+import gc
+import math
+
+import numpy as np
+
+
+class LevelOfDetail:
+    """Precomputed simplifications of a GeoDataFrame for a set of zoom levels.
+
+    Each level is simplified with a tolerance of `pixel_tolerance` screen pixels
+    at its zoom, using vectorized shapely simplification that keeps polygons
+    valid. A map zoom uses the nearest level at or above it, so the error on
+    screen never exceeds the tolerance; zooms above the last level use the
+    full-resolution geometries.
+
+    Args:
+        gdf (geopandas.GeoDataFrame): The vector data. It is reprojected to EPSG:4326 if needed.
+        zooms (list, optional): The zoom levels to precompute. Defaults to (0, 3, 6, 9, 12).
+        pixel_tolerance (float, optional): The simplification tolerance in screen pixels. Defaults to 1.0.
+        tile_size (int, optional): The tile size in pixels. Defaults to 256.
+        precision (int, optional): If set, also quantize every level to this many decimals,
+            see quantize_geometries. Defaults to None.
+    """
+
+    def __init__(
+        self, gdf, zooms=(0, 3, 6, 9, 12), pixel_tolerance=1.0, tile_size=256, precision=None
+    ):
+        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs(epsg=4326)
+        self.gdf = gdf
+        self.zooms = sorted(zooms)
+        self.pixel_tolerance = pixel_tolerance
+        self.tile_size = tile_size
+        self._geometries = {
+            z: gdf.geometry.simplify(self.tolerance(z), preserve_topology=True)
+            for z in self.zooms
+        }
+        self._geometries[None] = gdf.geometry
+        if precision is not None:
+            import geopandas as gpd
+
+            for z, geometries in self._geometries.items():
+                self._geometries[z] = gpd.GeoSeries(
+                    quantize_geometries(geometries.values, precision),
+                    index=gdf.index,
+                    crs=gdf.crs,
+                )
+        self._payloads = {}
+
+    def tolerance(self, zoom):
+        """Get the simplification tolerance in degrees for a zoom level.
+
+        Args:
+            zoom (int): The zoom level.
+
+        Returns:
+            float: The tolerance in degrees.
+        """
+        return 360.0 / (self.tile_size * 2**zoom) * self.pixel_tolerance
+
+    def level(self, zoom):
+        """Get the precomputed level used at a map zoom.
+
+        Args:
+            zoom (float): The map zoom.
+
+        Returns:
+            int: The level zoom, or None for full resolution.
+        """
+        zoom = math.floor(zoom)
+        for z in self.zooms:
+            if z >= zoom:
+                return z
+        return None
+
+    def num_coordinates(self, zoom):
+        """Count the vertices sent to the map at a zoom.
+
+        Args:
+            zoom (float): The map zoom.
+
+        Returns:
+            int: The number of coordinates.
+        """
+        import shapely
+
+        geometries = self._geometries[self.level(zoom)]
+        return int(shapely.get_num_coordinates(np.asarray(geometries.values)).sum())
+
+    def get_geojson(self, zoom):
+        """Get the GeoJSON for a map zoom, building it on first use.
+
+        Args:
+            zoom (float): The map zoom.
+
+        Returns:
+            dict: A GeoJSON FeatureCollection.
+        """
+        level = self.level(zoom)
+        if level not in self._payloads:
+            gdf = self.gdf.copy(deep=False)
+            gdf[gdf.geometry.name] = self._geometries[level]
+            self._payloads[level] = gdf.__geo_interface__
+        return self._payloads[level]
+
+
+def payload_size(data):
+    """Get the size of a JSON payload in bytes as it is sent to the browser.
+
+    Args:
+        data (dict): The JSON-serializable payload.
+
+    Returns:
+        int: The number of bytes.
+    """
+    import json
+
+    return len(json.dumps(data, separators=(",", ":")).encode())
+
+
+def as_numpy(values):
+    """View a coordinate buffer as a 1D NumPy array, without copying when possible.
+
+    Args:
+        values (numpy.ndarray | memoryview | pyarrow.Array | pyarrow.ChunkedArray): The
+            values. NumPy arrays, buffers and Arrow arrays without nulls are wrapped in
+            place; Arrow arrays with nulls or several chunks are copied, with nulls as NaN.
+
+    Returns:
+        numpy.ndarray: The values.
+    """
+    if type(values).__module__.startswith("pyarrow"):
+        if hasattr(values, "num_chunks"):
+            if values.num_chunks == 1:
+                values = values.chunk(0)
+            else:
+                values = values.combine_chunks()
+        if values.null_count == 0:
+            return values.to_numpy(zero_copy_only=True)
+        return values.to_numpy(zero_copy_only=False).astype("float64")
+    return np.asarray(values).reshape(-1)
+
+
+def points_to_multipoint(x, y, precision=None):
+    """Encode point coordinates as a GeoJSON payload with a single MultiPoint feature.
+
+    The coordinates go from the input buffers to one interleaved array and
+    then straight to nested lists, without any per-point shapely objects,
+    feature dicts or properties. Points with non-finite coordinates are skipped.
+
+    Args:
+        x (array-like): The x (longitude) coordinates, see as_numpy for the accepted types.
+        y (array-like): The y (latitude) coordinates.
+        precision (int, optional): The number of decimals to keep. Defaults to None (all).
+
+    Returns:
+        dict: A GeoJSON FeatureCollection whose only feature has a `count` property.
+    """
+    x, y = as_numpy(x), as_numpy(y)
+    if x.shape != y.shape:
+        raise ValueError("x and y must have the same length.")
+    xy = np.empty((len(x), 2), dtype="float64")
+    xy[:, 0] = x
+    xy[:, 1] = y
+    finite = np.isfinite(xy).all(axis=1)
+    if not finite.all():
+        xy = xy[finite]
+    if precision is not None:
+        np.round(xy, precision, out=xy)
+
+    # The lists cannot form reference cycles, so the garbage collector is
+    # paused while they are created instead of rescanning them repeatedly.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        coordinates = xy.tolist()
+    finally:
+        if enabled:
+            gc.enable()
+    feature = {
+        "type": "Feature",
+        "id": 0,
+        "properties": {"count": len(xy)},
+        "geometry": {"type": "MultiPoint", "coordinates": coordinates},
+    }
+    return {"type": "FeatureCollection", "features": [feature]}
+
+
+def quantize_geometries(geometries, precision=6):
+    """Snap geometries to a decimal grid and drop the vertices that collapse together.
+
+    Coordinates are also rounded so they serialize with at most `precision`
+    decimals instead of the usual 15 to 17 digits.
+
+    Args:
+        geometries (geopandas.GeoSeries | numpy.ndarray): The geometries.
+        precision (int, optional): The number of decimals to keep. Defaults to 6.
+
+    Returns:
+        numpy.ndarray: The quantized shapely geometries.
+    """
+    import shapely
+
+    geometries = shapely.set_precision(np.asarray(geometries), 10.0**-precision)
+    return shapely.transform(geometries, lambda coords: np.round(coords, precision))
+
+
+def encode_geojson(data, precision=6, report=False):
+    """Quantize a GeoJSON FeatureCollection or GeoDataFrame for the map.
+
+    This is the only encoding applied on the way to the map, as ipyleaflet
+    layers need plain GeoJSON. Shared arcs and delta-encoded coordinates are
+    available for export through to_topojson.
+
+    Args:
+        data (dict | geopandas.GeoDataFrame): The vector data.
+        precision (int, optional): The number of decimals to keep. Defaults to 6.
+        report (bool, optional): Whether to measure the payload before and after encoding,
+            which serializes both. Defaults to False.
+
+    Returns:
+        tuple: The encoded GeoJSON FeatureCollection and, with `report`, a dict with the keys
+            bytes_before, bytes_after and bytes_saved, otherwise None.
+    """
+    import geopandas as gpd
+
+    if isinstance(data, gpd.GeoDataFrame):
+        before = data.__geo_interface__ if report else None
+        gdf = data.copy(deep=False)
+    else:
+        before = data
+        gdf = gpd.GeoDataFrame.from_features(data)
+        # from_features drops feature ids; keep them for popups and styling.
+        gdf.index = [feature.get("id", i) for i, feature in enumerate(data["features"])]
+    gdf[gdf.geometry.name] = quantize_geometries(gdf.geometry.values, precision)
+    encoded = gdf.__geo_interface__
+    if not report:
+        return encoded, None
+    report = {"bytes_before": payload_size(before), "bytes_after": payload_size(encoded)}
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    return encoded, report
+
+
+def _topology_parts(geometry):
+    """Split a geometry into coordinate arrays and the TopoJSON nesting of its lines."""
+    kind = geometry.geom_type
+    if kind == "Polygon":
+        rings = [geometry.exterior] + list(geometry.interiors)
+        return kind, [np.asarray(r.coords)[:, :2] for r in rings], [len(rings)]
+    if kind == "MultiPolygon":
+        lines, shape = [], []
+        for polygon in geometry.geoms:
+            _, rings, counts = _topology_parts(polygon)
+            lines.extend(rings)
+            shape.append(counts[0])
+        return kind, lines, shape
+    if kind == "LineString":
+        return kind, [np.asarray(geometry.coords)[:, :2]], [1]
+    if kind == "MultiLineString":
+        lines = [np.asarray(g.coords)[:, :2] for g in geometry.geoms]
+        return kind, lines, [1] * len(lines)
+    return kind, [], []
+
+
+def to_topojson(data, quantization=100000, object_name="data"):
+    """Encode vector data as TopoJSON with shared arcs and delta-encoded coordinates.
+
+    Borders shared by neighboring polygons are stored once as an arc, which
+    makes admin-boundary layers much smaller. Use it for frontends and files
+    that read TopoJSON, e.g. folium.TopoJson; ipyleaflet layers need GeoJSON.
+
+    Args:
+        data (dict | geopandas.GeoDataFrame): The vector data.
+        quantization (int, optional): The number of grid steps along each axis. Defaults to 100000.
+        object_name (str, optional): The name of the TopoJSON object. Defaults to "data".
+
+    Returns:
+        dict: The TopoJSON Topology.
+    """
+    import geopandas as gpd
+
+    if not isinstance(data, gpd.GeoDataFrame):
+        data = gpd.GeoDataFrame.from_features(data)
+
+    x0, y0, x1, y1 = data.total_bounds
+    kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1.0
+    ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1.0
+
+    def quantize(coords):
+        q = np.empty((len(coords), 2), dtype="int64")
+        q[:, 0] = np.round((coords[:, 0] - x0) / kx)
+        q[:, 1] = np.round((coords[:, 1] - y0) / ky)
+        return q
+
+    # Collect every line and ring as quantized points without repeated vertices.
+    features = []
+    lines = []
+    for geometry in data.geometry.values:
+        if geometry is None or geometry.is_empty:
+            features.append((None, None, None))
+            continue
+        kind, parts, shape = _topology_parts(geometry)
+        if kind in ["Point", "MultiPoint"]:
+            points = getattr(geometry, "geoms", [geometry])
+            features.append((kind, quantize(np.asarray([g.coords[0][:2] for g in points])), None))
+            continue
+        ids = []
+        ring = kind.endswith("Polygon")
+        for part in parts:
+            q = quantize(part)
+            keep = np.ones(len(q), dtype=bool)
+            keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+            if keep.sum() >= (4 if ring else 2):
+                q = q[keep]
+            ids.append(len(lines))
+            lines.append((q, ring))
+        features.append((kind, ids, shape))
+
+    # A point is a junction where lines end, or where it is shared with
+    # different neighbors, i.e. where shared borders start or stop.
+    keys, pairs, ends = [], [], []
+    for q, ring in lines:
+        k = q[:, 0] * (quantization + 1) + q[:, 1]
+        if ring:
+            k = k[:-1]
+            prev, nxt = np.roll(k, 1), np.roll(k, -1)
+            ends.append(np.zeros(len(k), dtype=bool))
+        else:
+            prev = np.concatenate([[-1], k[:-1]])
+            nxt = np.concatenate([k[1:], [-1]])
+            end = np.zeros(len(k), dtype=bool)
+            end[[0, -1]] = True
+            ends.append(end)
+        keys.append(k)
+        pairs.append(np.column_stack([k, np.minimum(prev, nxt), np.maximum(prev, nxt)]))
+
+    junctions = set()
+    if lines:
+        all_pairs = np.unique(np.concatenate(pairs), axis=0)
+        point, count = np.unique(all_pairs[:, 0], return_counts=True)
+        junctions.update(point[count > 1].tolist())
+        all_keys = np.concatenate(keys)
+        junctions.update(all_keys[np.concatenate(ends)].tolist())
+
+    arcs = []
+    arc_index = {}
+
+    def add_arc(q):
+        forward = q.tobytes()
+        if forward in arc_index:
+            return arc_index[forward]
+        backward = q[::-1].tobytes()
+        if backward in arc_index:
+            return ~arc_index[backward]
+        arc_index[forward] = len(arcs)
+        arcs.append(q)
+        return len(arcs) - 1
+
+    line_arcs = []
+    for (q, ring), k in zip(lines, keys):
+        cuts = np.flatnonzero(np.isin(k, list(junctions))) if junctions else np.array([], int)
+        if ring:
+            points = q[:-1]
+            if len(cuts) == 0:
+                # Rotate rings without junctions to a canonical start so identical
+                # rings in other features, in either direction, share one arc.
+                start = int(np.lexsort((points[:, 1], points[:, 0]))[0])
+                forward = np.roll(points, -start, axis=0)
+                backward = np.roll(points[::-1], -(len(points) - 1 - start), axis=0)
+                closed = np.vstack([forward, forward[:1]])
+                if np.vstack([backward, backward[:1]]).tobytes() in arc_index:
+                    closed = np.vstack([backward, backward[:1]])
+                line_arcs.append([add_arc(closed)])
+                continue
+            points = np.roll(points, -cuts[0], axis=0)
+            cuts = (cuts - cuts[0]).tolist() + [len(points)]
+            points = np.vstack([points, points[:1]])
+        else:
+            points = q
+            cuts = cuts.tolist()
+        line_arcs.append([add_arc(points[a:b + 1]) for a, b in zip(cuts[:-1], cuts[1:])])
+
+    geometries = []
+    for (kind, refs, shape), properties in zip(
+        features, data.drop(columns=data.geometry.name).to_dict("records")
+    ):
+        properties = {
+            key: (None if isinstance(value, float) and np.isnan(value) else value)
+            for key, value in properties.items()
+        }
+        if kind is None:
+            geometries.append({"type": None, "properties": properties})
+        elif kind in ["Point", "MultiPoint"]:
+            coordinates = refs[0].tolist() if kind == "Point" else refs.tolist()
+            geometries.append({"type": kind, "coordinates": coordinates, "properties": properties})
+        else:
+            parts = [line_arcs[i] for i in refs]
+            if kind == "LineString":
+                arcs_ref = parts[0]
+            elif kind in ["MultiLineString", "Polygon"]:
+                arcs_ref = parts
+            else:
+                arcs_ref, start = [], 0
+                for size in shape:
+                    arcs_ref.append(parts[start:start + size])
+                    start += size
+            geometries.append({"type": kind, "arcs": arcs_ref, "properties": properties})
+
+    return {
+        "type": "Topology",
+        "bbox": [float(x0), float(y0), float(x1), float(y1)],
+        "transform": {"scale": [kx, ky], "translate": [float(x0), float(y0)]},
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": [np.vstack([arc[:1], np.diff(arc, axis=0)]).tolist() for arc in arcs],
+    }
+
+
+class ViewportSource:
+    """Read only the features of a vector file that intersect the map view.
+
+    The bounding boxes of all features are read once, without their
+    geometries or attributes, and put in a shapely STRtree (an R-tree). Each
+    view then reads just the features it needs by feature id. Features already
+    loaded are kept and those that left the view are dropped, so memory stays
+    proportional to the view rather than the file.
+
+    Args:
+        filename (str): The file path of the vector data.
+        margin (float, optional): The fraction of the view size to load around it. Defaults to 0.25.
+        kwargs: Keyword arguments to pass to pyogrio.read_dataframe, e.g. layer, columns, where
+            or bbox. The where and bbox filters are applied once, when the index is built.
+    """
+
+    def __init__(self, filename, margin=0.25, **kwargs):
+        import shapely
+        from .common import check_package
+
+        pyogrio = check_package("pyogrio", URL="https://pyogrio.readthedocs.io")
+
+        self.filename = filename
+        self.margin = margin
+        self.read_kwargs = kwargs
+        self.crs = pyogrio.read_info(filename, layer=kwargs.get("layer"))["crs"]
+
+        fids, bounds = pyogrio.read_bounds(
+            filename, layer=kwargs.get("layer"), where=kwargs.get("where"), bbox=kwargs.get("bbox")
+        )
+        self.fids = np.asarray(fids)
+        self.tree = shapely.STRtree(shapely.box(*bounds))
+        self._loaded = None
+
+    def __len__(self):
+        return len(self.fids)
+
+    def query(self, bbox):
+        """Get the ids of the features whose bounding boxes intersect a view.
+
+        Args:
+            bbox (list): The view as [west, south, east, north] in degrees.
+
+        Returns:
+            numpy.ndarray: The sorted feature ids.
+        """
+        import shapely
+
+        west, south, east, north = bbox
+        dx, dy = (east - west) * self.margin, (north - south) * self.margin
+        west, south, east, north = west - dx, south - dy, east + dx, north + dy
+        if self.crs is not None:
+            from pyproj import Transformer
+
+            transformer = Transformer.from_crs("EPSG:4326", self.crs, always_xy=True)
+            west, south, east, north = transformer.transform_bounds(west, south, east, north)
+        return np.sort(self.fids[self.tree.query(shapely.box(west, south, east, north))])
+
+    def read(self, bbox):
+        """Get the features inside a view, reading only those not loaded yet.
+
+        Args:
+            bbox (list): The view as [west, south, east, north] in degrees.
+
+        Returns:
+            geopandas.GeoDataFrame: The features in EPSG:4326, indexed by feature id.
+        """
+        import pandas as pd
+        import pyogrio
+
+        fids = self.query(bbox)
+        loaded = self._loaded
+        if loaded is not None:
+            loaded = loaded[loaded.index.isin(fids)]
+            missing = fids[~np.isin(fids, loaded.index.values)]
+        else:
+            missing = fids
+
+        if len(missing) or loaded is None:
+            # The filters were applied to the ids already and cannot be combined with fids.
+            kwargs = {k: v for k, v in self.read_kwargs.items() if k not in ["where", "bbox"]}
+            gdf = pyogrio.read_dataframe(self.filename, fids=missing, fid_as_index=True, **kwargs)
+            if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+                gdf = gdf.to_crs(epsg=4326)
+            loaded = gdf if loaded is None else pd.concat([loaded, gdf]).sort_index()
+
+        self._loaded = loaded
+        return loaded
+
+    def get_geojson(self, bbox):
+        """Get the features inside a view as GeoJSON.
+
+        Args:
+            bbox (list): The view as [west, south, east, north] in degrees.
+
+        Returns:
+            dict: A GeoJSON FeatureCollection.
+        """
+        return self.read(bbox).__geo_interface__
+
+
+def _chunked_extent(values, chunk_size):
+    """Get the finite minimum and maximum of an array, reading it in chunks."""
+    low, high = np.inf, -np.inf
+    for start in range(0, len(values), chunk_size):
+        chunk = np.asarray(values[start : start + chunk_size], dtype="float64")
+        chunk = chunk[np.isfinite(chunk)]
+        if chunk.size:
+            low, high = min(low, chunk.min()), max(high, chunk.max())
+    if low > high:
+        raise ValueError("The vectors have no finite coordinates.")
+    return float(low), float(high)
+
+
+def grid_vectors(x, y, u, v, shape, extent=None, chunk_size=1 << 22):
+    """Average a vector field into a regular grid of cells.
+
+    The vectors are binned with NumPy in chunks, so memory-mapped inputs are
+    streamed from disk and the cost of drawing the result depends on the grid
+    size instead of the number of vectors.
+
+    Args:
+        x (array-like): The x coordinates of the vectors, e.g. a numpy.memmap.
+        y (array-like): The y coordinates of the vectors.
+        u (array-like): The x components of the vectors.
+        v (array-like): The y components of the vectors.
+        shape (tuple): The grid size as (rows, columns).
+        extent (tuple, optional): The grid extent as (xmin, xmax, ymin, ymax). Defaults to the
+            extent of the finite coordinates.
+        chunk_size (int, optional): The number of vectors binned at a time. Defaults to 4194304.
+
+    Returns:
+        tuple: The cell center coordinates X and Y, the mean components U and V as masked
+            arrays (empty cells are masked), and the number of vectors per cell, each of shape
+            `shape`.
+    """
+    rows, cols = shape
+    if extent is None:
+        extent = _chunked_extent(x, chunk_size) + _chunked_extent(y, chunk_size)
+    xmin, xmax, ymin, ymax = extent
+    xscale = cols / (xmax - xmin) if xmax > xmin else 0.0
+    yscale = rows / (ymax - ymin) if ymax > ymin else 0.0
+
+    size = rows * cols
+    count = np.zeros(size, dtype="int64")
+    u_sum = np.zeros(size, dtype="float64")
+    v_sum = np.zeros(size, dtype="float64")
+    for start in range(0, len(x), chunk_size):
+        stop = start + chunk_size
+        xs = np.asarray(x[start:stop], dtype="float64")
+        ys = np.asarray(y[start:stop], dtype="float64")
+        us = np.asarray(u[start:stop], dtype="float64")
+        vs = np.asarray(v[start:stop], dtype="float64")
+        valid = np.isfinite(xs) & np.isfinite(ys) & np.isfinite(us) & np.isfinite(vs)
+        valid &= (xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)
+        col = np.minimum(((xs[valid] - xmin) * xscale).astype("intp"), cols - 1)
+        row = np.minimum(((ys[valid] - ymin) * yscale).astype("intp"), rows - 1)
+        cell = row * cols + col
+        count += np.bincount(cell, minlength=size)
+        u_sum += np.bincount(cell, weights=us[valid], minlength=size)
+        v_sum += np.bincount(cell, weights=vs[valid], minlength=size)
+
+    empty = count == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        u_mean = np.ma.masked_array(u_sum / count, mask=empty).reshape(shape)
+        v_mean = np.ma.masked_array(v_sum / count, mask=empty).reshape(shape)
+    xc = xmin + (np.arange(cols) + 0.5) * (xmax - xmin) / cols
+    yc = ymin + (np.arange(rows) + 0.5) * (ymax - ymin) / rows
+    grid_x, grid_y = np.meshgrid(xc, yc)
+    return grid_x, grid_y, u_mean, v_mean, count.reshape(shape)
+
+
+def block_vectors(u, v, shape):
+    """Average gridded vector components in blocks, down to at most `shape` arrows.
+
+    The arrows are placed as matplotlib's quiver(U, V) places them, at the
+    column and row indices of the grid. The grids are read a strip of rows at
+    a time, so memory-mapped inputs are streamed from disk.
+
+    Args:
+        u (array-like): The x components as a 1D or 2D grid, e.g. a numpy.memmap.
+        v (array-like): The y components, with the same shape as `u`.
+        shape (tuple): The largest output size as (rows, columns).
+
+    Returns:
+        tuple: The block center coordinates X and Y and the mean components U and V as
+            masked arrays (blocks without finite vectors are masked), each 2D.
+    """
+    if np.ndim(u) == 1:
+        u, v = np.asarray(u)[None, :], np.asarray(v)[None, :]
+    rows, cols = np.shape(u)
+    row_step = -(-rows // max(1, min(rows, shape[0])))
+    col_step = -(-cols // max(1, min(cols, shape[1])))
+    row_starts = np.arange(0, rows, row_step)
+    col_starts = np.arange(0, cols, col_step)
+
+    u_mean = np.empty((len(row_starts), len(col_starts)))
+    v_mean = np.empty_like(u_mean)
+    for i, start in enumerate(row_starts):
+        us = np.asarray(u[start:start + row_step], dtype="float64")
+        vs = np.asarray(v[start:start + row_step], dtype="float64")
+        valid = np.isfinite(us) & np.isfinite(vs)
+        count = np.add.reduceat(valid.sum(axis=0), col_starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            u_mean[i] = np.add.reduceat(np.where(valid, us, 0).sum(axis=0), col_starts) / count
+            v_mean[i] = np.add.reduceat(np.where(valid, vs, 0).sum(axis=0), col_starts) / count
+
+    xc = (col_starts + np.minimum(col_starts + col_step, cols) - 1) / 2
+    yc = (row_starts + np.minimum(row_starts + row_step, rows) - 1) / 2
+    grid_x, grid_y = np.meshgrid(xc, yc)
+    empty = ~np.isfinite(u_mean)
+    return (
+        grid_x,
+        grid_y,
+        np.ma.masked_array(u_mean, mask=empty),
+        np.ma.masked_array(v_mean, mask=empty),
+    )
+
+def _varints(values):
+    """Encode non-negative integers as concatenated protobuf varints, with NumPy."""
+    values = np.asarray(values, dtype="uint64")
+    nbytes = np.ones(len(values), dtype="intp")
+    for shift in range(7, 64, 7):
+        nbytes += values >= np.uint64(1 << shift)
+    out = np.empty(int(nbytes.sum()), dtype="uint8")
+    starts = np.cumsum(nbytes) - nbytes
+    for i in range(int(nbytes.max(initial=0))):
+        selected = nbytes > i
+        byte = (values[selected] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        more = (nbytes[selected] > i + 1).astype("uint64") << np.uint64(7)
+        out[starts[selected] + i] = byte | more
+    return out.tobytes()
+
+
+def _field(number, payload):
+    """Encode a length-delimited protobuf field."""
+    return _varints([number << 3 | 2, len(payload)]) + payload
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype="int64")
+    return (values << 1) ^ (values >> 63)
+
+
+def _ring_commands(coords, polygon, cursor):
+    """Get the MVT commands of one line or ring in tile coordinates."""
+    deltas = np.diff(np.vstack([cursor, coords]), axis=0)
+    params = _zigzag(deltas).reshape(-1)
+    commands = [np.array([1 | 1 << 3], dtype="int64"), params[:2]]
+    if len(coords) > 1:
+        commands += [np.array([2 | (len(coords) - 1) << 3], dtype="int64"), params[2:]]
+    if polygon:
+        commands.append(np.array([7 | 1 << 3], dtype="int64"))
+    return commands, coords[-1]
+
+
+def _geometry_commands(geometry):
+    """Get the MVT geometry type and command integers of a shapely geometry in tile coordinates."""
+    import shapely
+
+    kind = shapely.get_type_id(geometry)
+    cursor = np.zeros(2, dtype="int64")
+    commands = []
+    if kind in (0, 4):  # Point, MultiPoint
+        coords = np.round(shapely.get_coordinates(geometry)).astype("int64")
+        if len(coords) == 0:
+            return None, None
+        params = _zigzag(np.diff(np.vstack([cursor, coords]), axis=0)).reshape(-1)
+        return 1, np.concatenate([[1 | len(coords) << 3], params])
+    if kind in (1, 5):  # LineString, MultiLineString
+        for part in shapely.get_parts(geometry):
+            coords = np.round(shapely.get_coordinates(part)).astype("int64")
+            coords = coords[np.r_[True, (np.diff(coords, axis=0) != 0).any(axis=1)]]
+            if len(coords) >= 2:
+                part_commands, cursor = _ring_commands(coords, False, cursor)
+                commands += part_commands
+        return (2, np.concatenate(commands)) if commands else (None, None)
+    if kind in (3, 6):  # Polygon, MultiPolygon
+        for part in shapely.get_parts(geometry):
+            for i, ring in enumerate(shapely.get_rings(part)):
+                coords = np.round(shapely.get_coordinates(ring)).astype("int64")[:-1]
+                coords = coords[np.r_[True, (np.diff(coords, axis=0) != 0).any(axis=1)]]
+                if len(coords) < 3:
+                    if i == 0:
+                        break  # The exterior collapsed, so drop its holes too.
+                    continue
+                x, y = coords[:, 0], coords[:, 1]
+                area = np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+                if area == 0:
+                    if i == 0:
+                        break
+                    continue
+                # Exterior rings are clockwise (positive area) in y-down tile coordinates.
+                if (area > 0) != (i == 0):
+                    coords = coords[::-1]
+                ring_commands, cursor = _ring_commands(coords, True, cursor)
+                commands += ring_commands
+        return (3, np.concatenate(commands)) if commands else (None, None)
+    return None, None
+
+
+def _mvt_value(value):
+    """Encode an attribute as an MVT Value message, or None if it cannot be encoded."""
+    import struct
+
+    if value is None:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return _varints([7 << 3, int(value)])
+    if isinstance(value, (int, np.integer)):
+        return _varints([6 << 3, int(_zigzag(int(value)))])
+    if isinstance(value, (float, np.floating)):
+        if not math.isfinite(value):
+            return None
+        return bytes([3 << 3 | 1]) + struct.pack("<d", float(value))
+    return _field(1, str(value).encode())
+
+
+def encode_mvt(geometries, properties=None, ids=None, layer_name="layer", extent=4096):
+    """Encode geometries in tile coordinates as one Mapbox Vector Tile layer.
+
+    Args:
+        geometries (numpy.ndarray): The shapely geometries, already clipped and transformed to
+            tile coordinates between 0 and `extent`, with y pointing down.
+        properties (list, optional): One dict of attributes per geometry. Defaults to None.
+        ids (list, optional): One non-negative integer id per geometry. Defaults to None.
+        layer_name (str, optional): The layer name. Defaults to "layer".
+        extent (int, optional): The tile extent. Defaults to 4096.
+
+    Returns:
+        bytes: The vector tile, empty if no geometry could be encoded.
+    """
+    keys, values, features = {}, {}, []
+    for i, geometry in enumerate(geometries):
+        kind, commands = _geometry_commands(geometry)
+        if kind is None:
+            continue
+        tags = []
+        for key, value in (properties[i] if properties is not None else {}).items():
+            encoded = _mvt_value(value)
+            if encoded is None:
+                continue
+            tags += [keys.setdefault(key, len(keys)), values.setdefault(encoded, len(values))]
+        feature = b""
+        if ids is not None:
+            feature += _varints([1 << 3, int(ids[i])])
+        if tags:
+            feature += _field(2, _varints(tags))
+        feature += _varints([3 << 3, kind]) + _field(4, _varints(commands))
+        features.append(_field(2, feature))
+    if not features:
+        return b""
+
+    layer = _varints([15 << 3, 2]) + _field(1, layer_name.encode())
+    layer += b"".join(features)
+    layer += b"".join(_field(3, key.encode()) for key in keys)
+    layer += b"".join(_field(4, value) for value in values)
+    layer += _varints([5 << 3, extent])
+    return _field(3, layer)
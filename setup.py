@@ -39,6 +39,11 @@ setup(
         'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
     ],
+    entry_points={
+        'console_scripts': [
+            'rastvectpy-csv-convert=rastvectpy.cli:csv_convert',
+        ],
+    },
     description="A python package for raster and vector data visualization and analysis.",
     install_requires=install_requires,
     dependency_links=dependency_links,
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""Tests for `rastvectpy.cluster` module."""
+
+
+import unittest
+
+import numpy as np
+
+from rastvectpy.cluster import ClusterIndex
+
+
+class TestClusterIndex(unittest.TestCase):
+    """Tests for the server-side cluster index."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        rng = np.random.default_rng(0)
+        self.x = rng.uniform(-90, -80, 5000)
+        self.y = rng.uniform(30, 40, 5000)
+        self.index = ClusterIndex(self.x, self.y, max_zoom=12)
+
+    def test_counts_are_preserved_at_every_zoom(self):
+        """Every zoom level accounts for all points exactly once."""
+        world = [-180, -85, 180, 85]
+        for zoom in range(0, 14):
+            features = self.index.get_clusters(world, zoom)["features"]
+            total = sum(f["properties"].get("point_count", 1) for f in features)
+            self.assertEqual(total, len(self.x))
+
+    def test_low_zoom_is_compact(self):
+        """Low zoom levels send far fewer features than points."""
+        features = self.index.get_clusters([-180, -85, 180, 85], 2)["features"]
+        self.assertLess(len(features), 10)
+
+    def test_bbox_filter_and_point_ids(self):
+        """Beyond max_zoom only points inside the bounding box are returned, by row index."""
+        bbox = [-85, 34, -84, 35]
+        features = self.index.get_clusters(bbox, 13)["features"]
+        expected = np.flatnonzero(
+            (self.x >= -85) & (self.x <= -84) & (self.y >= 34) & (self.y <= 35)
+        )
+        self.assertEqual(sorted(f["id"] for f in features), expected.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
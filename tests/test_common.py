@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+
+"""Tests for `rastvectpy.common` module."""
+
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from rastvectpy import common
+
+
+class FakeTiTilerHandler(BaseHTTPRequestHandler):
+    """A local stand-in for the TiTiler /cog endpoints."""
+
+    requests = []
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        cog = parse_qs(parsed.query)["url"][0]
+        self.requests.append((parsed.path, cog))
+        if parsed.path == "/cog/info":
+            body = {"bounds": [-10.0, -5.0, 10.0, 5.0]}
+        elif parsed.path == "/cog/tilejson.json":
+            body = {"tiles": [f"http://tiles/{{z}}/{{x}}/{{y}}?url={cog}"]}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeFileHandler(BaseHTTPRequestHandler):
+    """A local stand-in for a remote data server with ETag revalidation."""
+
+    body = b"longitude,latitude\n1,2\n"
+    failures = 0
+    gone = False
+    statuses = []
+
+    def do_GET(self):
+        etag = '"%d"' % hash(self.body)
+        # record the status before responding, so the client never sees it missing
+        if self.gone:
+            self.statuses.append(404)
+            self.send_response(404)
+            self.end_headers()
+        elif self.failures:
+            type(self).failures -= 1
+            self.statuses.append(503)
+            self.send_response(503)
+            self.end_headers()
+        elif self.headers.get("If-None-Match") == etag:
+            self.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.statuses.append(200)
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCommon(unittest.TestCase):
+    """Tests for `rastvectpy.common` module."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the local stand-in servers."""
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTiTilerHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.file_server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFileHandler)
+        threading.Thread(target=cls.file_server.serve_forever, daemon=True).start()
+        cls.file_url = f"http://127.0.0.1:{cls.file_server.server_port}/data/points.csv"
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the local stand-in servers."""
+        for server in [cls.server, cls.file_server]:
+            server.shutdown()
+            server.server_close()
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        FakeTiTilerHandler.requests = []
+        common._titiler_cache.clear()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_cog_tile_info_is_cached(self):
+        """Repeat lookups of the same COG are served from the cache."""
+        cog = "https://example.com/a.tif"
+        for _ in range(3):
+            bounds, tile = common.cog_tile_info(cog, titiler_endpoint=self.endpoint)
+        self.assertEqual(bounds, [-10.0, -5.0, 10.0, 5.0])
+        self.assertTrue(tile.endswith(cog))
+        self.assertEqual(
+            sorted(FakeTiTilerHandler.requests),
+            [("/cog/info", cog), ("/cog/tilejson.json", cog)],
+        )
+
+    def test_download_file_revalidates_and_retries(self):
+        """Downloads are cached on disk, revalidated by ETag and retried on 5xx."""
+        tmpdir = tempfile.mkdtemp()
+        FakeFileHandler.statuses = []
+        try:
+            FakeFileHandler.failures = 1
+            path = common.download_file(self.file_url, cache_dir=tmpdir, backoff=0.01)
+            self.assertTrue(path.endswith(".csv"))
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), FakeFileHandler.body)
+
+            self.assertEqual(common.download_file(self.file_url, cache_dir=tmpdir), path)
+            FakeFileHandler.body = b"longitude,latitude\n3,4\n"
+            common.download_file(self.file_url, cache_dir=tmpdir)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), FakeFileHandler.body)
+
+            FakeFileHandler.failures = 5
+            self.assertEqual(
+                common.download_file(self.file_url, cache_dir=tmpdir, retries=1, backoff=0.01),
+                path,
+            )
+            self.assertEqual(FakeFileHandler.statuses, [503, 200, 304, 200, 503, 503])
+
+            # a deleted source raises instead of serving the stale copy
+            FakeFileHandler.failures = 0
+            FakeFileHandler.gone = True
+            with self.assertRaises(httpx.HTTPStatusError):
+                common.download_file(self.file_url, cache_dir=tmpdir, backoff=0.01)
+            self.assertEqual(FakeFileHandler.statuses[6:], [404])
+        finally:
+            FakeFileHandler.failures = 0
+            FakeFileHandler.gone = False
+            shutil.rmtree(tmpdir)
+
+    def test_csv_converters_stream_in_chunks(self):
+        """Chunked conversion writes every row and reports progress."""
+        import geopandas as gpd
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            in_csv = os.path.join(tmpdir, "points.csv")
+            with open(in_csv, "w") as f:
+                f.write("longitude,latitude,name\n")
+                for i in range(25):
+                    f.write(f"{i * 0.1},{i * 0.2},p{i}\n")
+
+            out_geojson = os.path.join(tmpdir, "points.geojson")
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                rows = common.csv_to_geojson(in_csv, out_geojson, chunksize=10)
+            self.assertEqual(rows, 25)
+            self.assertEqual(len(out.getvalue().strip().splitlines()), 3)
+            with open(out_geojson) as f:
+                features = json.load(f)["features"]
+            self.assertEqual(len(features), 25)
+            self.assertEqual(features[24]["properties"]["name"], "p24")
+
+            out_shp = os.path.join(tmpdir, "points.shp")
+            common.csv_to_shp(in_csv, out_shp, chunksize=10, verbose=False)
+            gdf = gpd.read_file(out_shp)
+            self.assertEqual(gdf["name"].tolist(), [f"p{i}" for i in range(25)])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_csv_to_shp_chunks_keep_sparse_columns(self):
+        """Column types come from the first chunk and later chunks are read with them."""
+        import geopandas as gpd
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            in_csv = os.path.join(tmpdir, "points.csv")
+            with open(in_csv, "w") as f:
+                f.write("longitude,latitude,tag,count\n")
+                for i in range(25):
+                    tag = f"x{i}" if i >= 10 else ""
+                    count = i if i < 15 else ""
+                    f.write(f"{i * 0.1},{i * 0.2},{tag},{count}\n")
+
+            out_shp = os.path.join(tmpdir, "points.shp")
+            common.csv_to_shp(in_csv, out_shp, chunksize=10, verbose=False)
+            gdf = gpd.read_file(out_shp)
+            self.assertEqual(gdf["tag"].tolist()[10:], [f"x{i}" for i in range(10, 25)])
+            self.assertEqual(gdf["count"].tolist()[:15], list(range(15)))
+
+            out_geojson = os.path.join(tmpdir, "points.geojson")
+            common.csv_to_geojson(in_csv, out_geojson, chunksize=10, verbose=False)
+            with open(out_geojson) as f:
+                properties = [feature["properties"] for feature in json.load(f)["features"]]
+            self.assertEqual(properties[0], {"longitude": 0.0, "latitude": 0.0, "tag": None, "count": 0})
+            self.assertEqual(properties[24]["tag"], "x24")
+            self.assertIsNone(properties[24]["count"])
+
+            with open(in_csv, "a") as f:
+                f.write("2.5,5.0,x25,2.5\n")
+            with self.assertRaises(ValueError):
+                common.csv_to_shp(in_csv, out_shp, chunksize=10, verbose=False)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_csv_to_parquet_roundtrip(self):
+        """Chunked GeoParquet output reads back with geometry and full column names."""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            in_csv = os.path.join(tmpdir, "points.csv")
+            with open(in_csv, "w") as f:
+                f.write("longitude,latitude,a_very_long_column_name\n")
+                for i in range(25):
+                    f.write(f"{i * 0.1},{i * 0.2},{i}\n")
+
+            out_parquet = os.path.join(tmpdir, "points.parquet")
+            rows = common.csv_to_parquet(
+                in_csv, out_parquet, crs="EPSG:4326", chunksize=10, row_group_size=5, verbose=False
+            )
+            self.assertEqual(rows, 25)
+            self.assertEqual(pq.ParquetFile(out_parquet).num_row_groups, 5)
+
+            gdf = common.read_vector(out_parquet)
+            self.assertEqual(gdf.crs.to_epsg(), 4326)
+            self.assertEqual(gdf["a_very_long_column_name"].tolist(), list(range(25)))
+            self.assertAlmostEqual(gdf.geometry.y.iloc[-1], 4.8)
+
+            gdf = common.read_vector(
+                out_parquet,
+                columns=["a_very_long_column_name"],
+                where=[("a_very_long_column_name", ">=", 5)],
+                bbox=(0, 0, 1, 2),
+            )
+            self.assertEqual(gdf["a_very_long_column_name"].tolist(), list(range(5, 11)))
+            self.assertEqual(gdf.columns.tolist(), ["a_very_long_column_name", "geometry"])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_csv_to_parquet_chunks_keep_column_types(self):
+        """A sparse string column and an int column with later gaps keep one schema."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            in_csv = os.path.join(tmpdir, "points.csv")
+            with open(in_csv, "w") as f:
+                f.write("longitude,latitude,tag,count\n")
+                for i in range(25):
+                    tag = f"x{i}" if i >= 10 else ""
+                    count = i if i < 15 else ""
+                    f.write(f"{i * 0.1},{i * 0.2},{tag},{count}\n")
+
+            out_parquet = os.path.join(tmpdir, "points.parquet")
+            rows = common.csv_to_parquet(in_csv, out_parquet, chunksize=10, verbose=False)
+            self.assertEqual(rows, 25)
+            schema = pq.read_schema(out_parquet)
+            self.assertTrue(pa.types.is_string(schema.field("tag").type))
+            self.assertEqual(schema.field("count").type, pa.int64())
+
+            table = pq.read_table(out_parquet)
+            self.assertEqual(table["tag"].to_pylist()[9:12], [None, "x10", "x11"])
+            self.assertEqual(table["count"].to_pylist()[13:16], [13, 14, None])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_read_vector_pushdown(self):
+        """Columns, where and bbox filters are applied by the file reader."""
+        countries = os.path.join(
+            os.path.dirname(__file__), "..", "docs", "examples", "data", "countries.shp"
+        )
+        gdf = common.read_vector(
+            countries, columns=["NAME"], where="CONTINENT = 'Africa'", bbox=(-20, 0, 10, 20)
+        )
+        self.assertEqual(gdf.columns.tolist(), ["NAME", "geometry"])
+        self.assertIn("Nigeria", gdf["NAME"].tolist())
+        self.assertNotIn("Egypt", gdf["NAME"].tolist())
+        self.assertNotIn("Brazil", gdf["NAME"].tolist())
+
+    def test_vector_cache(self):
+        """Repeat reads hit the vector cache until the file changes on disk."""
+        tmpdir = tempfile.mkdtemp()
+        common.clear_vector_cache()
+        try:
+            path = os.path.join(tmpdir, "points.geojson")
+            data = common.points_to_geojson([1, 2], [3, 4])
+            with open(path, "w") as f:
+                json.dump(data, f)
+
+            # the entry is sized from the GeoDataFrame, without serializing the payload
+            with mock.patch("rastvectpy.vector.payload_size", side_effect=AssertionError):
+                first, _ = common.read_vector_geojson(path)
+            second, _ = common.read_vector_geojson(path)
+            self.assertIs(first, second)
+            self.assertEqual(len(first["features"]), 2)
+            self.assertIsNot(first, common.read_vector_geojson(path, precision=3)[0])
+            info = common.vector_cache_info()
+            self.assertEqual((info["hits"], info["entries"]), (2, 3))
+            self.assertGreater(info["nbytes"], 0)
+
+            data["features"] = data["features"][:1]
+            with open(path, "w") as f:
+                json.dump(data, f)
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(len(common.read_vector_geojson(path)[0]["features"]), 1)
+
+            common.set_vector_cache_size(1)
+            self.assertEqual(common.vector_cache_info()["entries"], 0)
+        finally:
+            common.set_vector_cache_size(512 * 1024**2)
+            common.clear_vector_cache()
+            shutil.rmtree(tmpdir)
+
+    def test_resize_image_is_cached(self):
+        """Images are downscaled to the display size and cached in memory and on disk."""
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest("Pillow is not installed")
+
+        source = os.path.join(os.path.dirname(__file__), "..", "examples", "james-webb.jpg")
+        tmpdir = tempfile.mkdtemp()
+        common._image_cache.clear()
+        try:
+            value, fmt = common.resize_image(source, width=200, cache_dir=tmpdir)
+            self.assertEqual(fmt, "jpeg")
+            self.assertLess(len(value), os.path.getsize(source) / 4)
+            self.assertEqual(Image.open(io.BytesIO(value)).width, 200)
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+
+            self.assertIs(common.resize_image(source, width=200, cache_dir=tmpdir)[0], value)
+            common._image_cache.clear()
+            self.assertEqual(common.resize_image(source, width=200, cache_dir=tmpdir)[0], value)
+            self.assertEqual(common._image_cache.misses, 1)
+
+            with open(source, "rb") as f:
+                self.assertEqual(common.resize_image(source, width=5000, cache_dir=tmpdir)[0], f.read())
+        finally:
+            common._image_cache.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_csv_batch_convert(self):
+        """Batch conversion runs in a process pool and skips up-to-date outputs."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for name in ["a", "b", "c"]:
+                with open(os.path.join(tmpdir, f"{name}.csv"), "w") as f:
+                    f.write("longitude,latitude\n1,2\n3,4\n")
+            with open(os.path.join(tmpdir, "bad.csv"), "w") as f:
+                f.write("lon,lat\n1,2\n")
+            out_dir = os.path.join(tmpdir, "out")
+            pattern = os.path.join(tmpdir, "*.csv")
+
+            results = common.csv_batch_convert(pattern, out_dir=out_dir, workers=2)
+            self.assertEqual([r["rows"] for r in results], [2, 2, 0, 2])
+            self.assertIn("KeyError", results[2]["error"])
+            self.assertTrue(os.path.exists(os.path.join(out_dir, "a.geojson")))
+
+            self.assertFalse(os.path.exists(os.path.join(out_dir, "bad.geojson")))
+
+            results = common.csv_batch_convert(pattern, out_dir=out_dir, workers=1)
+            self.assertEqual([r["skipped"] for r in results], [True, True, False, True])
+
+            # a failed chunked conversion leaves no partial output to skip next time
+            results = common.csv_batch_convert(pattern, out_dir=out_dir, chunksize=1, workers=1)
+            self.assertIn("KeyError", results[2]["error"])
+            self.assertEqual(
+                sorted(os.listdir(out_dir)), ["a.geojson", "b.geojson", "c.geojson"]
+            )
+
+            # files of the same name from a recursive glob would share one output
+            for name in ["x", "y"]:
+                os.makedirs(os.path.join(tmpdir, name))
+                with open(os.path.join(tmpdir, name, "a.csv"), "w") as f:
+                    f.write("longitude,latitude\n1,2\n")
+            pattern = os.path.join(tmpdir, "**", "a.csv")
+            results = common.csv_batch_convert(pattern, out_dir=out_dir, overwrite=True)
+            self.assertEqual(len(results), 3)
+            self.assertTrue(all("Several inputs" in r["error"] for r in results))
+
+            shp_dir = os.path.join(tmpdir, "shp")
+            results = common.csv_batch_convert(
+                [os.path.join(tmpdir, "a.csv")], out_dir=shp_dir, output_format="shp"
+            )
+            self.assertEqual(results[0]["rows"], 2)
+            self.assertEqual(
+                sorted(os.listdir(shp_dir)), ["a.cpg", "a.dbf", "a.shp", "a.shx"]
+            )
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_lru_cache_evicts_and_expires(self):
+        """The LRU cache evicts the oldest entry and honours its TTL."""
+        cache = common.LRUCache(maxsize=2, ttl=0.05)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.nbytes, 0)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""Import-time regression tests for `rastvectpy` package."""
+
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# A bare `import rastvectpy` must stay well under these budgets.
+IMPORT_TIME_BUDGET = 0.25  # seconds
+IMPORT_MODULE_BUDGET = 25  # modules newly added to sys.modules
+
+HEAVY_MODULES = [
+    "ipyleaflet",
+    "ipywidgets",
+    "matplotlib",
+    "pandas",
+    "geopandas",
+    "requests",
+    "httpx",
+    "xyzservices",
+]
+
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+import rastvectpy
+{extra}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def _probe(extra=""):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output(
+        [sys.executable, "-c", PROBE.format(extra=extra)], cwd=root
+    )
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+class TestImport(unittest.TestCase):
+    """Tests for the lazy-loading package layout."""
+
+    def test_bare_import_budget(self):
+        """A bare import stays within the time and module-count budget."""
+        result = _probe()
+        self.assertLess(result["elapsed"], IMPORT_TIME_BUDGET)
+        self.assertLess(len(result["modules"]), IMPORT_MODULE_BUDGET)
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, result["modules"])
+
+    def test_converters_skip_mapping_stack(self):
+        """Accessing the CSV converters does not load the widget or plotting stacks."""
+        result = _probe("rastvectpy.csv_to_geojson")
+        for name in ["ipyleaflet", "ipywidgets", "matplotlib", "pandas", "geopandas"]:
+            self.assertNotIn(name, result["modules"])
+
+    def test_map_is_lazily_available(self):
+        """`rastvectpy.Map` still resolves to the ipyleaflet-based map."""
+        import rastvectpy
+
+        self.assertEqual(rastvectpy.Map.__module__, "rastvectpy.rastvectpy")
+
+
+if __name__ == '__main__':
+    unittest.main()
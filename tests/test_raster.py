@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""Tests for `rastvectpy.raster` module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rastvectpy import raster
+
+
+class TestRaster(unittest.TestCase):
+    """Tests for `rastvectpy.raster` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_block_reduce_mean_with_edges_and_nan(self):
+        """Block means ignore NaN and cover partial edge blocks."""
+        array = np.arange(15, dtype="float32").reshape(3, 5)
+        array[0, 0] = np.nan
+        out = raster.block_reduce(array, 2)
+        self.assertEqual(out.shape, (2, 3))
+        self.assertAlmostEqual(out[0, 0], (1 + 5 + 6) / 3)
+        self.assertAlmostEqual(out[1, 2], 14)
+
+    def test_decimate_memmap_and_window(self):
+        """Overviews fit the display shape and small windows are read at full resolution."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "big.npy")
+            array = np.lib.format.open_memmap(path, mode="w+", dtype="float32", shape=(1000, 600))
+            array[:] = np.arange(600, dtype="float32")
+            array.flush()
+            del array
+
+            array = raster.open_array(path)
+            self.assertIsInstance(array, np.memmap)
+            overview, window = raster.decimate(array, (100, 100), chunk_bytes=4096)
+            self.assertEqual(overview.shape, (100, 60))
+            self.assertEqual(window, (0, 1000, 0, 600))
+            self.assertAlmostEqual(overview[50, 0], np.mean(np.arange(10)))
+
+            part, window = raster.decimate(array, (100, 100), window=(10.2, 50, 20, 80))
+            self.assertEqual(window, (10, 50, 20, 80))
+            np.testing.assert_array_equal(part[0], np.arange(20, 80))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_raster_stats_streaming(self):
+        """Chunked statistics match NumPy and are cached per memory-mapped file."""
+        rng = np.random.default_rng(0)
+        array = rng.normal(100, 15, size=(500, 400)).astype("float32")
+        array[0, :10] = np.nan
+        array[1, :5] = -9999
+        array[2, 0] = 1e9
+
+        stats = raster.raster_stats(array, nodata=-9999, chunk_bytes=40000, workers=2)
+        valid = array[np.isfinite(array) & (array != -9999)]
+        self.assertEqual((stats.count, stats.nodata_count), (valid.size, 15))
+        self.assertEqual(stats.max, 1e9)
+        self.assertAlmostEqual(stats.mean, valid.mean(dtype="float64"), places=3)
+        self.assertAlmostEqual(stats.std / valid.std(dtype="float64"), 1, places=5)
+        self.assertEqual(stats.histogram.sum(), valid.size)
+        # The outlier does not blur the percentiles.
+        np.testing.assert_allclose(
+            stats.percentile([2, 50, 98]), np.percentile(valid, [2, 50, 98]), atol=0.1
+        )
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "data.npy")
+            np.save(path, array)
+            first = raster.raster_stats(path, nodata=-9999)
+            self.assertIs(raster.raster_stats(path, nodata=-9999), first)
+            vmin, vmax = first.stretch(2, 98)
+            self.assertLess(vmax, 200)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_visualize_raster_redraws_zoomed_window(self):
+        """The plotted image is display-sized and follows the visible window."""
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        from rastvectpy.rastvectpy import Map
+
+        array = np.arange(4000 * 3000, dtype="float32").reshape(4000, 3000)
+        array[0, 0] = 1e12
+        image = Map.visualize_raster(array, max_size=(200, 200))
+        self.assertLessEqual(max(image.get_array().shape), 200)
+        self.assertLess(image.get_clim()[1], 1e8)
+
+        image.axes.set_xlim(100, 150)
+        image.axes.set_ylim(60, 20)
+        self.assertEqual(image.get_array()[0, 0], array[20, 100])
+        self.assertEqual(image.get_array().shape, (41, 51))
+        plt.close("all")
+
+    def test_apply_colormap_lut(self):
+        """Values map to the ends of the lookup table and NaN is transparent."""
+        lut = raster.colormap_lut("gray")
+        rgba = raster.apply_colormap(np.array([0, 1, np.nan]), lut, 0, 1)
+        self.assertEqual(tuple(rgba[0]), (0, 0, 0, 255))
+        self.assertEqual(tuple(rgba[1]), (255, 255, 255, 255))
+        self.assertEqual(rgba[2, 3], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,14 @@
 """Tests for `rastvectpy` package."""
 
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
+import warnings
+
+import pandas as pd
 
 from rastvectpy import rastvectpy
 
@@ -13,9 +20,158 @@ class TestRastvectpy(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures, if any."""
+        self.df = pd.DataFrame(
+            {
+                "longitude": [-84.0, -83.5, float("nan"), -83.0],
+                "latitude": [35.0, 35.5, 36.0, 36.5],
+                "name": ["a", "b", "c", "d"],
+            }
+        )
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
 
     def test_000_something(self):
         """Test something."""
+
+    def test_add_xy_data_circle(self):
+        """Circle mode adds one GeoJSON layer and resolves popups on click."""
+        m = rastvectpy.Map()
+        n_layers = len(m.layers)
+        m.add_xy_data(self.df, label="name", layer_name="points", mode="circle")
+        self.assertEqual(len(m.layers), n_layers + 1)
+
+        layer = m.layers[-1]
+        features = layer.data["features"]
+        self.assertEqual([f["id"] for f in features], [0, 1, 3])
+
+        layer._click_callbacks(event="click", feature=features[2])
+        popup = m.layers[-1]
+        self.assertEqual(popup.child.value, "d")
+        self.assertEqual(list(popup.location), [36.5, -83.0])
+
+    def test_add_point_layer_popup_list(self):
+        """add_point_layer is a Map method and builds list popups column-wise."""
+        import geopandas as gpd
+
+        df = self.df.dropna().reset_index(drop=True)
+        gdf = gpd.GeoDataFrame(
+            df, geometry=gpd.points_from_xy(df["longitude"], df["latitude"]), crs="EPSG:4326"
+        )
+        m = rastvectpy.Map()
+        m.add_point_layer(gdf, popup=["name", "latitude"])
+        markers = m.layers[-1].markers
+        self.assertEqual(len(markers), 3)
+        self.assertEqual(markers[1].popup.value, "name: b<br>latitude: 35.5<br>")
+
+        m.add_point_layer(gdf, popup=["name"], mode="circle")
+        layer = m.layers[-1]
+        layer._click_callbacks(event="click", feature=layer.data["features"][0])
+        self.assertEqual(m.layers[-1].child.value, "name: a<br>")
+
+    def test_server_clusters_update_once_per_view(self):
+        """A zoom sends the clusters once, when the new bounds arrive."""
+        m = rastvectpy.Map()
+        m.add_xy_data(self.df.dropna(), mode="server_cluster")
+        layer = m.layers[-1]
+        updates = []
+        layer.observe(updates.append, names=["data"])
+        m.zoom = 5
+        self.assertEqual(updates, [])
+        m.set_trait("bounds", ((30.0, -100.0), (40.0, -80.0)))
+        self.assertTrue(updates)
+
+    def test_batch_coalesces_sync_messages(self):
+        """Changes inside Map.batch are counted and synced once per widget."""
+        m = rastvectpy.Map()
+        saved = m.sync_messages_saved
+        empty = {"type": "FeatureCollection", "features": []}
+        with m.batch():
+            with m.batch():
+                for i in range(10):
+                    m.add_geojson(empty, name=str(i))
+            m.zoom = 5
+            self.assertTrue(m._holding_sync)
+        self.assertFalse(m._holding_sync)
+        self.assertEqual(m.sync_messages_saved - saved, 10)
+
+    def test_init_batches_controls_and_layout(self):
+        """The controls and layout set up in Map.__init__ are synced in one batch."""
+        import ipyleaflet
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            m = rastvectpy.Map(height="300px")
+        self.assertEqual(m.layout.height, "300px")
+        self.assertIsInstance(m.controls[-2], ipyleaflet.LayersControl)
+        self.assertIsInstance(m.controls[-1], ipyleaflet.FullScreenControl)
+        self.assertFalse([w for w in caught if "unrecognized arguments" in str(w.message)])
+
+        m = rastvectpy.Map(layer_control=False, fullscreen_control=False)
+        kinds = (ipyleaflet.LayersControl, ipyleaflet.FullScreenControl)
+        self.assertFalse([c for c in m.controls if isinstance(c, kinds)])
+
+    def test_add_layers_keeps_order_and_reports_errors(self):
+        """Layers load in parallel, attach in spec order and fail one at a time."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            in_csv = os.path.join(tmpdir, "points.csv")
+            self.df.to_csv(in_csv, index=False)
+            in_geojson = os.path.join(tmpdir, "points.geojson")
+            with open(in_geojson, "w") as f:
+                json.dump({"type": "FeatureCollection", "features": []}, f)
+            countries = os.path.join(
+                os.path.dirname(__file__), "..", "docs", "examples", "data", "countries.shp"
+            )
+
+            m = rastvectpy.Map()
+            n_layers = len(m.layers)
+            results = m.add_layers(
+                [
+                    {
+                        "type": "shp",
+                        "data": countries,
+                        "name": "countries",
+                        "precision": 3,
+                        "report": True,
+                    },
+                    {"type": "xy", "data": in_csv, "name": "points", "mode": "circle"},
+                    {"type": "shp", "data": os.path.join(tmpdir, "missing.shp")},
+                    {"type": "geojson", "data": in_geojson, "name": "empty"},
+                ]
+            )
+            self.assertEqual([r["name"] for r in results], ["countries", "points", "Shapefile", "empty"])
+            self.assertEqual([r["error"] is None for r in results], [True, True, False, True])
+            self.assertEqual(
+                [layer.name for layer in m.layers[n_layers:]], ["countries", "points", "empty"]
+            )
+            self.assertIs(results[0]["layer"], m.layers[n_layers])
+            self.assertIn("bytes_saved", results[0]["layer"].encoding_report)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_add_shp_vector_tiles(self):
+        """Large layers can be served as vector tiles from the local tile server."""
+        import ipyleaflet
+
+        countries = os.path.join(
+            os.path.dirname(__file__), "..", "docs", "examples", "data", "countries.shp"
+        )
+        m = rastvectpy.Map()
+        m.add_shp(countries, name="countries", columns=["NAME"], vector_tiles=True)
+        layer = m.layers[-1]
+        self.assertIsInstance(layer, ipyleaflet.VectorTileLayer)
+        self.assertEqual(layer.name, "countries")
+        self.assertTrue(layer.url.endswith("{z}/{x}/{y}.pbf"))
+        self.assertIn("layer", layer.layer_styles)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            m.add_shp(countries, name="plain", vector_tiles=False, lod=False)
+            m.add_layers([{"type": "shp", "data": countries, "lod": False, "vector_tiles": False}])
+        self.assertIsInstance(m.layers[-1], ipyleaflet.GeoJSON)
+        self.assertFalse([w for w in caught if "unrecognized arguments" in str(w.message)])
+
+
+if __name__ == '__main__':
+    unittest.main()
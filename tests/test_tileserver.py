@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+"""Tests for `rastvectpy.tileserver` module."""
+
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from rastvectpy import tileserver
+
+try:
+    import rasterio
+except ImportError:
+    rasterio = None
+
+
+def _decode_png(data):
+    """Decode the unfiltered PNGs written by encode_png."""
+    pos, idat, header = 8, b"", None
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        tag, body = data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]
+        if tag == b"IHDR":
+            header = body
+        elif tag == b"IDAT":
+            idat += body
+        pos += 12 + length
+    width, height = int.from_bytes(header[:4], "big"), int.from_bytes(header[4:8], "big")
+    channels = {0: 1, 4: 2, 2: 3, 6: 4}[header[9]]
+    raw = np.frombuffer(zlib.decompress(idat), dtype="uint8")
+    return raw.reshape(height, width * channels + 1)[:, 1:].reshape(height, width, channels)
+
+
+def _varint(data, pos):
+    result = shift = 0
+    while True:
+        byte, pos = data[pos], pos + 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _fields(data):
+    pos = 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        if key & 7 == 0:
+            value, pos = _varint(data, pos)
+        else:
+            length, pos = _varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield key >> 3, value
+
+
+def _packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _decode_mvt(data):
+    """Decode the string and integer attributes and geometry parts of each layer."""
+    layers = {}
+    for _, layer in _fields(data):
+        fields = list(_fields(layer))
+        keys = [v.decode() for n, v in fields if n == 3]
+        values = []
+        for n, v in fields:
+            if n == 4:
+                ((tag, value),) = _fields(v)
+                values.append(value.decode() if tag == 1 else (value >> 1) ^ -(value & 1))
+        features = []
+        for n, v in fields:
+            if n != 2:
+                continue
+            f = dict(_fields(v))
+            tags, commands = _packed(f.get(2, b"")), _packed(f[4])
+            parts, i, cx, cy = [], 0, 0, 0
+            while i < len(commands):
+                command, count = commands[i] & 7, commands[i] >> 3
+                i += 1
+                if command == 7:
+                    parts[-1].append(parts[-1][0])
+                    continue
+                for _ in range(count):
+                    dx, dy = commands[i], commands[i + 1]
+                    i += 2
+                    cx += (dx >> 1) ^ -(dx & 1)
+                    cy += (dy >> 1) ^ -(dy & 1)
+                    if command == 1 and (f[3] != 1 or not parts):
+                        parts.append([])
+                    parts[-1].append((cx, cy))
+            features.append({
+                "id": f.get(1),
+                "type": f[3],
+                "properties": {keys[a]: values[b] for a, b in zip(tags[::2], tags[1::2])},
+                "geometry": parts,
+            })
+        layers[dict(fields)[1].decode()] = features
+    return layers
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """A stand-in for an online tile provider, with tiles up to zoom 2."""
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        z = int(self.path.split("/")[1])
+        if z > 2:
+            self.send_error(404)
+            return
+        body = f"tile{self.path}".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTileServer(unittest.TestCase):
+    """Tests for the local tile server."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.tmpdir)
+
+    def test_encode_png_roundtrip(self):
+        """encode_png writes a valid RGBA PNG."""
+        image = np.random.default_rng(0).integers(0, 255, (5, 7, 4), dtype="uint8")
+        data = tileserver.encode_png(image)
+        self.assertTrue(data.startswith(b"\x89PNG"))
+        np.testing.assert_array_equal(_decode_png(data), image)
+
+    def test_array_tiles(self):
+        """Array tiles use the block-mean pyramid and the colormap lookup table."""
+        array = np.zeros((1000, 2000), dtype="float32")
+        array[:, 1000:] = 1.0
+        source = tileserver.ArrayTileSource(
+            array, [-90, -45, 90, 45], cmap="gray", vmin=0, vmax=1
+        )
+        tile = _decode_png(source.get_tile(1, 0, 0))
+        self.assertEqual(tile.shape, (256, 256, 4))
+        self.assertGreater(len(source._levels), 1)
+        # Left tile: the western half of the array is black, outside the bounds is clear.
+        self.assertEqual(tile[200, 255, 3], 255)
+        self.assertEqual(tuple(tile[200, 255, :3]), (0, 0, 0))
+        self.assertEqual(tile[200, 10, 3], 0)
+        right = _decode_png(source.get_tile(1, 1, 0))
+        self.assertEqual(tuple(right[200, 10, :3]), (255, 255, 255))
+        self.assertIsNone(source.get_tile(3, 0, 7))
+
+    def test_array_tiles_mask_nodata_per_tile(self):
+        """A memory-mapped array with nodata is masked per tile, never copied whole."""
+        path = os.path.join(self.tmpdir, "dem.npy")
+        array = np.lib.format.open_memmap(path, mode="w+", dtype="int16", shape=(1000, 2000))
+        array[:] = 100
+        array[:, 1000:] = 200
+        array[:500, :500] = -9999
+        source = tileserver.ArrayTileSource(
+            array, [-90, -45, 90, 45], cmap="gray", vmin=100, vmax=200, nodata=-9999
+        )
+        self.assertTrue(np.shares_memory(source._levels[0], array))
+        self.assertEqual((source.vmin, source.vmax), (100, 200))
+
+        # z3 reads the full-resolution array, z1 a block-mean overview
+        self.assertIsNone(source.get_tile(3, 2, 3))
+        tile = _decode_png(source.get_tile(3, 3, 3))
+        self.assertTrue((tile[..., 3] == 255).all())
+        overview = source.level(1)
+        self.assertTrue(np.isnan(overview[0, 0]))
+        self.assertEqual(np.nanmin(overview), 100)
+        tile = _decode_png(source.get_tile(1, 0, 0))
+        self.assertEqual(tuple(tile[200, 255, :3]), (0, 0, 0))
+
+    def test_caching_tile_source_works_offline(self):
+        """Prefetched tiles are stored in MBTiles and served without the upstream."""
+        upstream = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstreamHandler)
+        threading.Thread(target=upstream.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{upstream.server_port}/{{z}}/{{x}}/{{y}}.png"
+        path = os.path.join(self.tmpdir, "tiles.mbtiles")
+        FakeUpstreamHandler.requests = []
+
+        source = tileserver.CachingTileSource(url, path)
+        bbox = [-10, -10, 10, 10]
+        stats = source.prefetch(bbox, 0, 3, workers=4)
+        self.assertEqual(stats, {"tiles": 13, "cached": 0, "downloaded": 9, "failed": 4})
+        self.assertEqual(source.prefetch(bbox, 0, 2)["cached"], 9)
+        self.assertEqual(len(FakeUpstreamHandler.requests), 13)
+        self.assertRaises(ValueError, source.prefetch, [-180, -85, 180, 85], 0, 10)
+        upstream.shutdown()
+        upstream.server_close()
+        source.close()
+
+        server = tileserver.TileServer()
+        try:
+            template = server.add_source(tileserver.CachingTileSource(url, path))
+            with urllib.request.urlopen(template.format(z=1, x=1, y=0)) as r:
+                self.assertEqual(r.read(), b"tile/1/1/0.png")
+            with urllib.request.urlopen(template.format(z=3, x=3, y=3)) as r:
+                self.assertEqual(r.status, 204)
+            self.assertNotIn((template.split("/")[3], 3, 3, 3), server.cache)
+        finally:
+            server.shutdown()
+
+    def test_encode_mvt_roundtrip(self):
+        """Points, lines and polygons decode back with their attributes and ring order."""
+        from shapely.geometry import LineString, Point, box
+
+        from rastvectpy.vector import encode_mvt
+
+        geometries = np.array([box(10, 10, 20, 30), Point(5, 6), LineString([(0, 0), (8, 4)])])
+        data = encode_mvt(
+            geometries, [{"name": "a", "n": -3}, {"name": "b"}, {}], ids=[0, 1, 2], layer_name="x"
+        )
+        features = _decode_mvt(data)["x"]
+        self.assertEqual([f["type"] for f in features], [3, 1, 2])
+        self.assertEqual(features[0]["properties"], {"name": "a", "n": -3})
+        self.assertEqual(features[1]["geometry"], [[(5, 6)]])
+        self.assertEqual(features[2]["geometry"], [[(0, 0), (8, 4)]])
+        ring = features[0]["geometry"][0]
+        self.assertEqual(set(ring), {(10, 10), (20, 10), (20, 30), (10, 30)})
+        self.assertEqual(ring[0], ring[-1])
+        # exterior rings are clockwise in tile coordinates (positive shoelace area, y down)
+        area = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:]))
+        self.assertGreater(area, 0)
+
+    def test_vector_tiles_from_shapefile(self):
+        """Vector tiles are clipped per tile, served over HTTP and empty tiles are skipped."""
+        import geopandas as gpd
+
+        countries = os.path.join(
+            os.path.dirname(__file__), "..", "docs", "examples", "data", "countries.shp"
+        )
+        gdf = gpd.read_file(countries)
+        source = tileserver.VectorTileSource(gdf[["NAME", "geometry"]], layer_name="countries")
+        server = tileserver.TileServer()
+        try:
+            url = server.add_source(source, name="countries")
+            self.assertTrue(url.endswith("{z}/{x}/{y}.pbf"))
+            with urllib.request.urlopen(url.format(z=1, x=1, y=0)) as r:
+                self.assertEqual(r.headers["Content-Type"], "application/x-protobuf")
+                features = _decode_mvt(r.read())["countries"]
+            names = {f["properties"]["NAME"] for f in features}
+            self.assertIn("Germany", names)
+            self.assertNotIn("Brazil", names)
+            for feature in features:
+                for part in feature["geometry"]:
+                    for x, y in part:
+                        self.assertTrue(-64 <= x <= 4096 + 64 and -64 <= y <= 4096 + 64)
+            # open ocean
+            self.assertIsNone(source.get_tile(6, 0, 40))
+        finally:
+            server.shutdown()
+
+    @unittest.skipIf(rasterio is None, "rasterio is not installed")
+    def test_raster_tiles_from_local_file(self):
+        """Local GeoTIFF tiles are served over HTTP and cached."""
+        from rasterio.transform import from_origin
+
+        path = os.path.join(self.tmpdir, "dem.tif")
+        data = np.arange(512 * 512, dtype="float32").reshape(512, 512)
+        profile = {
+            "driver": "GTiff",
+            "width": 512,
+            "height": 512,
+            "count": 1,
+            "dtype": "float32",
+            "crs": "EPSG:4326",
+            "transform": from_origin(-10, 10, 20 / 512, 20 / 512),
+        }
+        with rasterio.open(path, "w", **profile) as dst:
+            dst.write(data, 1)
+            dst.build_overviews([2, 4, 8])
+
+        source = tileserver.RasterTileSource(path)
+        self.assertEqual(source.overviews, [2, 4, 8])
+        self.assertEqual(source.overview_level(0), 2)
+        self.assertEqual(source.overview_level(12), -1)
+
+        server = tileserver.TileServer()
+        try:
+            url = server.add_source(source, name="dem")
+            with urllib.request.urlopen(url.format(z=1, x=0, y=0)) as r:
+                self.assertEqual(r.headers["Content-Type"], "image/png")
+                tile = _decode_png(r.read())
+            self.assertEqual(tile.shape, (256, 256, 4))
+            self.assertTrue(tile[..., 3].any())
+            self.assertIsNone(server.get_tile("dem", 5, 0, 0))
+
+            server.get_tile("dem", 1, 0, 0)
+            self.assertEqual(server.cache.hits, 1)
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
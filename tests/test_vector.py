@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+"""Tests for `rastvectpy.vector` module."""
+
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Polygon, box
+
+from rastvectpy import rastvectpy, vector
+
+COUNTRIES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "docs",
+    "examples",
+    "data",
+    "countries.shp",
+)
+
+
+class TestVector(unittest.TestCase):
+    """Tests for `rastvectpy.vector` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.gdf = gpd.read_file(COUNTRIES)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_level_of_detail(self):
+        """Lower zooms send fewer vertices, and high zooms use full resolution."""
+        levels = vector.LevelOfDetail(self.gdf)
+        self.assertEqual(levels.level(1.5), 3)
+        self.assertIsNone(levels.level(13))
+        counts = [levels.num_coordinates(z) for z in [0, 3, 6, 13]]
+        self.assertEqual(counts, sorted(counts))
+        self.assertLess(counts[0], counts[-1] / 3)
+        self.assertEqual(len(levels.get_geojson(0)["features"]), len(self.gdf))
+
+    def test_add_shp_swaps_levels_on_zoom(self):
+        """add_shp(lod=True) swaps in the level matching the map zoom."""
+        m = rastvectpy.Map(zoom=2)
+        m.add_shp(COUNTRIES, name="countries", lod=True)
+        layer = m.layers[-1]
+        low = layer.data
+        m.zoom = 14
+        self.assertIsNot(layer.data, low)
+        self.assertEqual(len(layer.data["features"]), len(self.gdf))
+
+    def test_encode_geojson_reports_savings(self):
+        """Quantized payloads are smaller and keep their features."""
+        encoded, report = vector.encode_geojson(self.gdf, precision=4, report=True)
+        self.assertEqual(len(encoded["features"]), len(self.gdf))
+        self.assertGreater(report["bytes_saved"], report["bytes_before"] / 4)
+        self.assertEqual(report["bytes_after"], vector.payload_size(encoded))
+
+        # the payload is only serialized for the report when it is asked for
+        self.assertEqual(vector.encode_geojson(self.gdf, precision=4), (encoded, None))
+
+        m = rastvectpy.Map()
+        m.add_shp(COUNTRIES, precision=4, report=True)
+        self.assertEqual(m.layers[-1].encoding_report, report)
+
+    def test_topojson_shares_borders(self):
+        """Adjacent polygons share one arc and decode back to the same shapes."""
+        gdf = gpd.GeoDataFrame(
+            {"name": ["a", "b"]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)]
+        )
+        topology = vector.to_topojson(gdf, quantization=1001)
+        self.assertEqual(len(topology["arcs"]), 3)
+
+        scale = topology["transform"]["scale"]
+        translate = topology["transform"]["translate"]
+        arcs = [np.cumsum(arc, axis=0) * scale + translate for arc in topology["arcs"]]
+
+        def ring(refs):
+            parts = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in refs]
+            return np.vstack([parts[0]] + [p[1:] for p in parts[1:]])
+
+        geometries = topology["objects"]["data"]["geometries"]
+        self.assertEqual(geometries[1]["properties"], {"name": "b"})
+        for geometry, expected in zip(geometries, gdf.geometry):
+            decoded = Polygon(ring(geometry["arcs"][0]))
+            self.assertAlmostEqual(decoded.symmetric_difference(expected).area, 0)
+
+        countries = vector.to_topojson(self.gdf)
+        original = vector.payload_size(self.gdf.__geo_interface__)
+        self.assertLess(vector.payload_size(countries), original / 2)
+
+    def test_add_vector_multipoint_from_buffers(self):
+        """Coordinate buffers become one MultiPoint feature without copies of the inputs."""
+        x = np.array([1.0, 2.0, np.nan, 4.123456])
+        y = np.array([5.0, 6.0, 7.0, 8.0])
+        self.assertTrue(np.shares_memory(vector.as_numpy(memoryview(x)), x))
+        try:
+            import pyarrow as pa
+        except ImportError:
+            pass
+        else:
+            self.assertTrue(np.shares_memory(vector.as_numpy(pa.array(y)), y))
+            x = pa.chunked_array([pa.array(x)])
+
+        m = rastvectpy.Map()
+        m.add_vector((x, memoryview(y)), name="points", precision=2)
+        feature = m.layers[-1].data["features"][0]
+        self.assertEqual(feature["geometry"]["type"], "MultiPoint")
+        self.assertEqual(feature["geometry"]["coordinates"], [[1, 5], [2, 6], [4.12, 8]])
+        self.assertEqual(feature["properties"]["count"], 3)
+
+    def test_grid_vectors_streams_memmap(self):
+        """Vectors are averaged per cell from a memory-mapped field."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            n = 100000
+            field = np.lib.format.open_memmap(
+                os.path.join(tmpdir, "field.npy"), mode="w+", dtype="float32", shape=(4, n)
+            )
+            rng = np.random.default_rng(0)
+            field[0] = rng.uniform(0, 10, n)
+            field[1] = rng.uniform(0, 5, n)
+            field[2] = np.where(field[0] < 5, 1.0, 3.0)
+            field[3] = -2.0
+            field[2, 0] = np.nan
+
+            x, y, u, v, count = vector.grid_vectors(*field, (5, 10), chunk_size=7000)
+            self.assertEqual(u.shape, (5, 10))
+            self.assertEqual(count.sum(), n - 1)
+            np.testing.assert_allclose(u[:, :5], 1)
+            np.testing.assert_allclose(u[:, 5:], 3)
+            np.testing.assert_allclose(v, -2)
+            self.assertAlmostEqual(x[0, 0], field[0].min() + (field[0].max() - field[0].min()) / 20, 4)
+
+            import matplotlib
+
+            matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
+
+            arrows = rastvectpy.Map.visualize_vector(tuple(field))
+            self.assertLess(arrows.N, n / 10)
+            plt.close("all")
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_block_vectors_averages_gridded_components(self):
+        """Gridded U/V components are block-averaged down to the target density."""
+        u = np.ones((200, 300), dtype="float32")
+        u[:, 150:] = 3.0
+        v = np.full((200, 300), -2.0, dtype="float32")
+        u[:20, :30] = np.nan
+
+        x, y, um, vm = vector.block_vectors(u, v, (10, 10))
+        self.assertEqual(um.shape, (10, 10))
+        self.assertTrue(um.mask[0, 0])
+        np.testing.assert_allclose(um[1:, :5], 1)
+        np.testing.assert_allclose(um[:, 5:], 3)
+        np.testing.assert_allclose(vm[1:], -2)
+        self.assertEqual((x[0, 0], y[0, 0], x[0, -1]), (14.5, 9.5, 284.5))
+
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        arrows = rastvectpy.Map.visualize_vector((u, v))
+        self.assertLess(arrows.N, u.size / 10)
+        arrows = rastvectpy.Map.visualize_vector((u[0], v[0]), grid=(1, 30))
+        self.assertEqual(arrows.N, 30)
+        plt.close("all")
+
+    def test_viewport_source_reads_incrementally(self):
+        """Only features in view are read, and a pan reads just the new ones."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "grid.geojson")
+            cells = [box(x, y, x + 1, y + 1) for x in range(-50, 50) for y in range(-40, 40)]
+            grid = gpd.GeoDataFrame({"n": range(len(cells))}, geometry=cells, crs="EPSG:4326")
+            grid.to_file(path, driver="GeoJSON")
+
+            source = vector.ViewportSource(path, margin=0)
+            self.assertEqual(len(source), 8000)
+            first = source.read([0.5, 0.5, 2.5, 2.5])
+            self.assertEqual(sorted(first["n"]), sorted(grid.cx[0.5:2.5, 0.5:2.5]["n"]))
+
+            second = source.read([1.5, 0.5, 3.5, 2.5])
+            self.assertEqual(sorted(second["n"]), sorted(grid.cx[1.5:3.5, 0.5:2.5]["n"]))
+
+            m = rastvectpy.Map()
+            m.set_trait("bounds", ((0.5, 0.5), (2.5, 2.5)))
+            m.add_shp(path, dynamic={"debounce": 0, "margin": 0})
+            layer = m.layers[-1]
+            self.assertEqual(len(layer.data["features"]), 9)
+            m.set_trait("bounds", ((10.5, 10.5), (11.5, 11.5)))
+            self.assertEqual(len(layer.data["features"]), 4)
+
+            m.add_shp(
+                path,
+                dynamic={"debounce": 0, "margin": 0},
+                bbox=(10.2, 10.2, 10.8, 10.8),
+                precision=1,
+                hover_style={"fillOpacity": 0.5},
+            )
+            layer = m.layers[-1]
+            self.assertEqual(layer.hover_style, {"fillOpacity": 0.5})
+            self.assertEqual(len(layer.data["features"]), 1)
+            with self.assertRaises(ValueError):
+                m.add_shp(path, dynamic=True, lod=True)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dynamic_layer_drops_stale_refresh(self):
+        """A slow refresh of an old view never overwrites the data of a newer one."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "grid.geojson")
+            cells = [box(x, y, x + 1, y + 1) for x in range(-20, 20) for y in range(-20, 20)]
+            grid = gpd.GeoDataFrame({"n": range(len(cells))}, geometry=cells, crs="EPSG:4326")
+            grid.to_file(path, driver="GeoJSON")
+
+            read = vector.ViewportSource.read
+
+            def slow_read(source, bbox):
+                if bbox[0] < 0:
+                    time.sleep(0.3)
+                return read(source, bbox)
+
+            m = rastvectpy.Map()
+            m.set_trait("bounds", ((0.5, 0.5), (1.5, 1.5)))
+            with mock.patch.object(vector.ViewportSource, "read", slow_read):
+                m.add_shp(path, dynamic={"debounce": 0.01, "margin": 0})
+                layer = m.layers[-1]
+                m.set_trait("bounds", ((-10.5, -10.5), (-5.5, -5.5)))
+                time.sleep(0.1)  # the slow refresh of this view is now running
+                m.set_trait("bounds", ((10.5, 10.5), (11.5, 11.5)))
+                time.sleep(0.6)
+            self.assertEqual(len(layer.data["features"]), 4)
+            self.assertTrue(all(f["bbox"][0] >= 10 for f in layer.data["features"]))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()